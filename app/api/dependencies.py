@@ -1,22 +1,27 @@
 from datetime import datetime
 
 from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.application.services.ingestion import get_ingestion_job_manager
 from app.application.use_cases.chat import ChatUseCase
 from app.core.config import get_settings
 from app.domains.chats.service import ChatService
-from app.infrastructure.persistence.postgres.connection.session import get_sync_session
+from app.infrastructure.persistence.postgres.connection.session import get_session, get_sync_session
 from app.application.use_cases.upload_document import UploadDocumentUseCase
 from app.infrastructure.persistence.postgres.modules.chats.repository import SqlChatRepository
 from app.infrastructure.persistence.postgres.modules.users.repository import SqlUserRepository
 from app.infrastructure.persistence.postgres.modules.documents.repository import SqlDocumentRepository
 from app.infrastructure.file_storage.s3.backblaze_storage import BackblazeStorage
 from app.infrastructure.vector_db.qdrant.docs_repository import QdrantFilesRepository
-from app.infrastructure.openai_llm.langchain_openai_repo import OpenAIRepository
+from app.infrastructure.openai_llm.langchain_openai_repo import get_llm
 from app.infrastructure.parsers.pdf_parser.pdf_parser import ParserPDF
 from app.infrastructure.vector_db.qdrant.docs_repository import QdrantFilesRepository
 from app.infrastructure.langgraph_agent.agent import LangGraphAIAgent
+from app.infrastructure.embeddings.reranker import get_reranker
+from app.infrastructure.persistence.cache.chat_history import get_chat_history_cache
+from app.infrastructure.langgraph_agent.answer_cache import get_answer_cache
 from app.domains.users.schemas import UserRead
 from app.domains.users.service import UserService
 from app.domains.documents.service import DocumentService
@@ -45,10 +50,7 @@ def get_chat(user: UserRead = Depends(get_user)):
     )
 
 
-def get_upload_document_use_case(
-        session: Session = Depends(get_sync_session),  # Твоя сессия БД
-        user: UserRead = Depends(get_user)
-) -> UploadDocumentUseCase:
+def build_upload_document_use_case(session: Session, user: UserRead) -> UploadDocumentUseCase:
     # 1. Инициализируем репозитории
     user_repo = SqlUserRepository(session)
     doc_repo = SqlDocumentRepository(session)
@@ -63,30 +65,34 @@ def get_upload_document_use_case(
     user_service = UserService(user_repo)
     document_service = DocumentService(document_repo=doc_repo, parser=parser, user_id=user.id)
     storage_service = StorageService(storage)
-    vector_db_service = VectorDBService(vector_storage=vector_storage)
+    vector_db_service = VectorDBService(vector_storage=vector_storage, answer_cache=get_answer_cache())
 
     # 4. Собираем Use Case
     return UploadDocumentUseCase(
         document_service=document_service,
         storage_service=storage_service,
         user_service=user_service,
-        vector_db_service=vector_db_service
+        vector_db_service=vector_db_service,
+        answer_cache=get_answer_cache(),
     )
 
 
-def get_chat_use_case(
-        session: Session = Depends(get_sync_session),
-        user: UserRead = Depends(get_user),
-        chat: ChatRead = Depends(get_chat)
-) -> ChatUseCase:
+def get_upload_document_use_case(
+        session: Session = Depends(get_sync_session),  # Твоя сессия БД
+        user: UserRead = Depends(get_user)
+) -> UploadDocumentUseCase:
+    return build_upload_document_use_case(session, user)
+
+
+def build_chat_use_case(session: AsyncSession, user: UserRead, chat: ChatRead) -> ChatUseCase:
 
     chat_repo = SqlChatRepository(session)
     vector_repo = QdrantFilesRepository()
 
     user_id = user.id
-    chat_service = ChatService(chat_repo=chat_repo, chat_id=chat.id)
-    vector_db_service = VectorDBService(vector_storage=vector_repo)
-    llm = OpenAIRepository()
+    chat_service = ChatService(chat_repo=chat_repo, chat_id=chat.id, history_cache=get_chat_history_cache())
+    vector_db_service = VectorDBService(vector_storage=vector_repo, reranker=get_reranker())
+    llm = get_llm()
     agent = LangGraphAIAgent()
 
     return ChatUseCase(
@@ -98,6 +104,14 @@ def get_chat_use_case(
     )
 
 
+def get_chat_use_case(
+        session: AsyncSession = Depends(get_session),
+        user: UserRead = Depends(get_user),
+        chat: ChatRead = Depends(get_chat)
+) -> ChatUseCase:
+    return build_chat_use_case(session, user, chat)
+
+
 
 def get_mock_user() -> UserRead:
     return UserRead(
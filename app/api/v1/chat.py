@@ -1,13 +1,18 @@
 from loguru import logger
 
 import io
+import json
+from typing import AsyncIterator
 
 from fastapi import APIRouter, UploadFile, File, Depends
+from fastapi.responses import StreamingResponse
 
-from app.api.dependencies import get_chat_use_case
+from app.api.dependencies import build_chat_use_case, get_chat_use_case, get_chat, get_user
 from app.domains.users.schemas import UserRead
+from app.domains.agent.models import AgentEvent
 from app.application.use_cases.chat import ChatUseCase
-from app.domains.chats.schemas import MessageUserInput
+from app.domains.chats.schemas import ChatRead, MessageUserInput
+from app.infrastructure.persistence.postgres.connection.session import async_session_scope
 
 router = APIRouter()
 
@@ -19,9 +24,36 @@ async def chat(
 ):
     logger.info(f"chat: {message}")
 
-    result = use_case.execute(new_message=message.text)
+    result = await use_case.execute(new_message=message.text)
 
     if result:
         return {"status": "success", "answer": result}
     else:
         return {"status": "error"}
+
+
+async def _to_sse(events: AsyncIterator[AgentEvent]) -> AsyncIterator[str]:
+    async for event in events:
+        yield f"event: {event.type.value}\ndata: {json.dumps(event.data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/chat/stream")
+async def chat_stream(
+        message: MessageUserInput,
+        user: UserRead = Depends(get_user),
+        chat: ChatRead = Depends(get_chat),
+):
+    logger.info(f"chat stream: {message}")
+
+    async def events() -> AsyncIterator[AgentEvent]:
+        # Сессия должна жить, пока идёт стрим, а не до выхода из обработчика
+        async with async_session_scope() as session:
+            use_case = build_chat_use_case(session, user, chat)
+            async for event in use_case.stream(new_message=message.text):
+                yield event
+
+    return StreamingResponse(
+        _to_sse(events()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
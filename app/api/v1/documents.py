@@ -1,27 +1,52 @@
 import io
 
-from fastapi import APIRouter, UploadFile, File, Depends
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
 
-from app.api.dependencies import get_upload_document_use_case
+from app.api.dependencies import build_upload_document_use_case, get_ingestion_job_manager, get_user
 from app.domains.users.schemas import UserRead
-from app.application.use_cases.upload_document import UploadDocumentUseCase
+from app.domains.documents.exceptions import IngestionQueueFullException
+from app.domains.documents.schemas import StageCallback
+from app.application.services.ingestion import IngestionJobManager
+from app.infrastructure.persistence.postgres.connection.session import sync_session_scope
 
 router = APIRouter()
 
-@router.post("/files")
+@router.post("/files", status_code=status.HTTP_202_ACCEPTED)
 async def upload_document(
         file: UploadFile = File(...),
-        use_case: UploadDocumentUseCase = Depends(get_upload_document_use_case)
+        user: UserRead = Depends(get_user),
+        job_manager: IngestionJobManager = Depends(get_ingestion_job_manager),
 ):
-    content = file.file.read()
-    file_obj = io.BytesIO(content)
-
-    result = use_case.execute(
-        filename=file.filename,
-        file_obj=file_obj,
-    )
-
-    if result:
-        return {"status": "success",}
-    else:
-        return {"status": "error"}
+    content = await file.read()
+    filename = file.filename
+
+    def task(on_stage: StageCallback) -> bool:
+        # Задача живёт дольше запроса, поэтому открывает собственную сессию
+        with sync_session_scope() as session:
+            use_case = build_upload_document_use_case(session, user)
+            return use_case.execute(
+                filename=filename,
+                file_obj=io.BytesIO(content),
+                on_stage=on_stage,
+            )
+
+    try:
+        job = job_manager.submit(filename=filename, task=task)
+    except IngestionQueueFullException:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Слишком много документов в очереди, попробуйте позже",
+        )
+
+    return {"status": "accepted", "job_id": job.id}
+
+
+@router.get("/files/jobs/{job_id}")
+async def get_upload_job(
+        job_id: str,
+        job_manager: IngestionJobManager = Depends(get_ingestion_job_manager),
+):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Задача не найдена")
+    return {"status": "success", "job": job}
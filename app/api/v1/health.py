@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+
+from app.core.metrics import get_metrics
+from app.infrastructure.persistence.postgres.connection.session import SessionManager
+
+router = APIRouter(prefix="/health", tags=["Health check"])
+
+
+@router.get("/db")
+async def database_health():
+    return {"status": "success", "pools": SessionManager().pool_status()}
+
+
+@router.get("/metrics")
+async def metrics():
+    return {"status": "success", "metrics": get_metrics().snapshot()}
@@ -0,0 +1,101 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable
+from uuid import uuid4
+
+from loguru import logger
+
+from app.core.config.utils import get_settings
+from app.domains.documents.exceptions import IngestionQueueFullException
+from app.domains.documents.schemas import IngestionJobRead, IngestionStatus, StageCallback
+
+
+IngestionTask = Callable[[StageCallback], bool]
+
+
+class IngestionJobManager:
+    """
+    Фоновая загрузка документов на ограниченном пуле потоков.
+
+    Хранит состояние задач в памяти процесса, чтобы эндпоинт мог сразу вернуть ID задачи,
+    а клиент — опрашивать прогресс по этапам.
+    """
+
+    def __init__(self, max_workers: int = None, max_pending: int = None, history_size: int = None):
+        settings = get_settings()
+        self._max_workers = settings.INGESTION_WORKERS if max_workers is None else max_workers
+        self._max_pending = settings.INGESTION_MAX_PENDING if max_pending is None else max_pending
+        self._history_size = settings.INGESTION_JOBS_HISTORY if history_size is None else history_size
+
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="ingestion")
+        self._jobs: OrderedDict[str, IngestionJobRead] = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+
+    def submit(self, filename: str | None, task: IngestionTask) -> IngestionJobRead:
+        now = datetime.now()
+        job = IngestionJobRead(id=uuid4().hex, filename=filename, created_at=now, updated_at=now)
+
+        with self._lock:
+            if self._pending >= self._max_pending:
+                raise IngestionQueueFullException(f"Too many pending ingestion jobs: {self._pending}")
+            self._pending += 1
+            self._jobs[job.id] = job
+            self._evict_finished()
+
+        self._executor.submit(self._run, job.id, task)
+        return job.model_copy()
+
+
+    def get(self, job_id: str) -> IngestionJobRead | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy() if job is not None else None
+
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+
+    def _run(self, job_id: str, task: IngestionTask) -> None:
+        self._update(job_id, status=IngestionStatus.RUNNING)
+        try:
+            result = task(lambda stage: self._update(job_id, stage=stage))
+            if result:
+                self._update(job_id, status=IngestionStatus.SUCCESS)
+            else:
+                self._update(job_id, status=IngestionStatus.FAILED, error="Не удалось загрузить документ")
+        except Exception as e:
+            logger.exception(f"Ingestion job {job_id} failed")
+            self._update(job_id, status=IngestionStatus.FAILED, error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            self._jobs[job_id] = job.model_copy(update={**fields, "updated_at": datetime.now()})
+
+
+    def _evict_finished(self) -> None:
+        # Вызывается под self._lock: вытесняем самые старые завершённые задачи
+        finished = (IngestionStatus.SUCCESS, IngestionStatus.FAILED)
+        overflow = len(self._jobs) - self._history_size
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.status in finished]:
+            if overflow <= 0:
+                break
+            del self._jobs[job_id]
+            overflow -= 1
+
+
+@lru_cache
+def get_ingestion_job_manager() -> IngestionJobManager:
+    return IngestionJobManager()
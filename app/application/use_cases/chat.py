@@ -1,9 +1,12 @@
+from typing import AsyncIterator, Iterator
+
 from loguru import logger
 
 from app.domains.chats.service import ChatService
 from app.domains.llm.interface import LLMInterface
 from app.domains.vector_db.service import VectorDBService
 from app.domains.agent.interface import AgentInterface
+from app.domains.agent.models import AgentEvent, AgentEventType
 from app.domains.chats.schemas import MessageInput, AuthorRole
 
 
@@ -23,25 +26,79 @@ class ChatUseCase:
         self.agent = agent
 
 
-    def _chat(self, new_message: str):
+    async def _chat(self, new_message: str):
 
-        new_mes = self.chat_service.add_message_sync(
-            MessageInput(text=new_message, author=AuthorRole.HUMAN)
+        # Вопрос и ответ сохраняются одной транзакцией в конце хода
+        self.chat_service.start_turn(MessageInput(text=new_message, author=AuthorRole.HUMAN))
+        answer = await self.agent.process(
+            user_id=self.user_id,
+            chat_service=self.chat_service,
+            llm=self.llm,
+            vector_db_service=self.vector_db_service,
         )
-        logger.info(f"new message: {new_mes}")
+        await self.chat_service.save_turn(answer)
+
+        return answer
+
+
+    def _chat_sync(self, new_message: str):
+
+        self.chat_service.start_turn(MessageInput(text=new_message, author=AuthorRole.HUMAN))
         answer = self.agent.process_sync(
             user_id=self.user_id,
             chat_service=self.chat_service,
             llm=self.llm,
             vector_db_service=self.vector_db_service,
         )
+        self.chat_service.save_turn_sync(answer)
 
         return answer
 
-    def execute(self, new_message: str) -> str | None:
+    async def execute(self, new_message: str) -> str | None:
+        try:
+            answer = await self._chat(new_message)
+            return answer
+        except Exception as e:
+            print(f"Error!: {e}")
+            return None
+
+    def execute_sync(self, new_message: str) -> str | None:
         try:
-            answer = self._chat(new_message)
+            answer = self._chat_sync(new_message)
             return answer
         except Exception as e:
             print(f"Error!: {e}")
             return None
+
+    async def stream(self, new_message: str) -> AsyncIterator[AgentEvent]:
+        try:
+            self.chat_service.start_turn(MessageInput(text=new_message, author=AuthorRole.HUMAN))
+            async for event in self.agent.stream(
+                user_id=self.user_id,
+                chat_service=self.chat_service,
+                llm=self.llm,
+                vector_db_service=self.vector_db_service,
+            ):
+                # Ход сохраняется до отправки итогового ответа клиенту
+                if event.type == AgentEventType.ANSWER:
+                    await self.chat_service.save_turn(event.data)
+                yield event
+        except Exception as e:
+            logger.exception(f"Error!: {e}")
+            yield AgentEvent(type=AgentEventType.ERROR, data="Не удалось получить ответ")
+
+    def stream_sync(self, new_message: str) -> Iterator[AgentEvent]:
+        try:
+            self.chat_service.start_turn(MessageInput(text=new_message, author=AuthorRole.HUMAN))
+            for event in self.agent.stream_sync(
+                user_id=self.user_id,
+                chat_service=self.chat_service,
+                llm=self.llm,
+                vector_db_service=self.vector_db_service,
+            ):
+                if event.type == AgentEventType.ANSWER:
+                    self.chat_service.save_turn_sync(event.data)
+                yield event
+        except Exception as e:
+            logger.exception(f"Error!: {e}")
+            yield AgentEvent(type=AgentEventType.ERROR, data="Не удалось получить ответ")
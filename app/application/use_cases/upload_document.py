@@ -1,11 +1,22 @@
 import io
+from typing import Callable, Iterable, Iterator, Optional, TypeVar
 
 from app.core.config.utils import get_settings
+from app.domains.agent.answer_cache_interface import AnswerCacheInterface
 from app.domains.documents.service import DocumentService
 from app.domains.storage.service import StorageService
 from app.domains.users.service import UserService
 from app.domains.vector_db.service import VectorDBService
-from app.domains.documents.schemas import PDFBase, DocumentCreate
+from app.domains.documents.schemas import PDFBase, DocumentCreate, IngestionStage, StageCallback
+
+
+T = TypeVar("T")
+
+
+def _notify_when_exhausted(items: Iterable[T], callback: Callable[[], None]) -> Iterator[T]:
+    # Этапы конвейера ленивые, поэтому этап считается пройденным, когда его итератор исчерпан
+    yield from items
+    callback()
 
 
 class UploadDocumentUseCase:
@@ -14,28 +25,49 @@ class UploadDocumentUseCase:
             document_service: DocumentService,
             storage_service: StorageService,
             user_service: UserService,
-            vector_db_service: VectorDBService
+            vector_db_service: VectorDBService,
+            answer_cache: Optional[AnswerCacheInterface] = None,
     ):
         self.document_service = document_service
         self.storage_service = storage_service
         self.user_service = user_service
         self.vector_db_service = vector_db_service
+        self.answer_cache = answer_cache
 
 
-    def _upload_document(self, filename: str, file_obj: io.BytesIO):
+    def _upload_document(self, filename: str, file_obj: io.BytesIO, on_stage: StageCallback):
         settings = get_settings()
         folder = settings.B2_STANDARD_PATH
-        new_file_name = self.document_service.generate_name()
+        new_file_name = self.document_service.generate_content_name(file_obj.getvalue())
+
+        # Сохранение в хранилище. Клиент S3 может закрыть переданный поток,
+        # поэтому отдаём ему отдельный буфер, а исходный читаем парсером
+        key = self.storage_service.storage.save(io.BytesIO(file_obj.getvalue()), new_file_name, folder)
+        on_stage(IngestionStage.STORED)
 
-        # Получение чанков из pdf
-        file_pdf = self.document_service.parser.get_pdf(file_obj, filename)
-        chunks = self.document_service.divide_into_chunks(pdf_model=file_pdf)
+        if self.document_service.document_repo.get_by_key_sync(key) is not None:
+            # Этот файл пользователь уже загружал, его чанки уже в индексе
+            on_stage(IngestionStage.INDEXED)
+            return True
 
-        # Сохранение в хранилище
-        key = self.storage_service.storage.save(file_obj, new_file_name, folder)
+        # Страницы и чанки читаются лениво, в памяти держится только текущая пачка
+        pages = _notify_when_exhausted(
+            self.document_service.parser.iter_pages(file_obj, filename),
+            lambda: on_stage(IngestionStage.PARSED),
+        )
+        chunks = _notify_when_exhausted(
+            self.document_service.iter_chunks(pages, file_id=key),
+            lambda: on_stage(IngestionStage.CHUNKED),
+        )
 
-        # Загрузка чанков в векторную базу данных
-        self.vector_db_service.vector_storage.upsert_batches(chunks=chunks)
+        # Загрузка чанков в векторную базу данных. Ключ файла зависит от содержимого,
+        # поэтому повторная загрузка того же файла после сбоя продолжит с места остановки
+        self.vector_db_service.vector_storage.upsert_batches(
+            chunks=chunks,
+            on_embedded=lambda: on_stage(IngestionStage.EMBEDDED),
+            checkpoint_key=key,
+        )
+        on_stage(IngestionStage.INDEXED)
 
         # Сохранение мета информации в бд
         document_model = DocumentCreate(
@@ -45,14 +77,19 @@ class UploadDocumentUseCase:
         )
         self.document_service.document_repo.create_sync(document_model)
 
+        # С новым документом на старые вопросы может найтись ответ лучше
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate_user(self.document_service.user_id)
+
         return True
 
 
-    def execute(self, filename: str, file_obj: io.BytesIO):
+    def execute(self, filename: str, file_obj: io.BytesIO, on_stage: StageCallback = None):
         try:
             self._upload_document(
                 filename=filename,
-                file_obj=file_obj
+                file_obj=file_obj,
+                on_stage=on_stage if on_stage is not None else lambda stage: None,
             )
             return True
         except Exception as e:
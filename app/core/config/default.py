@@ -22,12 +22,84 @@ class DefaultSettings(BaseSettings):
     POSTGRES_PORT: int = int(environ.get("POSTGRES_PORT", "5432")[-4:])
     POSTGRES_PASSWORD: str = environ.get("POSTGRES_PASSWORD", "hackme")
 
+    DB_ECHO: bool = environ.get("DB_ECHO", "false").lower() == "true"
+    DB_POOL_SIZE: int = int(environ.get("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(environ.get("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: int = int(environ.get("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(environ.get("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+
     QDRANT_HOST: str = environ.get("QDRANT_HOST", "localhost")
     QDRANT_PORT: int = int(environ.get("QDRANT_PORT", "6333")[-4:])
+    QDRANT_INIT_ON_STARTUP: bool = environ.get("QDRANT_INIT_ON_STARTUP", "true").lower() == "true"
+    QDRANT_HNSW_M: int = int(environ.get("QDRANT_HNSW_M", "16"))
+    QDRANT_HNSW_PAYLOAD_M: int = int(environ.get("QDRANT_HNSW_PAYLOAD_M", "16"))
+    QDRANT_QUANTIZATION: str = environ.get("QDRANT_QUANTIZATION", "none")
+    QDRANT_QUANTIZATION_ALWAYS_RAM: bool = environ.get("QDRANT_QUANTIZATION_ALWAYS_RAM", "true").lower() == "true"
+    QDRANT_QUANTIZATION_RESCORE: bool = environ.get("QDRANT_QUANTIZATION_RESCORE", "true").lower() == "true"
+    QDRANT_QUANTIZATION_OVERSAMPLING: float = float(environ.get("QDRANT_QUANTIZATION_OVERSAMPLING", "2.0"))
+    QDRANT_VECTORS_ON_DISK: bool = environ.get("QDRANT_VECTORS_ON_DISK", "false").lower() == "true"
+    QDRANT_PAYLOAD_ON_DISK: bool = environ.get("QDRANT_PAYLOAD_ON_DISK", "false").lower() == "true"
+    QDRANT_HYBRID: bool = environ.get("QDRANT_HYBRID", "false").lower() == "true"
+    QDRANT_HYBRID_PREFETCH_MULTIPLIER: int = int(environ.get("QDRANT_HYBRID_PREFETCH_MULTIPLIER", "4"))
+    QDRANT_UPLOAD_QUEUE_SIZE: int = int(environ.get("QDRANT_UPLOAD_QUEUE_SIZE", "2"))
+    QDRANT_RETRY_BASE_DELAY: float = float(environ.get("QDRANT_RETRY_BASE_DELAY", "0.5"))
+    QDRANT_CHECKPOINT_DIR: str = environ.get("QDRANT_CHECKPOINT_DIR", ".cache/upsert_checkpoints")
+
+    EMBEDDING_MODEL: str = environ.get(
+        "EMBEDDING_MODEL",
+        "/home/daetoya/.cache/huggingface/hub/models--BAAI--bge-m3/snapshots/5617a9f61b028005a4858fdac845db406aefb181",
+    )
+    EMBEDDING_DEVICE: str = environ.get("EMBEDDING_DEVICE", "cuda")
+    EMBEDDING_CPU_THREADS: int = int(environ.get("EMBEDDING_CPU_THREADS", "0"))
+    EMBEDDING_WARMUP: bool = environ.get("EMBEDDING_WARMUP", "true").lower() == "true"
+    EMBEDDING_CACHE_ENABLED: bool = environ.get("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    EMBEDDING_CACHE_PATH: str = environ.get("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite3")
+    EMBEDDING_CACHE_MEMORY_SIZE: int = int(environ.get("EMBEDDING_CACHE_MEMORY_SIZE", "10000"))
+    QUERY_CACHE_ENABLED: bool = environ.get("QUERY_CACHE_ENABLED", "true").lower() == "true"
+    QUERY_CACHE_SIZE: int = int(environ.get("QUERY_CACHE_SIZE", "2048"))
+    QUERY_CACHE_TTL: int = int(environ.get("QUERY_CACHE_TTL", "3600"))
+
+    RERANK_ENABLED: bool = environ.get("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL: str = environ.get("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+    RERANK_DEVICE: str = environ.get("RERANK_DEVICE", "cpu")
+    RERANK_CANDIDATES: int = int(environ.get("RERANK_CANDIDATES", "30"))
+    RERANK_TOP_K: int = int(environ.get("RERANK_TOP_K", "5"))
+    RERANK_BATCH_SIZE: int = int(environ.get("RERANK_BATCH_SIZE", "32"))
+    RERANK_CACHE_SIZE: int = int(environ.get("RERANK_CACHE_SIZE", "4096"))
+
+    ANSWER_CACHE_ENABLED: bool = environ.get("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+    ANSWER_CACHE_THRESHOLD: float = float(environ.get("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_TTL: int = int(environ.get("ANSWER_CACHE_TTL", "86400"))
+    ANSWER_CACHE_SIZE: int = int(environ.get("ANSWER_CACHE_SIZE", "256"))
+
+    ROUTER_ENABLED: bool = environ.get("ROUTER_ENABLED", "false").lower() == "true"
+    ROUTER_SMALL_TALK_THRESHOLD: float = float(environ.get("ROUTER_SMALL_TALK_THRESHOLD", "0.75"))
+    ROUTER_UNSURE_MARGIN: float = float(environ.get("ROUTER_UNSURE_MARGIN", "0.1"))
+    SPECULATIVE_SEARCH_ENABLED: bool = environ.get("SPECULATIVE_SEARCH_ENABLED", "false").lower() == "true"
+    SPECULATIVE_SEARCH_THRESHOLD: float = float(environ.get("SPECULATIVE_SEARCH_THRESHOLD", "0.85"))
+
+    PDF_PARSE_WORKERS: int = int(environ.get("PDF_PARSE_WORKERS", "4"))
+    PDF_PARALLEL_THRESHOLD: int = int(environ.get("PDF_PARALLEL_THRESHOLD", "100"))
 
     CHUNK_SIZE: int = int(environ.get("CHUNK_SIZE", "400"))
     CHUNK_OVERLAP: int = int(environ.get("CHUNK_OVERLAP", "50"))
 
+    CONTEXT_TOKEN_BUDGET: int = int(environ.get("CONTEXT_TOKEN_BUDGET", "6000"))
+    CONTEXT_HISTORY_SHARE: float = float(environ.get("CONTEXT_HISTORY_SHARE", "0.4"))
+    HISTORY_PAGE_SIZE: int = int(environ.get("HISTORY_PAGE_SIZE", "50"))
+    # memory | redis | none
+    CHAT_HISTORY_CACHE: str = environ.get("CHAT_HISTORY_CACHE", "memory")
+    CHAT_HISTORY_WINDOW: int = int(environ.get("CHAT_HISTORY_WINDOW", "50"))
+    CHAT_HISTORY_CACHE_CHATS: int = int(environ.get("CHAT_HISTORY_CACHE_CHATS", "1024"))
+    CHAT_HISTORY_CACHE_TTL: int = int(environ.get("CHAT_HISTORY_CACHE_TTL", "3600"))
+    REDIS_URL: str = environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+    INGESTION_WORKERS: int = int(environ.get("INGESTION_WORKERS", "2"))
+    INGESTION_MAX_PENDING: int = int(environ.get("INGESTION_MAX_PENDING", "32"))
+    INGESTION_JOBS_HISTORY: int = int(environ.get("INGESTION_JOBS_HISTORY", "1000"))
+    INGESTION_BATCH_SIZE: int = int(environ.get("INGESTION_BATCH_SIZE", "256"))
+
     B2_KEY_ID: str | None = environ.get("B2_KEY_ID", None)
     B2_APPLICATION_KEY: str | None = environ.get("B2_APPLICATION_KEY", None)
     B2_ENDPOINT: str | None = environ.get("B2_ENDPOINT", None)
@@ -38,6 +110,9 @@ class DefaultSettings(BaseSettings):
 
     OPENAI_API_KEY: str | None = environ.get("OPENAI_API_KEY", None)
     OPENAI_MODEL: str | None = environ.get("OPENAI_MODEL", None)
+    LLM_STRUCTURED_OUTPUT: bool = environ.get("LLM_STRUCTURED_OUTPUT", "true").lower() == "true"
+    # function_calling | json_schema | json_mode
+    LLM_STRUCTURED_METHOD: str = environ.get("LLM_STRUCTURED_METHOD", "function_calling")
 
     # JWT_SECRET_KEY: str = environ.get("JWT_SECRET_KEY", "secret")
     # JWT_AUDIENCE: str = environ.get("JWT_AUDIENCE", "promoters")
@@ -82,12 +157,22 @@ class DefaultSettings(BaseSettings):
             "port": self.POSTGRES_PORT,
         }
 
+    # @property
+    # def database_uri(self) -> str:
+    #     """
+    #     Get uri for connection with database.
+    #     """
+    #     return "postgresql+asyncpg://{user}:{password}@{host}:{port}/{database}".format(
+    #         **self.database_settings,
+    #     )
+
     @property
     def database_uri(self) -> str:
         """
-        Get uri for connection with database.
+        Get async uri for the same local SQLite database as database_uri_sync.
         """
-        return "postgresql+asyncpg://{user}:{password}@{host}:{port}/{database}".format(
+        # Async chat path and sync documents/users path must see the same tables
+        return "sqlite+aiosqlite:///{database}".format(
             **self.database_settings,
         )
 
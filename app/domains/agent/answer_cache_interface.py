@@ -0,0 +1,35 @@
+from abc import ABC, abstractmethod
+from typing import List
+
+from app.domains.agent.models import CachedAnswer
+from app.domains.documents.schemas import ChunkBase
+
+
+class AnswerCacheInterface(ABC):
+
+    @abstractmethod
+    def lookup(self, user_id: int, question_vector: List[float], context_key: str = "") -> CachedAnswer | None:
+        """Готовый ответ на достаточно похожий вопрос по материалам пользователя в том же контексте беседы"""
+        pass
+
+    @abstractmethod
+    def store(
+            self,
+            user_id: int,
+            question_vector: List[float],
+            answer: str,
+            chunks: List[ChunkBase],
+            context_key: str = "",
+    ) -> None:
+        """Запоминает ответ вместе с фрагментами, на которых он построен"""
+        pass
+
+    @abstractmethod
+    def invalidate_user(self, user_id: int) -> None:
+        """Сбрасывает ответы пользователя: его материалы изменились"""
+        pass
+
+    @abstractmethod
+    def invalidate_file(self, file_id: str) -> None:
+        """Сбрасывает ответы, построенные на фрагментах удалённого файла"""
+        pass
@@ -1,13 +1,33 @@
 from abc import ABC, abstractmethod
+from typing import AsyncIterator, Iterator
 
+from app.domains.agent.models import AgentEvent
 from app.domains.chats.service import ChatService
 from app.domains.llm.interface import LLMInterface
 from app.domains.vector_db.service import VectorDBService
 
 
 class AgentInterface(ABC):
+    @abstractmethod
+    async def process(self, user_id: int, chat_service: ChatService, llm: LLMInterface,
+                      vector_db_service: VectorDBService,) -> str:
+        """Основной асинхронный вход в агента"""
+        pass
+
     @abstractmethod
     def process_sync(self, user_id: int, chat_service: ChatService, llm: LLMInterface,
                      vector_db_service: VectorDBService,) -> str:
         """Основной вход в агента"""
         pass
+
+    @abstractmethod
+    def stream(self, user_id: int, chat_service: ChatService, llm: LLMInterface,
+               vector_db_service: VectorDBService,) -> AsyncIterator[AgentEvent]:
+        """Асинхронный потоковый вход в агента"""
+        pass
+
+    @abstractmethod
+    def stream_sync(self, user_id: int, chat_service: ChatService, llm: LLMInterface,
+                    vector_db_service: VectorDBService,) -> Iterator[AgentEvent]:
+        """Потоковый вход в агента: статусы, фрагменты ответа и итоговый ответ"""
+        pass
@@ -1,8 +1,17 @@
+from enum import Enum
 from typing import List
 
 from pydantic import BaseModel, Field
 
 from app.domains.chats.schemas import MessageRead
+from app.domains.documents.schemas import ChunkBase
+
+
+class QuestionRoute(str, Enum):
+    ANSWER = "answer"
+    SEARCH = "search"
+    # Роутер не уверен: llm и поиск по вопросу запускаются параллельно
+    SPECULATE = "speculate"
 
 
 class AgentState(BaseModel):
@@ -11,8 +20,38 @@ class AgentState(BaseModel):
     history: List[MessageRead] = Field(default_factory=list, description="Последние сообщения")
     is_need_more_context: bool = Field(default=False, description="Нужно ли искать информацию в учебных материалах?")
     find_context: str = Field(default="", description="Поисковый запрос для векторной базы данных")
+    find_contexts: List[str] = Field(default_factory=list, description="Переформулировки поискового запроса")
     extra_context: str = Field(default="Дополнительная информация в базе данных не найдена.", description="доп контекст")
+    context_chunks: List[ChunkBase] = Field(default_factory=list, description="Найденные чанки до отбора по токенам")
     user_id: int = Field(description="ID пользователя")
     top_k: int = Field(default=10, description="Кол-во доп. контекста")
-    context_length: int = Field(default=500, description="Ограничение истории чата")
+    context_length: int = Field(default=4000, description="Ограничение истории чата в токенах")
     find_count: int = Field(default=0, description="Кол-во циклов поиска")
+    question_vector: List[float] = Field(default_factory=list, description="Эмбеддинг вопроса для кэша ответов")
+    is_cached_answer: bool = Field(default=False, description="Ответ взят из кэша, llm не вызывалась")
+    route: QuestionRoute = Field(default=QuestionRoute.ANSWER, description="Решение роутера до первого вызова llm")
+    speculative_query: str = Field(default="", description="Запрос, по которому искали параллельно с llm")
+    speculative_chunks: List[ChunkBase] = Field(
+        default_factory=list,
+        description="Результаты поиска, запущенного параллельно с первым вызовом llm",
+    )
+
+
+class CachedAnswer(BaseModel):
+    """Ответ из семантического кэша"""
+    answer: str = Field(description="Ответ llm на похожий вопрос")
+    chunks: List[ChunkBase] = Field(default_factory=list, description="Фрагменты, на которых построен ответ")
+    similarity: float = Field(description="Косинусная близость вопросов")
+
+
+class AgentEventType(str, Enum):
+    STATUS = "status"
+    TOKEN = "token"
+    ANSWER = "answer"
+    ERROR = "error"
+
+
+class AgentEvent(BaseModel):
+    """Событие потокового ответа агента"""
+    type: AgentEventType = Field(description="Тип события")
+    data: str = Field(default="", description="Текст события: статус, фрагмент или полный ответ")
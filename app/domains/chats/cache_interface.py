@@ -0,0 +1,29 @@
+from abc import ABC, abstractmethod
+from typing import List
+
+from app.domains.chats.schemas import ChatHistoryWindow, MessageRead
+
+
+class ChatHistoryCacheInterface(ABC):
+    """Окно последних сообщений чата: заполняется при первом чтении и дополняется при записи"""
+
+    window_size: int
+
+    @abstractmethod
+    def get(self, chat_id: int) -> ChatHistoryWindow | None:
+        """Окно чата или None, если чата нет в кэше"""
+        pass
+
+    @abstractmethod
+    def set(self, chat_id: int, messages: List[MessageRead], complete: bool) -> None:
+        """Заменяет окно чата последними window_size сообщениями"""
+        pass
+
+    @abstractmethod
+    def append(self, chat_id: int, messages: List[MessageRead]) -> None:
+        """Дописывает новые сообщения в окно, если чат уже в кэше"""
+        pass
+
+    @abstractmethod
+    def invalidate(self, chat_id: int) -> None:
+        pass
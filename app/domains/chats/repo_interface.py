@@ -10,14 +10,32 @@ class ChatRepositoryInterface(BaseCRUDInterface[ChatRead, ChatCreate, ChatUpdate
     async def add_message(self, message: MessageCreate) -> MessageRead: ...
 
     @abstractmethod
-    async def get_last_messages(self, chat_id: int, context_length: int) -> List[MessageRead]: ...
+    async def add_messages(self, messages: List[MessageCreate]) -> List[MessageRead]:
+        """Сохраняет несколько сообщений одной транзакцией"""
+        ...
+
+    @abstractmethod
+    async def get_last_messages(self, chat_id: int, context_length: int) -> List[MessageRead]:
+        """Последние сообщения чата в хронологическом порядке, суммарно не больше context_length токенов"""
+        ...
+
+    @abstractmethod
+    async def get_recent_messages(self, chat_id: int, limit: int) -> List[MessageRead]:
+        """Не больше limit последних сообщений чата в хронологическом порядке"""
+        ...
 
     @abstractmethod
     def add_message_sync(self, message: MessageCreate) -> MessageRead: ...
 
+    @abstractmethod
+    def add_messages_sync(self, messages: List[MessageCreate]) -> List[MessageRead]: ...
+
     @abstractmethod
     def get_last_messages_sync(self, chat_id: int, context_length: int) -> List[MessageRead]: ...
 
+    @abstractmethod
+    def get_recent_messages_sync(self, chat_id: int, limit: int) -> List[MessageRead]: ...
+
 
 
 class MessageRepositoryInterface(BaseCRUDInterface[MessageRead, MessageCreate, MessageUpdate]):
@@ -37,8 +37,19 @@ class MessageInput(MessageUserInput):
     author: Annotated[AuthorRole, Field(description="Автор сообщения")]
 
 
+class MessageSource(BaseModel):
+    file_id: Annotated[str | None, Field(default=None, description="Идентификатор файла")]
+    source: Annotated[str, Field(description="Название файла")]
+    page_num: Annotated[int, Field(description="Номер страницы")]
+    chunk_index: Annotated[int, Field(description="Индекс чанка")]
+
+
 class MessageBase(MessageInput):
     chat_id: Annotated[int, Field(description="ID чата, кот-му принадлежит сообщение")]
+    sources: Annotated[
+        list[MessageSource] | None,
+        Field(default=None, description="Фрагменты учебных материалов, найденные для ответа"),
+    ]
 
 
 class MessageCreate(MessageBase):
@@ -46,7 +57,13 @@ class MessageCreate(MessageBase):
 
 
 class MessageRead(BaseSchema, MessageBase):
-    pass
+    length: Annotated[int, Field(default=0, description="Длина текста в символах")]
+    token_count: Annotated[int, Field(default=0, description="Длина текста в токенах модели")]
+
+
+class ChatHistoryWindow(BaseModel):
+    messages: Annotated[list[MessageRead], Field(default_factory=list, description="Последние сообщения чата по порядку")]
+    complete: Annotated[bool, Field(default=False, description="В окне вся история чата, старых сообщений нет")]
 
 
 class MessageUpdate(MessageBase):
@@ -1,40 +1,172 @@
-from typing import List
+from datetime import datetime, UTC
+from typing import List, Optional
 
+from app.core.metrics import get_metrics
+from app.domains.chats.cache_interface import ChatHistoryCacheInterface
 from app.domains.chats.repo_interface import (ChatRepositoryInterface,
                                               MessageRepositoryInterface)
-from app.domains.chats.schemas import MessageCreate, MessageRead, MessageInput
+from app.domains.chats.schemas import (MessageCreate, MessageRead, MessageInput, ChatHistoryWindow,
+                                       MessageSource, AuthorRole)
+from app.domains.chats.utils import select_within_budget
+from app.domains.documents.schemas import ChunkBase
 
 
 class ChatService:
 
-    def __init__(self, chat_repo: ChatRepositoryInterface, chat_id: int = None):
+    def __init__(
+            self,
+            chat_repo: ChatRepositoryInterface,
+            chat_id: int = None,
+            history_cache: Optional[ChatHistoryCacheInterface] = None,
+    ):
         self.chat_repo = chat_repo
         self.chat_id = chat_id
+        self.history_cache = history_cache
+        # Незавершённый ход: вопрос и найденные источники пишутся в базу вместе с ответом
+        self._turn_message: MessageInput | None = None
+        self._turn_sources: dict[tuple, MessageSource] = {}
 
 
-    async def add_message(self, message: MessageInput) -> MessageRead:
-        message_create = MessageCreate(
+    def _make_message_create(self, message: MessageInput, sources: List[MessageSource] = None) -> MessageCreate:
+        return MessageCreate(
             chat_id=self.chat_id,
             text=message.text,
             author=message.author,
+            sources=sources,
         )
-        return await self.chat_repo.add_message(message_create)
+
+
+    def start_turn(self, message: MessageInput) -> None:
+        """Начинает ход: вопрос виден в истории сразу, а сохраняется вместе с ответом в save_turn"""
+        self._turn_message = message
+        self._turn_sources = {}
+
+
+    def add_turn_sources(self, chunks: List[ChunkBase]) -> None:
+        for chunk in chunks:
+            source = MessageSource(
+                file_id=chunk.file_id,
+                source=chunk.source,
+                page_num=chunk.page_num,
+                chunk_index=chunk.chunk_index,
+            )
+            self._turn_sources.setdefault((source.file_id, source.source, source.page_num, source.chunk_index), source)
+
+
+    def _get_turn_messages(self, answer: str) -> List[MessageCreate]:
+        if self._turn_message is None:
+            raise RuntimeError("Ход не начат: сначала вызовите start_turn")
+        return [
+            self._make_message_create(self._turn_message),
+            self._make_message_create(
+                MessageInput(text=answer, author=AuthorRole.AI),
+                sources=list(self._turn_sources.values()) or None,
+            ),
+        ]
+
+
+    def _finish_turn(self, saved: List[MessageRead]) -> List[MessageRead]:
+        self._turn_message = None
+        self._turn_sources = {}
+        self._remember_messages(saved)
+        return saved
+
+
+    def _with_turn_message(self, history: List[MessageRead]) -> List[MessageRead]:
+        if self._turn_message is None:
+            return history
+        # Вопрос ещё не сохранён: id=0, число токенов досчитает ContextAssembler
+        now = datetime.now(UTC)
+        pending = MessageRead(
+            id=0,
+            created_at=now,
+            updated_at=now,
+            **self._make_message_create(self._turn_message).model_dump(),
+        )
+        return [*history, pending]
+
+
+    def _remember_messages(self, messages: List[MessageRead]) -> None:
+        if self.history_cache is not None:
+            self.history_cache.append(self.chat_id, messages)
+
+
+    def _get_cached_window(self) -> ChatHistoryWindow | None:
+        if self.history_cache is None:
+            return None
+        window = self.history_cache.get(self.chat_id)
+        get_metrics().increment("chat_history.cache_misses" if window is None else "chat_history.cache_hits")
+        return window
+
+
+    def _fill_window(self, messages: List[MessageRead]) -> ChatHistoryWindow:
+        window = ChatHistoryWindow(messages=messages, complete=len(messages) < self.history_cache.window_size)
+        self.history_cache.set(self.chat_id, window.messages, window.complete)
+        return window
+
+
+    @staticmethod
+    def _select_from_window(window: ChatHistoryWindow, context_length: int) -> List[MessageRead] | None:
+        # Окно подходит, если бюджет исчерпан внутри него или старше сообщений в чате нет
+        messages, is_full = select_within_budget(window.messages, context_length)
+        return messages if is_full or window.complete else None
+
+
+    async def add_message(self, message: MessageInput) -> MessageRead:
+        result = await self.chat_repo.add_message(self._make_message_create(message))
+        self._remember_messages([result])
+        return result
+
+
+    async def save_turn(self, answer: str) -> List[MessageRead]:
+        """Сохраняет вопрос и ответ хода одной транзакцией"""
+        return self._finish_turn(await self.chat_repo.add_messages(self._get_turn_messages(answer)))
 
 
     async def get_last_messages(self, context_length: int) -> List[MessageRead]:
+        return self._with_turn_message(await self._get_saved_messages(context_length))
+
+
+    async def _get_saved_messages(self, context_length: int) -> List[MessageRead]:
+        window = self._get_cached_window()
+        if window is None and self.history_cache is not None:
+            window = self._fill_window(
+                await self.chat_repo.get_recent_messages(self.chat_id, self.history_cache.window_size)
+            )
+        if window is not None and (messages := self._select_from_window(window, context_length)) is not None:
+            return messages
+
         result = await self.chat_repo.get_last_messages(self.chat_id, context_length)
         return result
 
 
     def add_message_sync(self, message: MessageInput) -> MessageRead:
-        message_create = MessageCreate(
-            chat_id=self.chat_id,
-            text=message.text,
-            author=message.author,
-        )
-        return self.chat_repo.add_message_sync(message_create)
+        result = self.chat_repo.add_message_sync(self._make_message_create(message))
+        self._remember_messages([result])
+        return result
+
+
+    def save_turn_sync(self, answer: str) -> List[MessageRead]:
+        return self._finish_turn(self.chat_repo.add_messages_sync(self._get_turn_messages(answer)))
 
 
     def get_last_messages_sync(self, context_length: int) -> List[MessageRead]:
+        return self._with_turn_message(self._get_saved_messages_sync(context_length))
+
+
+    def _get_saved_messages_sync(self, context_length: int) -> List[MessageRead]:
+        window = self._get_cached_window()
+        if window is None and self.history_cache is not None:
+            window = self._fill_window(
+                self.chat_repo.get_recent_messages_sync(self.chat_id, self.history_cache.window_size)
+            )
+        if window is not None and (messages := self._select_from_window(window, context_length)) is not None:
+            return messages
+
         result = self.chat_repo.get_last_messages_sync(self.chat_id, context_length)
         return result
+
+
+    def invalidate_history(self) -> None:
+        if self.history_cache is not None:
+            self.history_cache.invalidate(self.chat_id)
@@ -0,0 +1,21 @@
+from typing import List
+
+from app.domains.chats.schemas import MessageRead
+
+
+def select_within_budget(messages: List[MessageRead], context_length: int) -> tuple[List[MessageRead], bool]:
+    """
+    Последние сообщения, суммарно не больше context_length токенов, в хронологическом порядке.
+    Второе значение — исчерпан ли бюджет, то есть могли ли пригодиться более старые сообщения.
+    """
+    selected = []
+    used = 0
+    for message in reversed(messages):
+        # Самое новое сообщение берём всегда: это текущий вопрос, лишнее обрежет ContextAssembler
+        if used + message.token_count > context_length and selected:
+            selected.reverse()
+            return selected, True
+        selected.append(message)
+        used += message.token_count
+    selected.reverse()
+    return selected, False
@@ -0,0 +1,16 @@
+class IngestionException(Exception):
+    """Общая ошибка фоновой загрузки документов."""
+
+    pass
+
+
+class IngestionQueueFullException(IngestionException):
+    """Очередь задач загрузки переполнена."""
+
+    pass
+
+
+class DocumentParseException(IngestionException):
+    """Документ не удалось разобрать: загрузка должна упасть, а не проиндексировать его частично."""
+
+    pass
@@ -1,9 +1,15 @@
 import io
 from abc import ABC, abstractmethod
+from typing import Iterator
 
-from app.domains.documents.schemas import PDFBase
+from app.domains.documents.schemas import PDFBase, PDFPage
 
 
 class ParserInterface(ABC):
     @abstractmethod
     def get_pdf(self, file_bytes: io.BytesIO, filename: str) -> PDFBase: ...
+
+    @abstractmethod
+    def iter_pages(self, file_bytes: io.BytesIO, filename: str) -> Iterator[PDFPage]:
+        """Отдаёт страницы по одной, не собирая весь документ в памяти"""
+        ...
@@ -1,5 +1,7 @@
+from datetime import datetime
+from enum import Enum
 from uuid import UUID
-from typing import Annotated
+from typing import Annotated, Callable
 
 from pydantic import BaseModel, ConfigDict, Field
 
@@ -56,3 +58,32 @@ class DocumentRead(BaseSchema, DocumentBase):
 class DocumentUpdate(BaseModel):
     user_id: Annotated[int, Field(default=None)]
     key: Annotated[str, Field(default=None)]
+
+
+class IngestionStage(str, Enum):
+    QUEUED = "queued"
+    STORED = "stored"
+    PARSED = "parsed"
+    CHUNKED = "chunked"
+    EMBEDDED = "embedded"
+    INDEXED = "indexed"
+
+
+class IngestionStatus(str, Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCESS = "success"
+    FAILED = "failed"
+
+
+class IngestionJobRead(BaseModel):
+    id: Annotated[str, Field(description="ID задачи загрузки")]
+    filename: Annotated[str | None, Field(default=None, description="Название загружаемого файла")]
+    status: Annotated[IngestionStatus, Field(default=IngestionStatus.PENDING, description="Статус задачи")]
+    stage: Annotated[IngestionStage, Field(default=IngestionStage.QUEUED, description="Последний пройденный этап")]
+    error: Annotated[str | None, Field(default=None, description="Текст ошибки")]
+    created_at: Annotated[datetime, Field(description="Время постановки в очередь")]
+    updated_at: Annotated[datetime, Field(description="Время последнего изменения")]
+
+
+StageCallback = Callable[[IngestionStage], None]
@@ -1,12 +1,14 @@
-from uuid import uuid4
+import hashlib
+from uuid import NAMESPACE_URL, uuid4, uuid5
 from pathlib import Path
+from typing import Iterable, Iterator
 
 import pymupdf
 from pydantic import ValidationError
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 from app.core.config.utils import get_settings
-from app.domains.documents.schemas import PDFBase, ChunkBase
+from app.domains.documents.schemas import PDFBase, PDFPage, ChunkBase
 from app.domains.documents.repo_interface import DocumentRepositoryInterface
 from app.domains.documents.parser_interface import ParserInterface
 
@@ -25,22 +27,26 @@ class DocumentServiceBase:
 
 
 
-    def _divide_page_into_chunks(self, pdf_model: PDFBase, page_index: int, user_id: int) -> list[ChunkBase]:
+    def _split_page(self, page: PDFPage, user_id: int, file_id: str | None = None) -> list[ChunkBase]:
         chunks = list()
-        texts = self._text_splitter.split_text(pdf_model.pages[page_index].content)
+        texts = self._text_splitter.split_text(page.content)
         for chunk_index, chunk_text in enumerate(texts):
             chunk_model = ChunkBase(
                 user_id=user_id,
                 content=chunk_text,
-                file_id=None,
-                source=pdf_model.pages[page_index].metadata.source,
-                page_num=pdf_model.pages[page_index].metadata.page,
+                file_id=file_id,
+                source=page.metadata.source,
+                page_num=page.metadata.page,
                 chunk_index=chunk_index,
             )
             chunks.append(chunk_model)
         return chunks
 
 
+    def _divide_page_into_chunks(self, pdf_model: PDFBase, page_index: int, user_id: int) -> list[ChunkBase]:
+        return self._split_page(pdf_model.pages[page_index], user_id)
+
+
     def _divide_into_chunks_by_user_id(self, pdf_model: PDFBase, user_id: int) -> list[ChunkBase]:
         chunks = []
         for page_index in range(len(pdf_model.pages)):
@@ -50,6 +56,17 @@ class DocumentServiceBase:
         return chunks
 
 
+    def _iter_chunks_by_user_id(
+            self,
+            pages: Iterable[PDFPage],
+            user_id: int,
+            file_id: str | None = None,
+    ) -> Iterator[ChunkBase]:
+        # Страницы читаются лениво: в памяти только текущая страница и её чанки
+        for page in pages:
+            yield from self._split_page(page, user_id, file_id)
+
+
 class DocumentService(DocumentServiceBase):
     def __init__(
             self,
@@ -70,5 +87,13 @@ class DocumentService(DocumentServiceBase):
     def generate_name():
         return uuid4()
 
+    def generate_content_name(self, content: bytes):
+        # Одинаковый файл одного пользователя всегда получает один и тот же ключ,
+        # поэтому повторная загрузка после сбоя попадает в те же точки и чекпоинт
+        return uuid5(NAMESPACE_URL, f"{self.user_id}:{hashlib.sha256(content).hexdigest()}")
+
     def divide_into_chunks(self, pdf_model: PDFBase) -> list[ChunkBase]:
         return self._divide_into_chunks_by_user_id(pdf_model, self.user_id)
+
+    def iter_chunks(self, pages: Iterable[PDFPage], file_id: str | None = None) -> Iterator[ChunkBase]:
+        return self._iter_chunks_by_user_id(pages, self.user_id, file_id)
@@ -3,19 +3,34 @@ from typing import List
 from app.domains.documents.schemas import ChunkBase
 
 
+CHUNKS_SEPARATOR = "\n\n"
+
+
+def format_chunk(index: int, chunk: ChunkBase) -> str:
+    # Формируем заголовок для каждого фрагмента
+    header = f"--- ФРАГМЕНТ {index} | ИСТОЧНИК: {chunk.source} | СТРАНИЦА: {chunk.page_num} ---"
+
+    # Собираем блок: заголовок + контент
+    return f"{header}\n{chunk.content.strip()}"
+
+
 def format_chunks_to_context(chunks: List[ChunkBase]) -> str:
     if not chunks:
         return "Дополнительная информация в базе данных не найдена."
 
-    context_parts = []
+    context_parts = [format_chunk(i, chunk) for i, chunk in enumerate(chunks, 1)]
+
+    # Соединяем все части через двойной перенос строки
+    return CHUNKS_SEPARATOR.join(context_parts)
 
-    for i, chunk in enumerate(chunks, 1):
-        # Формируем заголовок для каждого фрагмента
-        header = f"--- ФРАГМЕНТ {i} | ИСТОЧНИК: {chunk.source} | СТРАНИЦА: {chunk.page_num} ---"
 
-        # Собираем блок: заголовок + контент
-        chunk_text = f"{header}\n{chunk.content.strip()}"
-        context_parts.append(chunk_text)
+def merge_ranked_chunks(results: List[List[ChunkBase]], limit: int | None = None) -> List[ChunkBase]:
+    # По очереди берём лучшие чанки каждого списка, повторы между списками отбрасываем
+    merged = {}
+    for rank in range(max((len(chunks) for chunks in results), default=0)):
+        for chunks in results:
+            if rank < len(chunks):
+                chunk = chunks[rank]
+                merged.setdefault((chunk.file_id, chunk.source, chunk.page_num, chunk.chunk_index), chunk)
+    return list(merged.values())[:limit]
 
-    # Соединяем все части через двойной перенос строки
-    return "\n\n".join(context_parts)
@@ -0,0 +1,12 @@
+class LLMException(Exception):
+    """Общая ошибка обращения к llm."""
+
+    pass
+
+
+class StructuredOutputException(LLMException):
+    """Ответ модели не удалось разобрать по схеме."""
+
+    def __init__(self, raw_text: str, message: str = "Ответ модели не соответствует схеме"):
+        super().__init__(message)
+        self.raw_text = raw_text
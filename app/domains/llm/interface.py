@@ -1,12 +1,33 @@
 from abc import ABC, abstractmethod
-from typing import List, Sequence
+from typing import AsyncIterator, Iterator, List, Sequence, TypeVar
 
 from langchain_core.prompt_values import PromptValue
 from langchain_core.messages import AIMessage
+from pydantic import BaseModel
 
 from app.domains.chats.schemas import MessageInput
 
 
+SchemaT = TypeVar("SchemaT", bound=BaseModel)
+
+
 class LLMInterface(ABC):
     @abstractmethod
     def invoke(self, prompt: PromptValue | List[MessageInput] | str | Sequence[str]) -> str: ...
+
+    @abstractmethod
+    def stream(self, prompt: PromptValue | List[MessageInput] | str | Sequence[str]) -> Iterator[str]: ...
+
+    @abstractmethod
+    async def ainvoke(self, prompt: PromptValue | List[MessageInput] | str | Sequence[str]) -> str: ...
+
+    @abstractmethod
+    def astream(self, prompt: PromptValue | List[MessageInput] | str | Sequence[str]) -> AsyncIterator[str]: ...
+
+    @abstractmethod
+    def invoke_structured(self, prompt: PromptValue | str | Sequence[str], schema: type[SchemaT]) -> SchemaT:
+        """Ответ сразу в виде схемы. Если модель вернула невалидный ответ — StructuredOutputException с сырым текстом"""
+        ...
+
+    @abstractmethod
+    async def ainvoke_structured(self, prompt: PromptValue | str | Sequence[str], schema: type[SchemaT]) -> SchemaT: ...
@@ -0,0 +1,10 @@
+class VectorDBException(Exception):
+    """Общая ошибка векторного хранилища."""
+
+    pass
+
+
+class CollectionSchemaMismatchException(VectorDBException):
+    """Существующая коллекция создана с другой схемой векторов, чем ожидают настройки."""
+
+    pass
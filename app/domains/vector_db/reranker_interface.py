@@ -0,0 +1,12 @@
+from abc import ABC, abstractmethod
+from typing import List
+
+from app.domains.documents.schemas import ChunkBase
+
+
+class RerankerInterface(ABC):
+
+    @abstractmethod
+    def rerank(self, query: str, chunks: List[ChunkBase], top_k: int) -> List[ChunkBase]:
+        """Пересортировка кандидатов по релевантности запросу, возвращает top_k лучших"""
+        pass
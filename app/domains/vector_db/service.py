@@ -1,6 +1,74 @@
+import asyncio
+from typing import List, Optional
+
+from app.core.config.utils import get_settings
+from app.core.metrics import get_metrics
+from app.domains.agent.answer_cache_interface import AnswerCacheInterface
+from app.domains.documents.schemas import ChunkBase
+from app.domains.documents.utils import merge_ranked_chunks
+from app.domains.vector_db.reranker_interface import RerankerInterface
 from app.domains.vector_db.vector_db_interface import VectorDBInterface
 
 
 class VectorDBService:
-    def __init__(self, vector_storage: VectorDBInterface):
+    def __init__(
+            self,
+            vector_storage: VectorDBInterface,
+            reranker: Optional[RerankerInterface] = None,
+            rerank_candidates: int = None,
+            rerank_top_k: int = None,
+            answer_cache: Optional[AnswerCacheInterface] = None,
+    ):
+        settings = get_settings()
         self.vector_storage = vector_storage
+        self.reranker = reranker
+        self.answer_cache = answer_cache
+        self.rerank_candidates = settings.RERANK_CANDIDATES if rerank_candidates is None else rerank_candidates
+        self.rerank_top_k = settings.RERANK_TOP_K if rerank_top_k is None else rerank_top_k
+
+
+    def _get_fetch_count(self, top_k: int) -> int:
+        # С переранжированием берём из базы больше кандидатов, чем попадёт в промпт
+        return max(top_k, self.rerank_candidates) if self.reranker is not None else top_k
+
+
+    def _rerank(self, query: str, chunks: List[ChunkBase], top_k: int) -> List[ChunkBase]:
+        if self.reranker is None:
+            return chunks[:top_k]
+        with get_metrics().timer("retrieval.rerank"):
+            return self.reranker.rerank(query, chunks, min(top_k, self.rerank_top_k))
+
+
+    def delete_file(self, file_id: str) -> None:
+        """Удаляет чанки файла из индекса вместе с ответами, которые на них опирались."""
+        self.vector_storage.delete_by_file_id(file_id)
+        if self.answer_cache is not None:
+            self.answer_cache.invalidate_file(file_id)
+
+
+    def embed_query_sync(self, query: str) -> List[float]:
+        return self.vector_storage.embed_query(query)
+
+
+    async def embed_query(self, query: str) -> List[float]:
+        return await self.vector_storage.aembed_query(query)
+
+
+    def retrieve_sync(self, queries: List[str], user_id: int, top_k: int) -> List[ChunkBase]:
+        """Поиск по всем формулировкам одним запросом, слияние и (опционально) переранжирование по первой."""
+        with get_metrics().timer("retrieval.search"):
+            results = self.vector_storage.search_batch(queries, user_id=user_id, top_k=self._get_fetch_count(top_k))
+        candidates = merge_ranked_chunks(results)
+        return self._rerank(queries[0], candidates, top_k) if queries else []
+
+
+    async def retrieve(self, queries: List[str], user_id: int, top_k: int) -> List[ChunkBase]:
+        with get_metrics().timer("retrieval.search"):
+            results = await self.vector_storage.asearch_batch(queries, user_id=user_id, top_k=self._get_fetch_count(top_k))
+        candidates = merge_ranked_chunks(results)
+        if not queries:
+            return []
+        if self.reranker is None:
+            return candidates[:top_k]
+        # Cross-encoder считает на CPU, поэтому уводим его из event loop
+        return await asyncio.to_thread(self._rerank, queries[0], candidates, top_k)
@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import Callable, Iterable, List, Optional
 
 from app.domains.documents.schemas import ChunkBase
 
@@ -8,12 +8,30 @@ class VectorDBInterface(ABC):
 
     @abstractmethod
     def init_storage(self) -> None:
-        """Инициализация: создание коллекции и индексов"""
+        """Инициализация: создание коллекции и индексов. Безопасна при повторном вызове"""
         pass
 
     @abstractmethod
-    def upsert_batches(self, chunks: List[ChunkBase]) -> None:
-        """Массовая загрузка чанков"""
+    def upsert_batches(
+            self,
+            chunks: Iterable[ChunkBase],
+            on_embedded: Optional[Callable[[], None]] = None,
+            checkpoint_key: Optional[str] = None,
+    ) -> None:
+        """
+        Загрузка чанков пачками по мере чтения итератора.
+        on_embedded вызывается после векторизации последней пачки, до её записи в базу.
+        С checkpoint_key повторная загрузка после сбоя пропускает уже записанные пачки
+        """
+        pass
+
+    @abstractmethod
+    def embed_query(self, query_text: str) -> List[float]:
+        """Плотный эмбеддинг запроса той же моделью, что и поиск"""
+        pass
+
+    @abstractmethod
+    async def aembed_query(self, query_text: str) -> List[float]:
         pass
 
     @abstractmethod
@@ -27,12 +45,45 @@ class VectorDBInterface(ABC):
         """Поиск с опциональной фильтрацией по файлу"""
         pass
 
+    @abstractmethod
+    async def asearch(
+            self,
+            query_text: str,
+            user_id: int,
+            top_k: int = 5,
+            file_id: Optional[str] = None
+    ) -> List[ChunkBase]:
+        """Асинхронный поиск, не блокирующий event loop"""
+        pass
+
+    @abstractmethod
+    def search_batch(
+            self,
+            queries: List[str],
+            user_id: int,
+            top_k: int = 5,
+            file_id: Optional[str] = None
+    ) -> List[List[ChunkBase]]:
+        """Несколько поисковых запросов за одно обращение к базе, результаты в порядке queries"""
+        pass
+
+    @abstractmethod
+    async def asearch_batch(
+            self,
+            queries: List[str],
+            user_id: int,
+            top_k: int = 5,
+            file_id: Optional[str] = None
+    ) -> List[List[ChunkBase]]:
+        """Асинхронный вариант search_batch"""
+        pass
+
     @abstractmethod
     def delete_by_file_id(self, file_id: str) -> None:
         """Удаление всех данных конкретного документа"""
         pass
 
     @abstractmethod
-    def get_all_files(self) -> List[str]:
-        """Список всех уникальных файлов в индексе (через метаданные)"""
+    def get_all_files(self, user_id: Optional[int] = None) -> List[str]:
+        """Список всех уникальных файлов в индексе (через метаданные), опционально для одного пользователя"""
         pass
@@ -0,0 +1,279 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Sequence
+
+import numpy as np
+
+from app.core.config.utils import get_settings
+from app.core.metrics import get_metrics
+from app.infrastructure.embeddings.sparse import SparseHead, SparseWeights, encode_hybrid, pack_sparse, unpack_sparse
+
+
+# Ограничение SQLite на количество параметров в одном запросе
+_SQLITE_MAX_VARIABLES = 500
+
+
+class EmbeddingCache:
+    """
+    Двухуровневый кэш эмбеддингов: LRU в памяти процесса и SQLite на диске.
+
+    Ключ — имя модели плюс sha256 текста, поэтому одинаковые чанки из разных
+    загрузок векторизуются только один раз.
+    """
+
+    def __init__(self, path: str | None = None, memory_size: int = 10000):
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._memory_size = memory_size
+        self._lock = threading.Lock()
+        self._connection = self._connect(path) if path else None
+
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+        )
+        connection.commit()
+        return connection
+
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return f"{model_name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, np.ndarray]:
+        found = {}
+        missing = []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                vector = self._memory.get(key)
+                if vector is None:
+                    missing.append(key)
+                    continue
+                self._memory.move_to_end(key)
+                found[key] = vector
+
+            if missing and self._connection is not None:
+                from_disk = self._read_from_disk(missing)
+                for key, vector in from_disk.items():
+                    self._remember(key, vector)
+                found.update(from_disk)
+        return found
+
+
+    def set_many(self, items: dict[str, np.ndarray]) -> None:
+        if not items:
+            return
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, np.asarray(vector, dtype=np.float32))
+            if self._connection is not None:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items.items()],
+                )
+                self._connection.commit()
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._connection is not None:
+                self._connection.execute("DELETE FROM embeddings")
+                self._connection.commit()
+
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_size:
+            self._memory.popitem(last=False)
+
+
+    def _read_from_disk(self, keys: Sequence[str]) -> dict[str, np.ndarray]:
+        result = {}
+        for start in range(0, len(keys), _SQLITE_MAX_VARIABLES):
+            part = keys[start:start + _SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(part))
+            rows = self._connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", part
+            ).fetchall()
+            for key, blob in rows:
+                result[key] = np.frombuffer(blob, dtype=np.float32)
+        return result
+
+
+def encode_with_cache(
+        encoder,
+        texts: list[str],
+        cache: EmbeddingCache | None,
+        model_name: str = None,
+        batch_size: int = 32,
+) -> Sequence[np.ndarray]:
+    """
+    Векторизует тексты, отправляя в модель только промахи кэша.
+    Порядок результата совпадает с порядком texts.
+    """
+    if cache is None:
+        return encoder.encode(texts, batch_size=batch_size, show_progress_bar=True)
+
+    model_name = get_settings().EMBEDDING_MODEL if model_name is None else model_name
+    keys = [cache.make_key(model_name, text) for text in texts]
+    found = cache.get_many(keys)
+
+    # Повторы внутри одной пачки тоже кодируем один раз
+    missing = {key: text for key, text in zip(keys, texts) if key not in found}
+    if missing:
+        vectors = encoder.encode(list(missing.values()), batch_size=batch_size, show_progress_bar=True)
+        encoded = {key: np.asarray(vector, dtype=np.float32) for key, vector in zip(missing, vectors)}
+        cache.set_many(encoded)
+        found.update(encoded)
+
+    return [found[key] for key in keys]
+
+
+def encode_hybrid_with_cache(
+        encoder,
+        sparse_head: SparseHead,
+        texts: list[str],
+        cache: EmbeddingCache | None,
+        model_name: str = None,
+        batch_size: int = 32,
+) -> tuple[Sequence[np.ndarray], list[SparseWeights]]:
+    """
+    Плотные векторы и лексические веса с кэшем. Обе части считаются за один проход,
+    поэтому в модель уходят тексты, у которых нет в кэше хотя бы одной из них.
+    """
+    if cache is None:
+        return encode_hybrid(encoder, sparse_head, texts, batch_size=batch_size, show_progress_bar=True)
+
+    model_name = get_settings().EMBEDDING_MODEL if model_name is None else model_name
+    dense_keys = [cache.make_key(model_name, text) for text in texts]
+    sparse_keys = [cache.make_key(f"{model_name}#sparse", text) for text in texts]
+    found = cache.get_many(dense_keys + sparse_keys)
+
+    missing = {
+        dense_key: (sparse_key, text)
+        for dense_key, sparse_key, text in zip(dense_keys, sparse_keys, texts)
+        if dense_key not in found or sparse_key not in found
+    }
+    if missing:
+        dense, sparse = encode_hybrid(
+            encoder,
+            sparse_head,
+            [text for _, text in missing.values()],
+            batch_size=batch_size,
+            show_progress_bar=True,
+        )
+        encoded = {}
+        for (dense_key, (sparse_key, _)), vector, weights in zip(missing.items(), dense, sparse):
+            encoded[dense_key] = np.asarray(vector, dtype=np.float32)
+            encoded[sparse_key] = pack_sparse(weights)
+        cache.set_many(encoded)
+        found.update(encoded)
+
+    return [found[key] for key in dense_keys], [unpack_sparse(found[key]) for key in sparse_keys]
+
+
+class QueryEmbeddingCache:
+    """
+    LRU-кэш эмбеддингов поисковых запросов с TTL.
+
+    Ключ — запрос со схлопнутыми пробелами, поэтому формулировки агента, отличающиеся
+    только пробелами, попадают в одну запись. Регистр сохраняется: токенизатор модели
+    его различает. namespace разделяет векторы разных моделей и режимов поиска.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl: float = 3600, metrics_prefix: str = "query_embedding_cache"):
+        self._items: OrderedDict[str, tuple[float, np.ndarray]] = OrderedDict()
+        self._max_size = max_size
+        self._ttl = ttl
+        self._metrics_prefix = metrics_prefix
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split())
+
+
+    def make_key(self, text: str, namespace: str = "") -> str:
+        return f"{namespace}\x00{self.normalize(text)}"
+
+
+    def get(self, text: str, namespace: str = "") -> np.ndarray | None:
+        key = self.make_key(text, namespace)
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] > now:
+                self._items.move_to_end(key)
+                self.hits += 1
+                get_metrics().increment(f"{self._metrics_prefix}.hits")
+                return item[1]
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+        get_metrics().increment(f"{self._metrics_prefix}.misses")
+        return None
+
+
+    def set(self, text: str, vector: np.ndarray, namespace: str = "") -> None:
+        key = self.make_key(text, namespace)
+        with self._lock:
+            self._items[key] = (time.monotonic() + self._ttl, vector)
+            self._items.move_to_end(key)
+            while len(self._items) > self._max_size:
+                self._items.popitem(last=False)
+
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+@lru_cache
+def _get_default_query_embedding_cache() -> QueryEmbeddingCache | None:
+    settings = get_settings()
+    if not settings.QUERY_CACHE_ENABLED:
+        return None
+    return QueryEmbeddingCache(max_size=settings.QUERY_CACHE_SIZE, ttl=settings.QUERY_CACHE_TTL)
+
+
+def get_query_embedding_cache(cache: QueryEmbeddingCache | None = None) -> QueryEmbeddingCache | None:
+    if cache is None:
+        return _get_default_query_embedding_cache()
+    return cache
+
+
+@lru_cache
+def _get_default_embedding_cache() -> EmbeddingCache | None:
+    settings = get_settings()
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    return EmbeddingCache(
+        path=settings.EMBEDDING_CACHE_PATH or None,
+        memory_size=settings.EMBEDDING_CACHE_MEMORY_SIZE,
+    )
+
+
+def get_embedding_cache(cache: EmbeddingCache | None = None) -> EmbeddingCache | None:
+    if cache is None:
+        return _get_default_embedding_cache()
+    return cache
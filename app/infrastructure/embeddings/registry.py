@@ -0,0 +1,124 @@
+import threading
+
+import torch
+from loguru import logger
+from sentence_transformers import CrossEncoder, SentenceTransformer
+
+from app.core.config.utils import get_settings
+from app.infrastructure.embeddings.sparse import SparseHead
+
+
+CPU_DEVICE = "cpu"
+
+
+class EncoderRegistry:
+    """
+    Реестр моделей эмбеддингов на уровне процесса.
+
+    Каждая пара (модель, устройство) загружается с диска один раз и дальше
+    переиспользуется всеми репозиториями и запросами.
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        # Потокобезопасный синглтон
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(EncoderRegistry, cls).__new__(cls)
+                cls._instance._encoders = {}
+                cls._instance._sparse_heads = {}
+                cls._instance._cross_encoders = {}
+                cls._instance._load_lock = threading.Lock()
+        return cls._instance
+
+
+    @staticmethod
+    def _resolve(model_name: str = None, device: str = None) -> tuple[str, str]:
+        settings = get_settings()
+        model_name = settings.EMBEDDING_MODEL if model_name is None else model_name
+        device = settings.EMBEDDING_DEVICE if device is None else device
+        return model_name, device
+
+
+    @staticmethod
+    def _load(model_name: str, device: str) -> SentenceTransformer:
+        if device == CPU_DEVICE:
+            threads = get_settings().EMBEDDING_CPU_THREADS
+            if threads > 0:
+                torch.set_num_threads(threads)
+        logger.info(f"Загрузка модели эмбеддингов {model_name} на {device}")
+        return SentenceTransformer(model_name, device=device)
+
+
+    def get(self, model_name: str = None, device: str = None) -> SentenceTransformer:
+        key = self._resolve(model_name, device)
+        encoder = self._encoders.get(key)
+        if encoder is not None:
+            return encoder
+
+        # Двойная проверка: модель грузится только одним потоком
+        with self._load_lock:
+            encoder = self._encoders.get(key)
+            if encoder is None:
+                encoder = self._load(*key)
+                self._encoders[key] = encoder
+        return encoder
+
+
+    def get_sparse_head(self, model_name: str = None, device: str = None) -> SparseHead:
+        """Sparse-голова для модели из реестра; сама модель повторно не загружается."""
+        key = self._resolve(model_name, device)
+        head = self._sparse_heads.get(key)
+        if head is not None:
+            return head
+
+        encoder = self.get(*key)
+        with self._load_lock:
+            head = self._sparse_heads.get(key)
+            if head is None:
+                head = SparseHead.load(key[0], encoder)
+                self._sparse_heads[key] = head
+        return head
+
+
+    def get_cross_encoder(self, model_name: str = None, device: str = None) -> CrossEncoder:
+        """Cross-encoder для переранжирования, по умолчанию на CPU."""
+        settings = get_settings()
+        key = (
+            settings.RERANK_MODEL if model_name is None else model_name,
+            settings.RERANK_DEVICE if device is None else device,
+        )
+        model = self._cross_encoders.get(key)
+        if model is not None:
+            return model
+
+        with self._load_lock:
+            model = self._cross_encoders.get(key)
+            if model is None:
+                logger.info(f"Загрузка cross-encoder {key[0]} на {key[1]}")
+                model = CrossEncoder(key[0], device=key[1])
+                self._cross_encoders[key] = model
+        return model
+
+
+    def warm_up(self, model_names: list[str] = None, device: str = None) -> None:
+        """Загружает модели заранее, например при старте приложения."""
+        for model_name in model_names or [None]:
+            self.get(model_name, device)
+
+
+    def is_loaded(self, model_name: str = None, device: str = None) -> bool:
+        return self._resolve(model_name, device) in self._encoders
+
+
+    def clear(self) -> None:
+        with self._load_lock:
+            self._encoders.clear()
+            self._sparse_heads.clear()
+            self._cross_encoders.clear()
+
+
+def get_encoder_registry() -> EncoderRegistry:
+    return EncoderRegistry()
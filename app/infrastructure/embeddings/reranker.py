@@ -0,0 +1,93 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List
+
+from app.core.config.utils import get_settings
+from app.core.metrics import get_metrics
+from app.domains.documents.schemas import ChunkBase
+from app.domains.vector_db.reranker_interface import RerankerInterface
+from app.infrastructure.embeddings.registry import get_encoder_registry
+
+
+class CrossEncoderReranker(RerankerInterface):
+    """
+    Переранжирование кандидатов небольшим cross-encoder'ом.
+
+    Все непосчитанные пары (запрос, чанк) оцениваются одним батчем, оценки кэшируются
+    в LRU, поэтому повторный вопрос по тем же материалам почти ничего не стоит.
+    """
+
+    def __init__(self, model = None, model_name: str = None, batch_size: int = None, cache_size: int = None):
+        settings = get_settings()
+        self.model_name = settings.RERANK_MODEL if model_name is None else model_name
+        self.model = get_encoder_registry().get_cross_encoder(self.model_name) if model is None else model
+        self.batch_size = settings.RERANK_BATCH_SIZE if batch_size is None else batch_size
+        self._cache_size = settings.RERANK_CACHE_SIZE if cache_size is None else cache_size
+        self._scores: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def _make_key(self, query: str, chunk: ChunkBase) -> str:
+        query = " ".join(query.lower().split())
+        return hashlib.sha256(f"{self.model_name}\0{query}\0{chunk.content}".encode("utf-8")).hexdigest()
+
+
+    def _get_scores(self, keys: list[str]) -> dict[str, float]:
+        with self._lock:
+            found = {}
+            for key in keys:
+                if key in self._scores:
+                    self._scores.move_to_end(key)
+                    found[key] = self._scores[key]
+            return found
+
+
+    def _set_scores(self, scores: dict[str, float]) -> None:
+        with self._lock:
+            self._scores.update(scores)
+            for key in scores:
+                self._scores.move_to_end(key)
+            while len(self._scores) > self._cache_size:
+                self._scores.popitem(last=False)
+
+
+    def rerank(self, query: str, chunks: List[ChunkBase], top_k: int) -> List[ChunkBase]:
+        if not chunks:
+            return []
+
+        metrics = get_metrics()
+        keys = [self._make_key(query, chunk) for chunk in chunks]
+        scores = self._get_scores(keys)
+        missing = {key: chunk for key, chunk in zip(keys, chunks) if key not in scores}
+        metrics.increment("rerank.cache_hits", len(keys) - len(missing))
+        metrics.increment("rerank.cache_misses", len(missing))
+
+        if missing:
+            with metrics.timer("rerank.predict"):
+                predicted = self.model.predict(
+                    [(query, chunk.content) for chunk in missing.values()],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False,
+                )
+            new_scores = {key: float(score) for key, score in zip(missing, predicted)}
+            self._set_scores(new_scores)
+            scores.update(new_scores)
+
+        # sorted стабилен: при равных оценках сохраняется исходный порядок поиска
+        order = sorted(range(len(chunks)), key=lambda i: scores[keys[i]], reverse=True)
+        return [chunks[i] for i in order[:top_k]]
+
+
+@lru_cache
+def _get_default_reranker() -> CrossEncoderReranker | None:
+    if not get_settings().RERANK_ENABLED:
+        return None
+    return CrossEncoderReranker()
+
+
+def get_reranker(reranker: RerankerInterface | None = None) -> RerankerInterface | None:
+    if reranker is None:
+        return _get_default_reranker()
+    return reranker
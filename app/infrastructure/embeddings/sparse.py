@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import numpy as np
+import torch
+from loguru import logger
+from sentence_transformers import SentenceTransformer
+
+
+SPARSE_HEAD_FILENAME = "sparse_linear.pt"
+
+# Разреженный вектор: id токена словаря -> вес
+SparseWeights = dict[int, float]
+
+
+class SparseHead:
+    """
+    Голова лексических весов bge-m3: линейный слой поверх скрытых состояний токенов.
+
+    Веса считаются из тех же token_embeddings, что и плотный вектор, поэтому
+    гибридная векторизация — один проход модели.
+    """
+
+    def __init__(self, linear: torch.nn.Linear, special_token_ids: set[int]):
+        self.linear = linear
+        self.special_token_ids = special_token_ids
+
+
+    @classmethod
+    def load(cls, model_name: str, encoder: SentenceTransformer) -> "SparseHead":
+        path = Path(model_name) / SPARSE_HEAD_FILENAME
+        if not path.exists():
+            from huggingface_hub import hf_hub_download
+            path = Path(hf_hub_download(repo_id=model_name, filename=SPARSE_HEAD_FILENAME))
+
+        logger.info(f"Загрузка sparse-головы из {path}")
+        state_dict = torch.load(path, map_location="cpu")
+        linear = torch.nn.Linear(encoder.get_sentence_embedding_dimension(), 1)
+        linear.load_state_dict(state_dict)
+        linear.to(encoder.device).eval()
+        return cls(linear, set(encoder.tokenizer.all_special_ids))
+
+
+    @torch.no_grad()
+    def weights(self, token_embeddings: torch.Tensor, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> SparseWeights:
+        token_weights = torch.relu(self.linear(token_embeddings.to(self.linear.weight.dtype))).squeeze(-1)
+        result: SparseWeights = {}
+        for token_id, weight, mask in zip(input_ids.tolist(), token_weights.tolist(), attention_mask.tolist()):
+            if not mask or weight <= 0 or token_id in self.special_token_ids:
+                continue
+            # Повторы токена в тексте схлопываются по максимуму, как в bge-m3
+            if weight > result.get(token_id, 0.0):
+                result[token_id] = weight
+        return result
+
+
+def encode_hybrid(
+        encoder: SentenceTransformer,
+        sparse_head: SparseHead,
+        texts: list[str],
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+) -> tuple[list[np.ndarray], list[SparseWeights]]:
+    """Плотные векторы и лексические веса за один проход модели. Прогресс выводится только для документов."""
+    outputs = encoder.encode(texts, batch_size=batch_size, output_value=None, show_progress_bar=show_progress_bar)
+    dense = []
+    sparse = []
+    for row in outputs:
+        dense.append(row["sentence_embedding"].float().cpu().numpy())
+        sparse.append(sparse_head.weights(row["token_embeddings"], row["input_ids"], row["attention_mask"]))
+    return dense, sparse
+
+
+def pack_sparse(weights: SparseWeights) -> np.ndarray:
+    # Для кэша храним пары (id, вес) подряд в float32: id словаря bge-m3 (< 2^24) представимы точно
+    packed = np.empty(len(weights) * 2, dtype=np.float32)
+    packed[0::2] = list(weights.keys())
+    packed[1::2] = list(weights.values())
+    return packed
+
+
+def unpack_sparse(packed: np.ndarray) -> SparseWeights:
+    return {int(token_id): float(weight) for token_id, weight in zip(packed[0::2], packed[1::2])}
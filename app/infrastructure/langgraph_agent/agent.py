@@ -1,21 +1,26 @@
 import threading
+from typing import AsyncIterator, Iterator
 
-from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from langgraph.graph import StateGraph, START, END
 
 from app.domains.agent.interface import AgentInterface
-from app.domains.agent.models import AgentState
+from app.domains.agent.models import AgentState, AgentEvent, AgentEventType
 from app.domains.chats.service import ChatService
 from app.domains.llm.interface import LLMInterface
 from app.domains.vector_db.service import VectorDBService
 from app.infrastructure.langgraph_agent.nodes import (get_messages_node, ask_llm_node, get_extra_context_node,
-                                                      check_context_need)
+                                                      check_context_need, get_messages_node_async,
+                                                      ask_llm_node_async, get_extra_context_node_async,
+                                                      check_answer_cache_node, check_answer_cache_node_async,
+                                                      check_cached_answer, save_answer_node,
+                                                      route_question_node, route_question_node_async, check_route,
+                                                      speculative_search_node, speculative_search_node_async)
 
 
 class LangGraphAIAgent(AgentInterface):
-    def __init__(self):
-        self.graph = self._build_graph()
-
+    # __init__ не переопределяем: он вызывается при каждом LangGraphAIAgent(),
+    # а граф собирается один раз в __new__
     _instance = None
     _lock = threading.Lock()
 
@@ -32,20 +37,53 @@ class LangGraphAIAgent(AgentInterface):
     def _build_graph(self):
         builder = StateGraph(AgentState)
 
-        builder.add_node("get_messages_node", get_messages_node)
-        builder.add_node("ask_llm_node", ask_llm_node)
-        builder.add_node("get_extra_context_node", get_extra_context_node)
+        # Каждый узел умеет работать и в invoke, и в ainvoke
+        builder.add_node("get_messages_node", RunnableLambda(get_messages_node, afunc=get_messages_node_async))
+        builder.add_node("check_answer_cache_node",
+                         RunnableLambda(check_answer_cache_node, afunc=check_answer_cache_node_async))
+        builder.add_node("route_question_node",
+                         RunnableLambda(route_question_node, afunc=route_question_node_async))
+        builder.add_node("ask_llm_node", RunnableLambda(ask_llm_node, afunc=ask_llm_node_async))
+        builder.add_node("get_extra_context_node",
+                         RunnableLambda(get_extra_context_node, afunc=get_extra_context_node_async))
+        builder.add_node("save_answer_node", RunnableLambda(save_answer_node))
+        builder.add_node("speculative_search_node",
+                         RunnableLambda(speculative_search_node, afunc=speculative_search_node_async))
 
         builder.add_edge(START, "get_messages_node")
-        builder.add_edge("get_messages_node", "ask_llm_node")
+        builder.add_edge("get_messages_node", "check_answer_cache_node")
         builder.add_edge("get_extra_context_node", "ask_llm_node")
+        builder.add_edge("save_answer_node", END)
+        # Упреждающий поиск только кладёт чанки в состояние, их забирает get_extra_context_node
+        builder.add_edge("speculative_search_node", END)
+
+        # Похожий вопрос уже задавали: ответ из кэша, llm не вызывается
+        builder.add_conditional_edges(
+            "check_answer_cache_node",
+            check_cached_answer,
+            {
+                "cache_hit": END,
+                "cache_miss": "route_question_node",
+            }
+        )
+
+        # Вопрос по материалам ищется до первого вызова llm: один вызов вместо двух
+        builder.add_conditional_edges(
+            "route_question_node",
+            check_route,
+            {
+                "search": "get_extra_context_node",
+                "answer": "ask_llm_node",
+                "speculate": "speculative_search_node",
+            }
+        )
 
         builder.add_conditional_edges(
             "ask_llm_node",
             check_context_need,
             {
                 "need_context": "get_extra_context_node",
-                "just_answer": END
+                "just_answer": "save_answer_node"
             }
         )
 
@@ -53,27 +91,100 @@ class LangGraphAIAgent(AgentInterface):
         return app
 
 
-    def process_sync(
-            self,
-            user_id: int,
+    @staticmethod
+    def _get_config(
             chat_service: ChatService,
             llm: LLMInterface,
             vector_db_service: VectorDBService,
-    ) -> str:
-        config = {
+            stream_tokens: bool = False,
+    ) -> dict:
+        return {
             "configurable": {
                 "chat_service": chat_service,
                 "llm": llm,
                 "vector_db_service": vector_db_service,
+                "stream_tokens": stream_tokens,
             }
         }
 
 
+    @staticmethod
+    def _finish(chat_service: ChatService, final_state: dict | None) -> str:
+        if not final_state:
+            return ""
+        # Найденные фрагменты сохраняются вместе с ответом как его источники
+        chat_service.add_turn_sources(final_state.get("context_chunks") or [])
+        return final_state["answer"]
+
+
+    async def process(
+            self,
+            user_id: int,
+            chat_service: ChatService,
+            llm: LLMInterface,
+            vector_db_service: VectorDBService,
+    ) -> str:
+        response = await self.graph.ainvoke(
+            AgentState(user_id=user_id).model_dump(),
+            config=self._get_config(chat_service, llm, vector_db_service),
+        )
+        return self._finish(chat_service, response)
+
+
+    def process_sync(
+            self,
+            user_id: int,
+            chat_service: ChatService,
+            llm: LLMInterface,
+            vector_db_service: VectorDBService,
+    ) -> str:
         response = self.graph.invoke(
             AgentState(user_id=user_id).model_dump(),
-            config=config,
+            config=self._get_config(chat_service, llm, vector_db_service),
         )
-        return response["answer"]
+        return self._finish(chat_service, response)
+
+
+    async def stream(
+            self,
+            user_id: int,
+            chat_service: ChatService,
+            llm: LLMInterface,
+            vector_db_service: VectorDBService,
+    ) -> AsyncIterator[AgentEvent]:
+        final_state = None
+        async for mode, chunk in self.graph.astream(
+            AgentState(user_id=user_id).model_dump(),
+            config=self._get_config(chat_service, llm, vector_db_service, stream_tokens=True),
+            stream_mode=["custom", "values"],
+        ):
+            if mode == "custom":
+                yield chunk
+            else:
+                final_state = chunk
+
+        yield AgentEvent(type=AgentEventType.ANSWER, data=self._finish(chat_service, final_state))
+
+
+    def stream_sync(
+            self,
+            user_id: int,
+            chat_service: ChatService,
+            llm: LLMInterface,
+            vector_db_service: VectorDBService,
+    ) -> Iterator[AgentEvent]:
+        final_state = None
+        for mode, chunk in self.graph.stream(
+            AgentState(user_id=user_id).model_dump(),
+            config=self._get_config(chat_service, llm, vector_db_service, stream_tokens=True),
+            stream_mode=["custom", "values"],
+        ):
+            if mode == "custom":
+                yield chunk
+            else:
+                final_state = chunk
+
+        yield AgentEvent(type=AgentEventType.ANSWER, data=self._finish(chat_service, final_state))
 
 
 _agent_instance = LangGraphAIAgent()
@@ -0,0 +1,137 @@
+import threading
+import time
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+
+from app.core.config.utils import get_settings
+from app.core.metrics import get_metrics
+from app.domains.agent.answer_cache_interface import AnswerCacheInterface
+from app.domains.agent.models import CachedAnswer
+from app.domains.documents.schemas import ChunkBase
+
+
+class _UserAnswers:
+    def __init__(self, dim: int):
+        self.vectors = np.empty((0, dim), dtype=np.float32)
+        self.expires_at: list[float] = []
+        self.context_keys: list[str] = []
+        self.answers: list[tuple[str, List[ChunkBase]]] = []
+
+
+    def keep(self, alive: list[int]) -> None:
+        if len(alive) == len(self.expires_at):
+            return
+        self.vectors = self.vectors[alive]
+        self.expires_at = [self.expires_at[i] for i in alive]
+        self.context_keys = [self.context_keys[i] for i in alive]
+        self.answers = [self.answers[i] for i in alive]
+
+
+    def drop_expired(self, now: float) -> None:
+        self.keep([i for i, expires_at in enumerate(self.expires_at) if expires_at > now])
+
+
+    def drop_file(self, file_id: str) -> None:
+        self.keep([
+            i for i, (_, chunks) in enumerate(self.answers)
+            if all(chunk.file_id != file_id for chunk in chunks)
+        ])
+
+
+class SemanticAnswerCache(AnswerCacheInterface):
+    """
+    Кэш ответов llm по смыслу вопроса, отдельный для материалов каждого пользователя.
+
+    Вопрос ищется по косинусной близости эмбеддингов среди ответов того же пользователя
+    с тем же ключом контекста беседы: уточнение вроде «а подробнее?» зависит от предыдущих
+    ходов, а не только от своего текста. Ответы на вопросы, похожие не меньше чем на
+    threshold, отдаются без обращения к llm.
+    Записи живут ttl секунд и сбрасываются целиком, когда у пользователя меняются материалы.
+    """
+
+    def __init__(self, threshold: float = None, ttl: float = None, max_size: int = None):
+        settings = get_settings()
+        self.threshold = settings.ANSWER_CACHE_THRESHOLD if threshold is None else threshold
+        self.ttl = settings.ANSWER_CACHE_TTL if ttl is None else ttl
+        self.max_size = settings.ANSWER_CACHE_SIZE if max_size is None else max_size
+        self._users: dict[int, _UserAnswers] = {}
+        self._lock = threading.Lock()
+
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+    def lookup(self, user_id: int, question_vector: List[float], context_key: str = "") -> CachedAnswer | None:
+        metrics = get_metrics()
+        query = self._normalize(question_vector)
+        with self._lock:
+            answers = self._users.get(user_id)
+            if answers is not None:
+                answers.drop_expired(time.monotonic())
+            if answers is None or not answers.answers or answers.vectors.shape[1] != len(query):
+                metrics.increment("answer_cache.misses")
+                return None
+            similarities = np.where(
+                np.asarray(answers.context_keys) == context_key,
+                answers.vectors @ query,
+                -np.inf,
+            )
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            answer, chunks = answers.answers[best]
+
+        if similarity < self.threshold:
+            metrics.increment("answer_cache.misses")
+            return None
+        metrics.increment("answer_cache.hits")
+        return CachedAnswer(answer=answer, chunks=chunks, similarity=similarity)
+
+
+    def store(
+            self,
+            user_id: int,
+            question_vector: List[float],
+            answer: str,
+            chunks: List[ChunkBase],
+            context_key: str = "",
+    ) -> None:
+        vector = self._normalize(question_vector)
+        with self._lock:
+            answers = self._users.get(user_id)
+            if answers is None or answers.vectors.shape[1] != len(vector):
+                answers = self._users[user_id] = _UserAnswers(len(vector))
+            answers.drop_expired(time.monotonic())
+            answers.vectors = np.vstack([answers.vectors, vector])[-self.max_size:]
+            answers.expires_at = (answers.expires_at + [time.monotonic() + self.ttl])[-self.max_size:]
+            answers.context_keys = (answers.context_keys + [context_key])[-self.max_size:]
+            answers.answers = (answers.answers + [(answer, list(chunks))])[-self.max_size:]
+
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._users.pop(user_id, None)
+
+
+    def invalidate_file(self, file_id: str) -> None:
+        with self._lock:
+            for answers in self._users.values():
+                answers.drop_file(file_id)
+
+
+@lru_cache
+def _get_default_answer_cache() -> SemanticAnswerCache | None:
+    if not get_settings().ANSWER_CACHE_ENABLED:
+        return None
+    return SemanticAnswerCache()
+
+
+def get_answer_cache(cache: AnswerCacheInterface | None = None) -> AnswerCacheInterface | None:
+    if cache is None:
+        return _get_default_answer_cache()
+    return cache
@@ -0,0 +1,155 @@
+from functools import lru_cache
+
+from app.core.config.utils import get_settings
+from app.domains.chats.schemas import MessageRead
+from app.domains.documents.schemas import ChunkBase
+from app.domains.documents.utils import format_chunk, CHUNKS_SEPARATOR
+from app.infrastructure.openai_llm.tokenizer import count_tokens, get_tokenizer, get_token_model_name
+
+
+# Меньше этого обрезанный чанк уже не несёт смысла, его лучше не брать совсем
+MIN_CHUNK_TOKENS = 32
+# Более короткое совпадение конца и начала соседних чанков скорее случайно, чем перекрытие
+MIN_OVERLAP_CHARS = 8
+
+
+def _find_overlap(previous: str, text: str, max_overlap: int) -> int:
+    """
+    Длина общего куска в конце previous и в начале text.
+
+    Соседние чанки одной страницы пересекаются не больше чем на CHUNK_OVERLAP символов,
+    и сплиттер режет по границам слов, поэтому засчитывается только совпадение целыми словами.
+    """
+    for size in range(min(len(previous), len(text), max_overlap), MIN_OVERLAP_CHARS - 1, -1):
+        if not previous.endswith(text[:size]):
+            continue
+        starts_at_word = size == len(previous) or previous[-size - 1].isspace()
+        ends_at_word = size == len(text) or text[size].isspace()
+        if starts_at_word and ends_at_word:
+            return size
+    return 0
+
+
+def _chunk_position(chunk: ChunkBase, offset: int = 0) -> tuple:
+    return chunk.file_id, chunk.source, chunk.page_num, chunk.chunk_index + offset
+
+
+class ContextAssembler:
+    """
+    Собирает историю и найденные чанки в один бюджет токенов модели.
+
+    Системный промпт учитывается целиком, история берётся с конца в пределах своей доли,
+    чанки — в порядке ранжирования на оставшееся место. Отбор и обрезка детерминированы:
+    одинаковые входы всегда дают одинаковый промпт.
+    """
+
+    def __init__(self, budget: int = None, history_share: float = None, model_name: str = None, chunk_overlap: int = None):
+        settings = get_settings()
+        self.budget = settings.CONTEXT_TOKEN_BUDGET if budget is None else budget
+        self.history_share = settings.CONTEXT_HISTORY_SHARE if history_share is None else history_share
+        self.model_name = get_token_model_name(model_name)
+        self.chunk_overlap = settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+
+
+    def count_tokens(self, text: str) -> int:
+        return count_tokens(text, self.model_name)
+
+
+    def _truncate(self, text: str, max_tokens: int, keep_end: bool = False) -> str:
+        tokens = get_tokenizer(self.model_name).encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        tokens = tokens[-max_tokens:] if keep_end else tokens[:max_tokens]
+        return get_tokenizer(self.model_name).decode(tokens)
+
+
+    def _count_message_tokens(self, message: MessageRead) -> int:
+        # Число токенов сохраняется вместе с сообщением, пересчитываем только старые записи
+        return message.token_count or self.count_tokens(message.text or "")
+
+
+    def fit_history(self, history: list[MessageRead], budget: int) -> tuple[list[MessageRead], int]:
+        selected = []
+        used = 0
+        for message in reversed(history):
+            tokens = self._count_message_tokens(message)
+            if used + tokens > budget:
+                if not selected:
+                    # Последнее сообщение — сам вопрос, без него ответ невозможен: оставляем его хвост
+                    text = self._truncate(message.text, budget, keep_end=True)
+                    selected.append(message.model_copy(update={"text": text}))
+                    used += self.count_tokens(text)
+                break
+            selected.append(message)
+            used += tokens
+        selected.reverse()
+        return selected, used
+
+
+    def dedup_chunks(self, chunks: list[ChunkBase]) -> list[ChunkBase]:
+        unique = []
+        seen_contents = set()
+        for chunk in chunks:
+            if chunk.content not in seen_contents:
+                seen_contents.add(chunk.content)
+                unique.append(chunk)
+
+        # Общий кусок соседей остаётся у того, кто выше в ранжировании: он первым попадёт в бюджет
+        contents = [chunk.content for chunk in unique]
+        positions = {_chunk_position(chunk): i for i, chunk in enumerate(unique)}
+        for i, chunk in enumerate(unique):
+            previous = positions.get(_chunk_position(chunk, offset=-1))
+            if previous is None:
+                continue
+            size = _find_overlap(contents[previous], contents[i], self.chunk_overlap)
+            if not size:
+                continue
+            if previous < i:
+                contents[i] = contents[i][size:].lstrip()
+            else:
+                contents[previous] = contents[previous][:-size].rstrip()
+
+        return [
+            chunk if content == chunk.content else chunk.model_copy(update={"content": content})
+            for chunk, content in zip(unique, contents)
+            if content
+        ]
+
+
+    def fit_chunks(self, chunks: list[ChunkBase], budget: int) -> list[ChunkBase]:
+        selected = []
+        used = 0
+        separator_tokens = self.count_tokens(CHUNKS_SEPARATOR)
+        for chunk in self.dedup_chunks(chunks):
+            index = len(selected) + 1
+            tokens = self.count_tokens(format_chunk(index, chunk)) + separator_tokens
+            if used + tokens <= budget:
+                selected.append(chunk)
+                used += tokens
+                continue
+
+            # Первый не влезший чанк обрезаем по токенам, остальные не берём: так результат детерминирован
+            header_tokens = self.count_tokens(format_chunk(index, chunk.model_copy(update={"content": ""})))
+            room = budget - used - header_tokens - separator_tokens
+            if room >= MIN_CHUNK_TOKENS:
+                selected.append(chunk.model_copy(update={"content": self._truncate(chunk.content, room)}))
+            break
+        return selected
+
+
+    def assemble(
+            self,
+            system_prompt: str,
+            history: list[MessageRead],
+            chunks: list[ChunkBase],
+    ) -> tuple[list[MessageRead], list[ChunkBase]]:
+        remaining = max(0, self.budget - self.count_tokens(system_prompt))
+        fitted_history, history_tokens = self.fit_history(history, int(remaining * self.history_share))
+        # Неиспользованная историей доля достаётся чанкам
+        fitted_chunks = self.fit_chunks(chunks, remaining - history_tokens)
+        return fitted_history, fitted_chunks
+
+
+@lru_cache
+def get_context_assembler() -> ContextAssembler:
+    return ContextAssembler()
@@ -1,16 +1,36 @@
+import hashlib
+
+import numpy as np
 from loguru import logger
 
-from langgraph.config import RunnableConfig
-from langchain_core.output_parsers import JsonOutputParser
+from langgraph.config import RunnableConfig, get_stream_writer
+from langchain_core.prompt_values import PromptValue
+from langchain_core.exceptions import OutputParserException
+from langchain_core.utils.json import parse_json_markdown
+from pydantic import ValidationError
+
+from app.core.config.utils import get_settings
+from app.core.metrics import get_metrics
 
+from app.domains.documents.schemas import ChunkBase
 from app.domains.documents.utils import format_chunks_to_context
-from app.domains.agent.models import AgentState
+from app.domains.agent.models import AgentState, AgentEvent, AgentEventType, CachedAnswer, QuestionRoute
 from app.domains.chats.schemas import MessageInput, AuthorRole
 from app.domains.chats.service import ChatService
+from app.domains.llm.exceptions import StructuredOutputException
 from app.domains.llm.interface import LLMInterface
 from app.domains.vector_db.service import VectorDBService
 from app.infrastructure.langgraph_agent.schemas import LLMResponse
-from app.infrastructure.langgraph_agent.utils import analyze_messages_prompt, convert_to_langchain_messages
+from app.infrastructure.langgraph_agent.context import get_context_assembler
+from app.infrastructure.langgraph_agent.answer_cache import get_answer_cache
+from app.infrastructure.langgraph_agent.router import QuestionRouter, get_question_router
+from app.infrastructure.langgraph_agent.prompt_registry import get_prompt_registry
+from app.infrastructure.langgraph_agent.utils import convert_to_langchain_messages
+
+
+MAX_FIND_COUNT = 3
+# Основной запрос и до двух переформулировок ищутся одним обращением к базе
+MAX_SEARCH_QUERIES = 3
 
 
 def get_messages_node(state: AgentState, config: RunnableConfig):
@@ -23,65 +43,429 @@ def get_messages_node(state: AgentState, config: RunnableConfig):
     logger.info(f"Получаем последние сообщения")
     # Получаем последние сообщения
     context_messages = chat_service.get_last_messages_sync(context_length)
-    logger.info(f"Полученные сообщения: {context_messages}")
+    logger.debug("Полученные сообщения: {}", context_messages)
 
     state.history = context_messages
     return state
 
 
-def ask_llm_node(state: AgentState, config: RunnableConfig):
+async def get_messages_node_async(state: AgentState, config: RunnableConfig):
+    logger.info(f"get_messages_node_async")
+
+    chat_service: ChatService = config["configurable"]["chat_service"]
+    state.history = await chat_service.get_last_messages(state.context_length)
+    return state
+
+
+def _get_question(state: AgentState) -> str:
+    for message in reversed(state.history):
+        if message.author == AuthorRole.HUMAN:
+            return message.text or ""
+    return ""
+
+
+def _get_context_key(state: AgentState) -> str:
+    """
+    Ключ контекста беседы для кэша ответов.
+
+    Первый вопрос чата от истории не зависит, и ответ на него можно переиспользовать в других чатах.
+    Для уточнений ключ включает чат и отпечаток предыдущих сообщений.
+    """
+    for index in range(len(state.history) - 1, -1, -1):
+        if state.history[index].author == AuthorRole.HUMAN:
+            preceding = state.history[:index]
+            break
+    else:
+        return ""
+    if not preceding:
+        return ""
+    fingerprint = hashlib.sha256()
+    for message in preceding:
+        fingerprint.update(f"{message.author.value}\x00{message.text or ''}\x00".encode("utf-8"))
+    return f"{preceding[-1].chat_id}:{fingerprint.hexdigest()}"
+
+
+def _apply_cached_answer(state: AgentState, cached: CachedAnswer | None) -> AgentState:
+    if cached is None:
+        return state
+    logger.info(f"Ответ из кэша, близость вопросов {cached.similarity:.3f}")
+    writer = get_stream_writer()
+    writer(AgentEvent(type=AgentEventType.STATUS, data="Нашёл ответ на похожий вопрос"))
+
+    state.answer = cached.answer
+    state.context_chunks = cached.chunks
+    state.is_cached_answer = True
+    return state
+
+
+def check_answer_cache_node(state: AgentState, config: RunnableConfig):
+    answer_cache = get_answer_cache()
+    question = _get_question(state)
+    if answer_cache is None or not question.strip():
+        return state
+
+    vector_db_service: VectorDBService = config["configurable"]["vector_db_service"]
+    # Эмбеддинг попадает в кэш запросов, поэтому поиск по тому же вопросу его не пересчитает
+    state.question_vector = vector_db_service.embed_query_sync(question)
+    cached = answer_cache.lookup(state.user_id, state.question_vector, _get_context_key(state))
+    return _apply_cached_answer(state, cached)
+
+
+async def check_answer_cache_node_async(state: AgentState, config: RunnableConfig):
+    answer_cache = get_answer_cache()
+    question = _get_question(state)
+    if answer_cache is None or not question.strip():
+        return state
+
+    vector_db_service: VectorDBService = config["configurable"]["vector_db_service"]
+    state.question_vector = await vector_db_service.embed_query(question)
+    cached = answer_cache.lookup(state.user_id, state.question_vector, _get_context_key(state))
+    return _apply_cached_answer(state, cached)
+
+
+def save_answer_node(state: AgentState):
+    answer_cache = get_answer_cache()
+    # Кэшируем только окончательные ответы, построенные на найденных материалах:
+    # ответ без поиска чаще зависит от хода беседы, чем от вопроса
+    if (answer_cache is None or not state.question_vector or not state.context_chunks
+            or state.is_need_more_context or not state.answer):
+        return state
+    answer_cache.store(
+        state.user_id, state.question_vector, state.answer, state.context_chunks, _get_context_key(state),
+    )
+    return state
+
+
+def _apply_route(state: AgentState, question: str, route: QuestionRoute) -> AgentState:
+    if route == QuestionRoute.SPECULATE and not get_settings().SPECULATIVE_SEARCH_ENABLED:
+        route = QuestionRoute.ANSWER
+    if route == QuestionRoute.SEARCH:
+        # Вопрос и есть первый поисковый запрос, llm вызовется уже с найденным контекстом
+        state.find_context = question
+    state.route = route
+    return state
+
+
+def _should_route(router: QuestionRouter | None, question: str) -> bool:
+    # Без роутера, но с упреждающим поиском каждый вопрос считается неуверенным
+    return bool(question.strip()) and (router is not None or get_settings().SPECULATIVE_SEARCH_ENABLED)
+
+
+def route_question_node(state: AgentState, config: RunnableConfig):
+    router = get_question_router()
+    question = _get_question(state)
+    if not _should_route(router, question):
+        return state
+
+    vector_db_service: VectorDBService = config["configurable"]["vector_db_service"]
+    if not state.question_vector:
+        state.question_vector = vector_db_service.embed_query_sync(question)
+    if router is None:
+        return _apply_route(state, question, QuestionRoute.SPECULATE)
+    router.prepare(vector_db_service.embed_query_sync)
+    return _apply_route(state, question, router.route(state.question_vector))
+
+
+async def route_question_node_async(state: AgentState, config: RunnableConfig):
+    router = get_question_router()
+    question = _get_question(state)
+    if not _should_route(router, question):
+        return state
+
+    vector_db_service: VectorDBService = config["configurable"]["vector_db_service"]
+    if not state.question_vector:
+        state.question_vector = await vector_db_service.embed_query(question)
+    if router is None:
+        return _apply_route(state, question, QuestionRoute.SPECULATE)
+    await router.aprepare(vector_db_service.embed_query)
+    return _apply_route(state, question, router.route(state.question_vector))
+
+
+def speculative_search_node(state: AgentState, config: RunnableConfig) -> dict:
+    # Работает параллельно с ask_llm_node, поэтому возвращает только свои поля:
+    # два узла одного шага не могут писать одно и то же поле состояния
+    vector_db_service: VectorDBService = config["configurable"]["vector_db_service"]
+    question = _get_question(state)
+    chunks = vector_db_service.retrieve_sync(queries=[question], user_id=state.user_id, top_k=state.top_k)
+    return {"speculative_query": question, "speculative_chunks": chunks}
+
+
+async def speculative_search_node_async(state: AgentState, config: RunnableConfig) -> dict:
+    vector_db_service: VectorDBService = config["configurable"]["vector_db_service"]
+    question = _get_question(state)
+    chunks = await vector_db_service.retrieve(queries=[question], user_id=state.user_id, top_k=state.top_k)
+    return {"speculative_query": question, "speculative_chunks": chunks}
+
+
+def _build_llm_prompt(state: AgentState) -> PromptValue:
+    registry = get_prompt_registry()
+    # История и найденные чанки делят один бюджет токенов с системным промптом
+    history, chunks = get_context_assembler().assemble(
+        system_prompt=registry.get_system_prompt_text(LLMResponse),
+        history=state.history,
+        chunks=state.context_chunks,
+    )
+    messages = convert_to_langchain_messages(history)
+    extra_context = format_chunks_to_context(chunks) if state.find_count else state.extra_context
+    prompt = registry.render(LLMResponse, messages=messages, extra_context=extra_context)
+
+    # Аргументы loguru форматирует, только если уровень DEBUG включён
+    logger.debug("prompt: {}", prompt)
+    return prompt
+
+
+def _validate_llm_fields(parsed: dict) -> LLMResponse:
+    """LLMResponse из тех полей JSON, что прошли проверку; невалидные поля получают значения по умолчанию."""
+    try:
+        return LLMResponse.model_validate(parsed)
+    except ValidationError:
+        pass
+    valid_fields = {}
+    for name, value in parsed.items():
+        if name not in LLMResponse.model_fields:
+            continue
+        try:
+            LLMResponse.model_validate({name: value})
+        except ValidationError:
+            continue
+        valid_fields[name] = value
+    return LLMResponse.model_validate(valid_fields)
+
+
+def _repair_llm_response(text: str) -> LLMResponse:
+    """Разбор невалидного ответа без повторного запроса к llm: частичный JSON или просто текст ответа."""
+    metrics = get_metrics()
+    try:
+        # parse_json_markdown терпит обрывы и markdown-обёртку, лишние поля отбросит схема
+        parsed = parse_json_markdown(text)
+    except ValueError:
+        parsed = None
+    if isinstance(parsed, dict):
+        # JSON пользователю не показываем, даже если в нём не нашлось ни одного валидного поля
+        metrics.increment("llm.structured_output.repaired")
+        return _validate_llm_fields(parsed)
+
+    # Модель ответила прозой: это и есть ответ пользователю, без нового поиска
+    metrics.increment("llm.structured_output.fallback_to_text")
+    return LLMResponse(answer=text.strip())
+
+
+def _parse_llm_answer(answer: str) -> LLMResponse:
+    logger.debug("answer: {}", answer)
+    try:
+        parsed_answer = get_prompt_registry().get_parser(LLMResponse).invoke(answer)
+        return LLMResponse.model_validate(parsed_answer)
+    except (OutputParserException, ValidationError):
+        get_metrics().increment("llm.structured_output.parse_failures")
+        return _repair_llm_response(answer)
+
+
+def _on_structured_output_error(error: StructuredOutputException) -> LLMResponse:
+    logger.debug("invalid structured answer: {}", error.raw_text)
+    get_metrics().increment("llm.structured_output.parse_failures")
+    return _repair_llm_response(error.raw_text)
+
+
+def _invoke_llm(llm: LLMInterface, prompt: PromptValue) -> LLMResponse:
+    if not get_settings().LLM_STRUCTURED_OUTPUT:
+        return _parse_llm_answer(llm.invoke(prompt))
+    try:
+        return llm.invoke_structured(prompt, LLMResponse)
+    except StructuredOutputException as e:
+        return _on_structured_output_error(e)
+
+
+async def _ainvoke_llm(llm: LLMInterface, prompt: PromptValue) -> LLMResponse:
+    if not get_settings().LLM_STRUCTURED_OUTPUT:
+        return _parse_llm_answer(await llm.ainvoke(prompt))
+    try:
+        return await llm.ainvoke_structured(prompt, LLMResponse)
+    except StructuredOutputException as e:
+        return _on_structured_output_error(e)
+
+
+def _apply_llm_answer(result: LLMResponse) -> dict:
+    # Только изменённые поля: при упреждающем поиске узел работает параллельно с speculative_search_node
+    return {
+        "answer": result.answer,
+        "is_need_more_context": result.is_need_more_context,
+        "find_context": result.find_context,
+        "find_contexts": result.find_contexts,
+    }
+
+
+def ask_llm_node(state: AgentState, config: RunnableConfig) -> dict:
     logger.info(f"ask_llm_node")
 
     # Получение зависимостей
     llm: LLMInterface = config["configurable"]["llm"]
-    parser = JsonOutputParser(pydantic_object=LLMResponse)
 
     # Составление промпта
-    messages = convert_to_langchain_messages(state.history)
-    prompt = analyze_messages_prompt(messages=messages, extra_context=state.extra_context, parser=parser)
+    prompt = _build_llm_prompt(state)
+
+    # Получение ответа от ллм: при стриминге JSON разбирается из текста,
+    # иначе модель сразу возвращает LLMResponse через structured output
+    if config["configurable"].get("stream_tokens"):
+        result = _parse_llm_answer(_stream_llm_answer(llm, prompt, state))
+    else:
+        result = _invoke_llm(llm, prompt)
+
+    return _apply_llm_answer(result)
+
+
+async def ask_llm_node_async(state: AgentState, config: RunnableConfig) -> dict:
+    logger.info(f"ask_llm_node_async")
+
+    llm: LLMInterface = config["configurable"]["llm"]
+    prompt = _build_llm_prompt(state)
+
+    if config["configurable"].get("stream_tokens"):
+        result = _parse_llm_answer(await _astream_llm_answer(llm, prompt, state))
+    else:
+        result = await _ainvoke_llm(llm, prompt)
+
+    return _apply_llm_answer(result)
+
+
+class _AnswerStreamExtractor:
+    """
+    Достаёт поле answer из частично полученного JSON и отдаёт только новые фрагменты.
+
+    Фрагменты отдаются, только если ответ окончательный: если модель просит
+    доп. контекст, граф уйдёт на новый круг и этот ответ пользователю не нужен.
+    """
+
+    def __init__(self, state: AgentState):
+        self._is_final_round = state.find_count >= MAX_FIND_COUNT
+        self.text = ""
+        self._sent_length = 0
 
-    logger.info(f"messages: {messages}")
-    logger.info(f"prompt: {prompt}")
 
-    # Получение ответа от ллм
-    answer = llm.invoke(prompt)
+    def feed(self, token: str) -> str | None:
+        self.text += token
+        try:
+            partial = parse_json_markdown(self.text)
+        except ValueError:
+            return None
+        if not isinstance(partial, dict) or "is_need_more_context" not in partial:
+            return None
+        if partial["is_need_more_context"] and not self._is_final_round:
+            return None
 
-    logger.info(f"answer: {answer}")
+        partial_answer = partial.get("answer")
+        if not isinstance(partial_answer, str) or len(partial_answer) <= self._sent_length:
+            return None
+        delta = partial_answer[self._sent_length:]
+        self._sent_length = len(partial_answer)
+        return delta
 
-    # Парсинг ответа
-    parsed_answer = parser.invoke(answer)
-    result = LLMResponse(**parsed_answer)
 
-    # Обновление состояний
-    state.answer = result.answer
-    state.is_need_more_context = result.is_need_more_context
-    state.find_context = result.find_context
+def _stream_llm_answer(llm: LLMInterface, prompt: PromptValue, state: AgentState) -> str:
+    writer = get_stream_writer()
+    extractor = _AnswerStreamExtractor(state)
+    for token in llm.stream(prompt):
+        delta = extractor.feed(token)
+        if delta:
+            writer(AgentEvent(type=AgentEventType.TOKEN, data=delta))
+    return extractor.text
 
+
+async def _astream_llm_answer(llm: LLMInterface, prompt: PromptValue, state: AgentState) -> str:
+    writer = get_stream_writer()
+    extractor = _AnswerStreamExtractor(state)
+    async for token in llm.astream(prompt):
+        delta = extractor.feed(token)
+        if delta:
+            writer(AgentEvent(type=AgentEventType.TOKEN, data=delta))
+    return extractor.text
+
+
+def _get_search_queries(state: AgentState) -> list[str]:
+    queries = [state.find_context, *state.find_contexts]
+    unique = dict.fromkeys(query.strip() for query in queries if query and query.strip())
+    return list(unique)[:MAX_SEARCH_QUERIES]
+
+
+def _apply_extra_context(state: AgentState, chunks: list[ChunkBase]) -> AgentState:
+    state.context_chunks = chunks
+    state.extra_context = format_chunks_to_context(chunks)
+    state.find_count += 1
     return state
 
 
+def _can_use_speculative(state: AgentState) -> bool:
+    # Упреждающий поиск был по вопросу, он годится только для первого круга поиска
+    return bool(state.speculative_query) and state.find_count == 0 and bool(state.question_vector)
+
+
+def _take_speculative_chunks(state: AgentState, query_vector: list[float]) -> list[ChunkBase] | None:
+    """Чанки упреждающего поиска, если запрос llm по смыслу почти совпадает с вопросом."""
+    question = np.asarray(state.question_vector, dtype=np.float32)
+    query = np.asarray(query_vector, dtype=np.float32)
+    norm = np.linalg.norm(question) * np.linalg.norm(query)
+    similarity = float(question @ query / norm) if norm else 0.0
+    if similarity < get_settings().SPECULATIVE_SEARCH_THRESHOLD:
+        get_metrics().increment("retrieval.speculative.discarded")
+        return None
+    get_metrics().increment("retrieval.speculative.used")
+    return state.speculative_chunks
+
+
 def get_extra_context_node(state: AgentState, config: RunnableConfig):
     # Получение зависимостей
     vector_db_service: VectorDBService = config["configurable"]["vector_db_service"]
 
-    # Поиск по контексту
-    chunks = vector_db_service.vector_storage.search(
-        query_text=state.find_context,
-        user_id=state.user_id,
-        top_k=state.top_k,
-    )
-    extra_context = format_chunks_to_context(chunks)
-    state.extra_context = extra_context
-    state.find_count += 1
+    writer = get_stream_writer()
+    writer(AgentEvent(type=AgentEventType.STATUS, data="Ищу информацию в учебных материалах"))
 
-    return state
+    queries = _get_search_queries(state)
+    chunks = None
+    if queries and _can_use_speculative(state):
+        chunks = _take_speculative_chunks(state, vector_db_service.embed_query_sync(queries[0]))
+
+    # Поиск по контексту: все формулировки одним запросом к базе
+    if chunks is None:
+        chunks = vector_db_service.retrieve_sync(
+            queries=queries,
+            user_id=state.user_id,
+            top_k=state.top_k,
+        )
+    return _apply_extra_context(state, chunks)
+
+
+async def get_extra_context_node_async(state: AgentState, config: RunnableConfig):
+    vector_db_service: VectorDBService = config["configurable"]["vector_db_service"]
+
+    writer = get_stream_writer()
+    writer(AgentEvent(type=AgentEventType.STATUS, data="Ищу информацию в учебных материалах"))
+
+    queries = _get_search_queries(state)
+    chunks = None
+    if queries and _can_use_speculative(state):
+        chunks = _take_speculative_chunks(state, await vector_db_service.embed_query(queries[0]))
+
+    if chunks is None:
+        chunks = await vector_db_service.retrieve(
+            queries=queries,
+            user_id=state.user_id,
+            top_k=state.top_k,
+        )
+    return _apply_extra_context(state, chunks)
+
+
+def check_route(state: AgentState):
+    if state.route == QuestionRoute.SPECULATE:
+        # Параллельные ветки: llm и поиск по вопросу в одном шаге графа
+        return ["answer", "speculate"]
+    return state.route.value
+
+
+def check_cached_answer(state: AgentState):
+    return "cache_hit" if state.is_cached_answer else "cache_miss"
 
 
 def check_context_need(state: AgentState):
-    if state.is_need_more_context and state.find_count < 3:
+    if state.is_need_more_context and state.find_count < MAX_FIND_COUNT:
         return "need_context"
     else:
         return "just_answer"
-
-
-
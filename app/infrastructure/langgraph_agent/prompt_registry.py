@@ -0,0 +1,68 @@
+import threading
+from functools import lru_cache
+from typing import List
+
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompt_values import PromptValue
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from pydantic import BaseModel
+
+from app.infrastructure.langgraph_agent.prompts import MAIN_SYSTEM_PROMPT_TEXT, JSON_REMINDER_PROMPT_TEXT
+
+
+class PromptRegistry:
+    """
+    Шаблоны промптов и парсеры ответа, собранные один раз на процесс.
+
+    Для каждой схемы ответа парсер, инструкции формата и шаблон с уже подставленными
+    инструкциями создаются при первом обращении. На каждом ходе остаётся только
+    подставить историю и найденный контекст.
+    """
+
+    def __init__(self):
+        self._parsers: dict[type[BaseModel], JsonOutputParser] = {}
+        self._templates: dict[type[BaseModel], ChatPromptTemplate] = {}
+        self._system_prompt_texts: dict[type[BaseModel], str] = {}
+        self._lock = threading.Lock()
+
+
+    def get_parser(self, schema: type[BaseModel]) -> JsonOutputParser:
+        parser = self._parsers.get(schema)
+        if parser is None:
+            with self._lock:
+                parser = self._parsers.setdefault(schema, JsonOutputParser(pydantic_object=schema))
+        return parser
+
+
+    def get_template(self, schema: type[BaseModel]) -> ChatPromptTemplate:
+        template = self._templates.get(schema)
+        if template is None:
+            template = ChatPromptTemplate.from_messages([
+                ("system", MAIN_SYSTEM_PROMPT_TEXT),
+                MessagesPlaceholder(variable_name="chat_history"),
+                ("system", JSON_REMINDER_PROMPT_TEXT),
+            ]).partial(format_instructions=self.get_parser(schema).get_format_instructions())
+            with self._lock:
+                template = self._templates.setdefault(schema, template)
+        return template
+
+
+    def render(self, schema: type[BaseModel], messages: List[BaseMessage], extra_context: str) -> PromptValue:
+        return self.get_template(schema).invoke({"chat_history": messages, "extra_context": extra_context})
+
+
+    def get_system_prompt_text(self, schema: type[BaseModel]) -> str:
+        """Текст всех системных сообщений промпта без истории и контекста — для подсчёта бюджета."""
+        text = self._system_prompt_texts.get(schema)
+        if text is None:
+            prompt = self.render(schema, messages=[], extra_context="")
+            text = "\n".join(message.content for message in prompt.to_messages())
+            with self._lock:
+                text = self._system_prompt_texts.setdefault(schema, text)
+        return text
+
+
+@lru_cache
+def get_prompt_registry() -> PromptRegistry:
+    return PromptRegistry()
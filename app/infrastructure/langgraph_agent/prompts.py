@@ -13,4 +13,8 @@ MAIN_SYSTEM_PROMPT_TEXT = '''
     1. Проанализируй последнее сообщение пользователя.
     2. Если для ответа нужны точные определения, даты или детали из лекций — установи is_need_more_context: true.
     3. Если это простое общение (приветствие, благодарность) — установи is_need_more_context: false.
+    4. Если нужен поиск, в find_context напиши основной запрос, а в find_contexts — одну-две переформулировки
+       (синонимы, точные термины, номера теорем), чтобы найти всё нужное за один поиск.
     '''
+
+JSON_REMINDER_PROMPT_TEXT = "Вспомни: твой ответ должен быть СТРОГО в формате JSON по указанной схеме. Не пиши ничего, кроме JSON."
@@ -0,0 +1,114 @@
+import asyncio
+import threading
+from functools import lru_cache
+from typing import Awaitable, Callable, List
+
+import numpy as np
+
+from app.core.config.utils import get_settings
+from app.core.metrics import get_metrics
+from app.domains.agent.models import QuestionRoute
+
+
+# Реплики, на которые отвечают без учебных материалов
+SMALL_TALK_PROTOTYPES = (
+    "Привет",
+    "Здравствуйте",
+    "Добрый день",
+    "Спасибо",
+    "Спасибо, понятно",
+    "Пока",
+    "Как дела?",
+    "Кто ты?",
+    "Что ты умеешь?",
+    "Hello",
+    "Thanks",
+    "Who are you?",
+)
+
+
+class QuestionRouter:
+    """
+    Дешёвая маршрутизация вопроса до основного вызова llm.
+
+    Вопрос сравнивается по косинусной близости с эмбеддингами типовых реплик без
+    учебной сути (приветствия, благодарности, вопросы об ассистенте). Если он на них
+    не похож, поиск по материалам выполняется сразу, и llm отвечает за один вызов.
+    В полосе шириной unsure_margin под порогом роутер не уверен и выбирает SPECULATE.
+    """
+
+    def __init__(
+            self,
+            threshold: float = None,
+            unsure_margin: float = None,
+            prototypes: tuple[str, ...] = SMALL_TALK_PROTOTYPES,
+    ):
+        settings = get_settings()
+        self.threshold = settings.ROUTER_SMALL_TALK_THRESHOLD if threshold is None else threshold
+        self.unsure_margin = settings.ROUTER_UNSURE_MARGIN if unsure_margin is None else unsure_margin
+        self.prototypes = prototypes
+        self._vectors: np.ndarray | None = None
+        self._lock = threading.Lock()
+        self._async_lock = asyncio.Lock()
+
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+
+    @property
+    def is_ready(self) -> bool:
+        return self._vectors is not None
+
+
+    def set_prototype_vectors(self, vectors: List[List[float]]) -> None:
+        with self._lock:
+            self._vectors = self._normalize(np.asarray(vectors, dtype=np.float32))
+
+
+    def prepare(self, embed: Callable[[str], List[float]]) -> None:
+        # Эталоны считаются один раз, параллельные запросы ждут первый под блокировкой
+        if self.is_ready:
+            return
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = self._normalize(np.asarray([embed(text) for text in self.prototypes], dtype=np.float32))
+
+
+    async def aprepare(self, embed: Callable[[str], Awaitable[List[float]]]) -> None:
+        if self.is_ready:
+            return
+        async with self._async_lock:
+            if not self.is_ready:
+                self.set_prototype_vectors([await embed(text) for text in self.prototypes])
+
+
+    def route(self, question_vector: List[float]) -> QuestionRoute:
+        vectors = self._vectors
+        if vectors is None:
+            raise RuntimeError("Эмбеддинги эталонных реплик не посчитаны: сначала вызовите prepare или aprepare")
+        question = self._normalize(np.asarray(question_vector, dtype=np.float32))
+        similarity = float(np.max(vectors @ question))
+        if similarity >= self.threshold:
+            route = QuestionRoute.ANSWER
+        elif similarity < self.threshold - self.unsure_margin:
+            route = QuestionRoute.SEARCH
+        else:
+            route = QuestionRoute.SPECULATE
+        get_metrics().increment(f"router.{route.value}")
+        return route
+
+
+@lru_cache
+def _get_default_question_router() -> QuestionRouter | None:
+    if not get_settings().ROUTER_ENABLED:
+        return None
+    return QuestionRouter()
+
+
+def get_question_router(router: QuestionRouter | None = None) -> QuestionRouter | None:
+    if router is None:
+        return _get_default_question_router()
+    return router
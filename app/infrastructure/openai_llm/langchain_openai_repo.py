@@ -1,29 +1,97 @@
-from typing import List, Sequence
+import json
+from functools import lru_cache
+from typing import AsyncIterator, Iterator, List, Sequence
 
 from langchain_core.prompt_values import PromptValue
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
 from langchain_core.prompts import ChatPromptTemplate
+from pydantic import ValidationError
 
 from app.core.config.utils import get_settings
 from app.domains.chats.schemas import MessageInput, AuthorRole
-from app.domains.llm.interface import LLMInterface
+from app.domains.llm.exceptions import StructuredOutputException
+from app.domains.llm.interface import LLMInterface, SchemaT
 
 
 class OpenAIRepository(LLMInterface):
     def __init__(self):
         self.model = self._get_model_name()
         self.llm = self._get_llm(self.model)
+        self.structured_method = get_settings().LLM_STRUCTURED_METHOD
+        self._structured_llms = {}
 
 
     def invoke(self, prompt: PromptValue | List[MessageInput] | str | Sequence[str]) -> str:
         # messages = self._create_standard_messages(prompt)
         response = self.llm.invoke(prompt)
-        if isinstance(response.content, str):
-            return response.content
-        if isinstance(response.content, list):
-            return "".join([block["text"] for block in response.content if isinstance(block, dict) and "text" in block])
-        return str(response.content)
+        return self._content_to_text(response.content)
+
+
+    def stream(self, prompt: PromptValue | List[MessageInput] | str | Sequence[str]) -> Iterator[str]:
+        for chunk in self.llm.stream(prompt):
+            text = self._content_to_text(chunk.content)
+            if text:
+                yield text
+
+
+    async def ainvoke(self, prompt: PromptValue | List[MessageInput] | str | Sequence[str]) -> str:
+        response = await self.llm.ainvoke(prompt)
+        return self._content_to_text(response.content)
+
+
+    async def astream(self, prompt: PromptValue | List[MessageInput] | str | Sequence[str]) -> AsyncIterator[str]:
+        async for chunk in self.llm.astream(prompt):
+            text = self._content_to_text(chunk.content)
+            if text:
+                yield text
+
+
+    def _get_structured_llm(self, schema: type[SchemaT]):
+        structured_llm = self._structured_llms.get(schema)
+        if structured_llm is None:
+            # include_raw: при ошибке разбора нужен сырой ответ, чтобы починить его без повторного запроса
+            structured_llm = self.llm.with_structured_output(schema, method=self.structured_method, include_raw=True)
+            structured_llm = self._structured_llms.setdefault(schema, structured_llm)
+        return structured_llm
+
+
+    def _get_raw_text(self, raw: AIMessage) -> str:
+        for tool_call in raw.invalid_tool_calls or []:
+            if tool_call.get("args"):
+                return tool_call["args"]
+        for tool_call in raw.tool_calls or []:
+            return json.dumps(tool_call["args"], ensure_ascii=False)
+        return self._content_to_text(raw.content)
+
+
+    def _unpack_structured(self, result: dict, schema: type[SchemaT]) -> SchemaT:
+        parsed = result.get("parsed")
+        if isinstance(parsed, schema):
+            return parsed
+        if isinstance(parsed, dict):
+            try:
+                return schema.model_validate(parsed)
+            except ValidationError:
+                raise StructuredOutputException(json.dumps(parsed, ensure_ascii=False))
+        raise StructuredOutputException(self._get_raw_text(result["raw"]))
+
+
+    def invoke_structured(self, prompt: PromptValue | str | Sequence[str], schema: type[SchemaT]) -> SchemaT:
+        return self._unpack_structured(self._get_structured_llm(schema).invoke(prompt), schema)
+
+
+    async def ainvoke_structured(self, prompt: PromptValue | str | Sequence[str], schema: type[SchemaT]) -> SchemaT:
+        return self._unpack_structured(await self._get_structured_llm(schema).ainvoke(prompt), schema)
+
+
+    @staticmethod
+    def _content_to_text(content) -> str:
+        if isinstance(content, str):
+            return content
+        if isinstance(content, list):
+            return "".join([block["text"] for block in content if isinstance(block, dict) and "text" in block])
+        return str(content)
 
 
     def _get_model_name(self) -> str:
@@ -47,3 +115,15 @@ class OpenAIRepository(LLMInterface):
             elif message.author == AuthorRole.SYSTEM:
                 result_messages.append(SystemMessage(message.message_text))
         return result_messages
+
+
+@lru_cache
+def _get_default_llm() -> OpenAIRepository:
+    return OpenAIRepository()
+
+
+def get_llm(llm: LLMInterface | None = None) -> LLMInterface:
+    # Один клиент на процесс: пул соединений и структурированные обёртки не пересоздаются на запрос
+    if llm is None:
+        return _get_default_llm()
+    return llm
@@ -0,0 +1,56 @@
+from functools import lru_cache
+
+import tiktoken
+from loguru import logger
+
+from app.core.config.utils import get_settings
+
+
+# Кодировка для моделей, которых tiktoken ещё не знает
+DEFAULT_ENCODING = "o200k_base"
+# Средняя длина токена для оценки, когда настоящую кодировку загрузить не удалось
+CHARS_PER_TOKEN = 4
+
+
+class CharEstimateEncoding:
+    """
+    Грубая замена кодировки tiktoken: токеном считается каждые CHARS_PER_TOKEN символов.
+
+    tiktoken при первом обращении скачивает BPE-файл (его можно заранее положить в
+    TIKTOKEN_CACHE_DIR). Без сети подсчёт токенов не должен ронять запись сообщений
+    и сборку промпта, поэтому бюджет считается приблизительно.
+    """
+
+    name = "char_estimate"
+
+
+    def encode(self, text: str) -> list[str]:
+        return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+    def decode(self, tokens: list[str]) -> str:
+        return "".join(tokens)
+
+
+def get_token_model_name(model_name: str = None) -> str:
+    if model_name is None:
+        return get_settings().OPENAI_MODEL or "gpt-4o"
+    return model_name
+
+
+@lru_cache
+def get_tokenizer(model_name: str = None) -> tiktoken.Encoding | CharEstimateEncoding:
+    model_name = get_token_model_name(model_name)
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        logger.warning("Failed to load tiktoken encoding for {} ({}), token counts are estimated", model_name, e)
+        return CharEstimateEncoding()
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str, model_name: str = None) -> int:
+    return len(get_tokenizer(model_name).encode(text))
@@ -1,14 +1,57 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Iterator
 import io
+import math
+import multiprocessing
 
 import pymupdf
 from pydantic import ValidationError
 
-from app.domains.documents.schemas import PDFBase
+from app.core.config.utils import get_settings
+from app.domains.documents.exceptions import DocumentParseException
+from app.domains.documents.schemas import PDFBase, PDFPage, Metadata
 from app.domains.documents.parser_interface import ParserInterface
 
 
+# Байты документа, которые получает каждый процесс пула при старте
+_worker_pdf_bytes: bytes | None = None
+# Парсер вызывается из потоков загрузки в процессе с потоками torch, qdrant и event loop:
+# fork такого процесса может унести в дочерний захваченные блокировки и зависнуть
+_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def _init_worker(raw_data: bytes) -> None:
+    global _worker_pdf_bytes
+    _worker_pdf_bytes = raw_data
+
+
+def _extract_pages(doc: pymupdf.Document, start: int, stop: int) -> list[tuple[int, str]]:
+    """Текст страниц [start, stop) в виде (номер страницы с 1, текст), пустые страницы пропускаются."""
+    pages = []
+    for page_index in range(start, stop):
+        page_num = page_index + 1
+        try:
+            clean_text = doc[page_index].get_text().strip()
+            if clean_text:
+                pages.append((page_num, clean_text))
+        except Exception as page_err:
+            print(f"[DEBUG] ОШИБКА на странице {page_num}: {page_err}")
+    return pages
+
+
+def _extract_pages_in_worker(page_range: tuple[int, int]) -> list[tuple[int, str]]:
+    with pymupdf.open(stream=_worker_pdf_bytes, filetype="pdf") as doc:
+        return _extract_pages(doc, *page_range)
+
+
 class ParserPDF(ParserInterface):
+    def __init__(self, workers: int = None, parallel_threshold: int = None):
+        settings = get_settings()
+        self.workers = settings.PDF_PARSE_WORKERS if workers is None else workers
+        self.parallel_threshold = settings.PDF_PARALLEL_THRESHOLD if parallel_threshold is None else parallel_threshold
+
     def _create_model_from_dict(self, documents_data: dict) -> PDFBase:
         try:
             return PDFBase.model_validate(documents_data)
@@ -18,6 +61,39 @@ class ParserPDF(ParserInterface):
             print(f"Неизвестная ошибка: {e}")
         return PDFBase()
 
+    def _split_into_ranges(self, page_count: int) -> list[tuple[int, int]]:
+        # Несколько диапазонов на процесс, чтобы тяжёлые страницы не тормозили один воркер
+        size = max(1, math.ceil(page_count / (self.workers * 4)))
+        return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+    def _iter_text(self, raw_data: bytes) -> Iterator[tuple[int, str]]:
+        with pymupdf.open(stream=raw_data, filetype="pdf") as doc:
+            page_count = doc.page_count
+            if self.workers <= 1 or page_count < self.parallel_threshold:
+                for page_index in range(page_count):
+                    yield from _extract_pages(doc, page_index, page_index + 1)
+                return
+
+        # Большой документ: страницы делятся между процессами. В работе держим ограниченное
+        # число диапазонов и отдаём их строго по порядку, чтобы не копить весь текст в памяти
+        ranges = iter(self._split_into_ranges(page_count))
+        with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=_MP_CONTEXT,
+                initializer=_init_worker,
+                initargs=(raw_data,),
+        ) as executor:
+            in_flight = deque()
+            for page_range in ranges:
+                in_flight.append(executor.submit(_extract_pages_in_worker, page_range))
+                if len(in_flight) >= self.workers * 2:
+                    yield from in_flight.popleft().result()
+            while in_flight:
+                yield from in_flight.popleft().result()
+
+    def _extract_text(self, raw_data: bytes) -> list[tuple[int, str]]:
+        return list(self._iter_text(raw_data))
+
     def _convert_pdf_to_model(self, file_bytes: io.BytesIO, filename: str) -> PDFBase:
         documents_data = {"pages": []}
 
@@ -30,30 +106,17 @@ class ParserPDF(ParserInterface):
             return PDFBase()
 
         try:
-            # 2. Пытаемся открыть PDF
-            with pymupdf.open(stream=raw_data, filetype="pdf") as doc:
-
-                # 3. Цикл по страницам
-                for page_num, page in enumerate(doc, start=1):
-                    try:
-                        text = page.get_text()
-                        clean_text = text.strip()
-
-                        if not clean_text:
-                            continue
-
-                        documents_data["pages"].append({
-                            "content": clean_text,
-                            "metadata": {
-                                "source": filename,
-                                "page": page_num,
-                            }
-                        })
-                    except Exception as page_err:
-                        print(f"[DEBUG] ОШИБКА на странице {page_num}: {page_err}")
-
-            # 4. Финальная проверка данных перед созданием модели
-            # Предполагаем, что у вас есть этот метод (как в предыдущих сообщениях)
+            # 2. Пытаемся открыть PDF и достать текст страниц
+            for page_num, clean_text in self._extract_text(raw_data):
+                documents_data["pages"].append({
+                    "content": clean_text,
+                    "metadata": {
+                        "source": filename,
+                        "page": page_num,
+                    }
+                })
+
+            # 3. Финальная проверка данных перед созданием модели
             result = self._create_model_from_dict(documents_data)
             return result
 
@@ -64,3 +127,19 @@ class ParserPDF(ParserInterface):
 
     def get_pdf(self, file_bytes: io.BytesIO, filename: str = "unknown") -> PDFBase:
         return self._convert_pdf_to_model(file_bytes, filename)
+
+    def iter_pages(self, file_bytes: io.BytesIO, filename: str = "unknown") -> Iterator[PDFPage]:
+        raw_data = file_bytes.getvalue()
+        if len(raw_data) == 0:
+            return
+
+        # Ошибку разбора не глотаем: молча оборванный генератор выглядит как успешно
+        # прочитанный документ, и загрузка сохранила бы его частично проиндексированным
+        try:
+            for page_num, clean_text in self._iter_text(raw_data):
+                try:
+                    yield PDFPage(content=clean_text, metadata=Metadata(source=filename, page=page_num))
+                except ValidationError as e:
+                    print(f"Данные страницы не соответствуют схеме: {e.json()}")
+        except Exception as e:
+            raise DocumentParseException(f"Не удалось разобрать {filename}: {e}") from e
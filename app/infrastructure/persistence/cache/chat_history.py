@@ -0,0 +1,151 @@
+import threading
+from collections import OrderedDict, deque
+from functools import lru_cache
+from typing import List
+
+from app.core.config.utils import get_settings
+from app.domains.chats.cache_interface import ChatHistoryCacheInterface
+from app.domains.chats.schemas import ChatHistoryWindow, MessageRead
+
+
+class _Window:
+    def __init__(self, messages: List[MessageRead], complete: bool, size: int):
+        self.messages: deque[MessageRead] = deque(messages, maxlen=size)
+        self.complete = complete and len(messages) <= size
+
+
+class InMemoryChatHistoryCache(ChatHistoryCacheInterface):
+    """
+    Кольцевой буфер последних сообщений на каждый чат в памяти процесса.
+
+    Чаты вытесняются по LRU. Подходит для одного процесса: при нескольких
+    воркерах запись в одном не обновит окно в другом, для этого есть Redis.
+    """
+
+    def __init__(self, window_size: int = None, max_chats: int = None):
+        settings = get_settings()
+        self.window_size = settings.CHAT_HISTORY_WINDOW if window_size is None else window_size
+        self._max_chats = settings.CHAT_HISTORY_CACHE_CHATS if max_chats is None else max_chats
+        self._windows: OrderedDict[int, _Window] = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, chat_id: int) -> ChatHistoryWindow | None:
+        with self._lock:
+            window = self._windows.get(chat_id)
+            if window is None:
+                return None
+            self._windows.move_to_end(chat_id)
+            return ChatHistoryWindow(messages=list(window.messages), complete=window.complete)
+
+
+    def set(self, chat_id: int, messages: List[MessageRead], complete: bool) -> None:
+        with self._lock:
+            self._windows[chat_id] = _Window(messages, complete, self.window_size)
+            self._windows.move_to_end(chat_id)
+            while len(self._windows) > self._max_chats:
+                self._windows.popitem(last=False)
+
+
+    def append(self, chat_id: int, messages: List[MessageRead]) -> None:
+        with self._lock:
+            window = self._windows.get(chat_id)
+            if window is None:
+                return
+            for message in messages:
+                # Самое старое сообщение вытесняется: окно больше не покрывает весь чат
+                if len(window.messages) == window.messages.maxlen:
+                    window.complete = False
+                window.messages.append(message)
+
+
+    def invalidate(self, chat_id: int) -> None:
+        with self._lock:
+            self._windows.pop(chat_id, None)
+
+
+class RedisChatHistoryCache(ChatHistoryCacheInterface):
+    """
+    Окно последних сообщений в Redis (или совместимом сервере: Valkey, KeyDB, DragonflyDB).
+
+    Сообщения лежат списком JSON в ключе чата, признак полноты — в соседнем ключе.
+    Общий для всех воркеров, ключи живут ttl секунд с последней записи.
+    """
+
+    def __init__(self, client=None, url: str = None, window_size: int = None, ttl: int = None, prefix: str = "chat_history"):
+        settings = get_settings()
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(settings.REDIS_URL if url is None else url)
+        self.client = client
+        self.window_size = settings.CHAT_HISTORY_WINDOW if window_size is None else window_size
+        self.ttl = settings.CHAT_HISTORY_CACHE_TTL if ttl is None else ttl
+        self.prefix = prefix
+
+
+    def _keys(self, chat_id: int) -> tuple[str, str]:
+        key = f"{self.prefix}:{chat_id}"
+        return key, f"{key}:complete"
+
+
+    def get(self, chat_id: int) -> ChatHistoryWindow | None:
+        messages_key, complete_key = self._keys(chat_id)
+        pipeline = self.client.pipeline()
+        pipeline.lrange(messages_key, 0, -1)
+        pipeline.get(complete_key)
+        raw_messages, complete = pipeline.execute()
+        # Пустой список Redis не хранит: пустой чат всегда промах, это один дешёвый запрос в БД
+        if complete is None or not raw_messages:
+            return None
+        return ChatHistoryWindow(
+            messages=[MessageRead.model_validate_json(raw) for raw in raw_messages],
+            complete=complete == b"1",
+        )
+
+
+    def set(self, chat_id: int, messages: List[MessageRead], complete: bool) -> None:
+        messages_key, complete_key = self._keys(chat_id)
+        complete = complete and len(messages) <= self.window_size
+        messages = messages[-self.window_size:]
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.delete(messages_key, complete_key)
+        if messages:
+            pipeline.rpush(messages_key, *[message.model_dump_json() for message in messages])
+            pipeline.set(complete_key, "1" if complete else "0", ex=self.ttl)
+            pipeline.expire(messages_key, self.ttl)
+        pipeline.execute()
+
+
+    def append(self, chat_id: int, messages: List[MessageRead]) -> None:
+        if not messages:
+            return
+        messages_key, complete_key = self._keys(chat_id)
+        pipeline = self.client.pipeline(transaction=True)
+        # RPUSHX пишет только в существующий список: чата нет в кэше — нечего дополнять
+        pipeline.rpushx(messages_key, *[message.model_dump_json() for message in messages])
+        pipeline.ltrim(messages_key, -self.window_size, -1)
+        pipeline.expire(messages_key, self.ttl)
+        pipeline.expire(complete_key, self.ttl)
+        length = pipeline.execute()[0]
+        if length > self.window_size:
+            self.client.set(complete_key, "0", ex=self.ttl)
+
+
+    def invalidate(self, chat_id: int) -> None:
+        self.client.delete(*self._keys(chat_id))
+
+
+@lru_cache
+def _get_default_chat_history_cache() -> ChatHistoryCacheInterface | None:
+    backend = get_settings().CHAT_HISTORY_CACHE.lower()
+    if backend == "memory":
+        return InMemoryChatHistoryCache()
+    if backend == "redis":
+        return RedisChatHistoryCache()
+    return None
+
+
+def get_chat_history_cache(cache: ChatHistoryCacheInterface | None = None) -> ChatHistoryCacheInterface | None:
+    if cache is None:
+        return _get_default_chat_history_cache()
+    return cache
@@ -1,21 +1,58 @@
-from typing import AsyncIterator
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator
 
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import Pool
 
 from app.core.config import get_settings
 from app.infrastructure.persistence.postgres import Base
+from app.infrastructure.persistence.postgres.connection.upgrade import upgrade_schema
+
+
+def _get_engine_options(uri: str) -> dict:
+    """
+    Get engine and connection pool options from settings.
+    """
+    settings = get_settings()
+    options = {
+        "echo": settings.DB_ECHO,
+        "future": True,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+    # SQLite сам выбирает тип пула, размеры пула к нему неприменимы
+    if make_url(uri).get_backend_name() != "sqlite":
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    return options
+
+
+def _get_pool_stats(pool: Pool) -> dict:
+    stats = {"pool": type(pool).__name__, "status": pool.status()}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            stats[name] = method()
+    return stats
 
 
 class SessionManager:
     """
     A class that implements the necessary functionality for working with the database:
     issuing sessions, storing and updating connection settings.
+
+    Engines and their connection pools are created once per process and shared by all sessions.
     """
 
     def __init__(self) -> None:
-        self.refresh()
+        if not hasattr(self, "engine"):
+            self.refresh()
 
     def __new__(cls):
         if not hasattr(cls, "instance"):
@@ -23,17 +60,44 @@ class SessionManager:
         return cls.instance  # noqa
 
     def get_session_maker(self) -> sessionmaker:
-        return sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        return self._session_maker
 
     def get_sync_session_maker(self) -> sessionmaker:
-        sync_uri = get_settings().database_uri_sync
-        sync_engine = create_engine(sync_uri, echo=False, future=True)
-        return sessionmaker(sync_engine, class_=Session, expire_on_commit=False)
+        return self._sync_session_maker
 
     def refresh(self) -> None:
+        """
+        Recreate engines with the current settings.
+        Previously created sync engine is disposed, the async one should be disposed via dispose().
+        """
+        settings = get_settings()
+        if hasattr(self, "sync_engine"):
+            self.sync_engine.dispose()
+
         self.engine = create_async_engine(
-            get_settings().database_uri, echo=True, future=True
+            settings.database_uri, **_get_engine_options(settings.database_uri)
         )
+        self.sync_engine = create_engine(
+            settings.database_uri_sync, **_get_engine_options(settings.database_uri_sync)
+        )
+        self._session_maker = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self._sync_session_maker = sessionmaker(self.sync_engine, class_=Session, expire_on_commit=False)
+
+    async def dispose(self) -> None:
+        """
+        Close all pooled connections. Call on application shutdown.
+        """
+        await self.engine.dispose()
+        self.sync_engine.dispose()
+
+    def pool_status(self) -> dict:
+        """
+        Get current connection pool statistics for both engines.
+        """
+        return {
+            "async": _get_pool_stats(self.engine.pool),
+            "sync": _get_pool_stats(self.sync_engine.pool),
+        }
 
 
 async def init_models() -> None:
@@ -44,19 +108,40 @@ async def init_models() -> None:
     engine = SessionManager().engine
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
     print("✅ Таблицы успешно созданы (или уже существовали).")
 
 
-async def get_session() -> AsyncIterator[AsyncSession]:
+@asynccontextmanager
+async def async_session_scope() -> AsyncIterator[AsyncSession]:
+    """
+    Async session that is closed (and its connection returned to the pool) on exit.
+    """
     session_maker = SessionManager().get_session_maker()
     async with session_maker() as session:
         yield session
 
 
-def get_sync_session() -> Session:
-    session_maker = SessionManager().get_sync_session_maker()
-    session = session_maker()
-    return session
+async def get_session() -> AsyncIterator[AsyncSession]:
+    async with async_session_scope() as session:
+        yield session
+
+
+@contextmanager
+def sync_session_scope() -> Iterator[Session]:
+    """
+    Sync session that is closed (and its connection returned to the pool) on exit.
+    """
+    session = SessionManager().get_sync_session_maker()()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def get_sync_session() -> Iterator[Session]:
+    with sync_session_scope() as session:
+        yield session
 
 
 def init_models_sync() -> None:
@@ -64,23 +149,22 @@ def init_models_sync() -> None:
     Синхронно создаёт все таблицы в базе данных.
     Использует sync_uri (например, для SQLite).
     """
-    # 1. Получаем настройки
-    settings = get_settings()
-    sync_uri = settings.database_uri_sync
-
-    # 2. Создаем синхронный движок
-    # echo=True полезен при инициализации, чтобы видеть SQL-запросы создания
-    engine = create_engine(sync_uri, echo=True, future=True)
+    # 1. Получаем общий синхронный движок
+    manager = SessionManager()
 
-    # 3. Создаем таблицы
-    Base.metadata.create_all(bind=engine)
+    # 2. Создаем таблицы и добавляем новые колонки/индексы в уже существующие
+    Base.metadata.create_all(bind=manager.sync_engine)
+    with manager.sync_engine.begin() as conn:
+        upgrade_schema(conn)
 
-    print(f"✅ [Sync] Таблицы успешно созданы в {sync_uri}")
+    print(f"✅ [Sync] Таблицы успешно созданы в {manager.sync_engine.url}")
 
 
 __all__ = [
     "get_session",
     "get_sync_session",
+    "async_session_scope",
+    "sync_session_scope",
     "SessionManager",
     "init_models_sync"
-]
\ No newline at end of file
+]
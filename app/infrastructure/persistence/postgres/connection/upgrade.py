@@ -0,0 +1,46 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+
+# Columns added to existing tables after their first release: (table, column, DDL type with default).
+# create_all never alters an existing table, so these are added explicitly on startup
+ADDED_COLUMNS = [
+    ("messages", "length", "INTEGER NOT NULL DEFAULT 0"),
+    # 0 marks a legacy row: its token count is computed on read
+    ("messages", "token_count", "INTEGER NOT NULL DEFAULT 0"),
+    ("messages", "sources", "JSON"),
+]
+
+ADDED_INDEXES = [
+    ("messages", "CREATE INDEX IF NOT EXISTS ix__messages__chat_id_id ON messages (chat_id, id)"),
+]
+
+
+def upgrade_schema(connection: Connection) -> list[str]:
+    """
+    Bring tables created by an older version up to the current models.
+
+    Idempotent: only missing columns are added. Works on SQLite and Postgres.
+    Returns the executed statements.
+    """
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    existing_columns = {}
+    statements = []
+    for table, column, ddl in ADDED_COLUMNS:
+        if table not in tables:
+            continue
+        if table not in existing_columns:
+            existing_columns[table] = {item["name"] for item in inspector.get_columns(table)}
+        if column not in existing_columns[table]:
+            statements.append(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    statements.extend(statement for table, statement in ADDED_INDEXES if table in tables)
+
+    for statement in statements:
+        connection.execute(text(statement))
+    return statements
+
+
+__all__ = [
+    "upgrade_schema",
+]
@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, String, Uuid, Integer, ForeignKey
+from sqlalchemy import BigInteger, String, Uuid, Integer, ForeignKey, Index, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.infrastructure.persistence.postgres.modules._base.model import BaseModel
@@ -19,9 +19,14 @@ class Chat(BaseModel):
 
 class Message(BaseModel):
     __tablename__ = "messages"
+    # История читается с конца чата: WHERE chat_id = ? AND id < ? ORDER BY id DESC LIMIT ?
+    __table_args__ = (Index("ix__messages__chat_id_id", "chat_id", "id"),)
 
     chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id"), nullable=False, unique=False)
     text: Mapped[str] = mapped_column(String, nullable=True, unique=False, default="")
     author: Mapped[str] = mapped_column(String, nullable=False, unique=False)
+    length: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    token_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0, server_default="0")
+    sources: Mapped[list | None] = mapped_column(JSON, nullable=True, default=None)
 
     chat: Mapped["Chat"] = relationship(back_populates="messages")
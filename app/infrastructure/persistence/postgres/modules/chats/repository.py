@@ -1,15 +1,16 @@
-from loguru import logger
 from typing import List
 
-from sqlalchemy.sql import ColumnElement
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Session, aliased
-from sqlalchemy import select, func, desc, asc
+from sqlalchemy.orm import Session
+from sqlalchemy import select, desc
+
+from app.core.config.utils import get_settings
 
 from app.infrastructure.persistence.postgres.modules._base.base_repository import CRUDRepository
 from app.domains.chats.schemas import ChatRead, ChatCreate, ChatUpdate, MessageRead, MessageCreate, MessageUpdate
 from app.domains.chats.repo_interface import ChatRepositoryInterface, MessageRepositoryInterface
 from app.infrastructure.persistence.postgres.modules.chats.models import Chat, Message
+from app.infrastructure.openai_llm.tokenizer import count_tokens
 
 
 class SqlChatRepository(CRUDRepository[Chat, ChatRead, ChatCreate, ChatUpdate], ChatRepositoryInterface):
@@ -22,77 +23,123 @@ class SqlChatRepository(CRUDRepository[Chat, ChatRead, ChatCreate, ChatUpdate],
         )
         self._chat_model = Chat
         self._message_model = Message
+        self._history_page_size = get_settings().HISTORY_PAGE_SIZE
+
+
+    def _make_db_message(self, message: MessageCreate) -> Message:
+        # Длина и число токенов считаются один раз при записи, а не на каждом чтении истории
+        text = message.text or ""
+        return self._message_model(
+            **message.model_dump(),
+            length=len(text),
+            token_count=count_tokens(text),
+        )
 
 
     async def add_message(self, message: MessageCreate) -> MessageRead:
         """Добавляет сообщение в базу данных асинхронно."""
-        db_message = self._message_model(**message.model_dump())
+        db_message = self._make_db_message(message)
         self.session.add(db_message)
+        # expire_on_commit=False и значения по умолчанию на стороне Python: refresh не нужен
         await self.session.commit()
-        await self.session.refresh(db_message)
         return MessageRead.model_validate(db_message)
 
 
+    async def add_messages(self, messages: List[MessageCreate]) -> List[MessageRead]:
+        """Добавляет сообщения одной транзакцией: один INSERT на всю пачку и один commit."""
+        db_messages = [self._make_db_message(message) for message in messages]
+        self.session.add_all(db_messages)
+        await self.session.commit()
+        return [MessageRead.model_validate(db_message) for db_message in db_messages]
+
+
     async def get_last_messages(self, chat_id: int, context_length: int) -> List[MessageRead]:
-        query = self._get_messages_with_limit_query(chat_id, context_length)
-        result = await self.session.execute(query)
-        # SQLAlchemy вернет строки подзапроса, нам нужно смапить их на модель сообщений
-        return [MessageRead.model_validate(msg) for msg in result.scalars().all()]
+        selected, used, before_id = [], 0, None
+        while True:
+            result = await self.session.execute(self._get_last_messages_query(chat_id, before_id))
+            rows = result.scalars().all()
+            is_full, used = self._take_within_budget(rows, selected, context_length, used)
+            if is_full or len(rows) < self._history_page_size:
+                break
+            before_id = rows[-1].id
+        return [self._to_message_read(msg) for msg in reversed(selected)]
 
 
     def add_message_sync(self, message: MessageCreate) -> MessageRead:
         """Добавляет сообщение в базу данных синхронно."""
-        db_message = self._message_model(**message.model_dump())
+        db_message = self._make_db_message(message)
         self.session.add(db_message)
         self.session.commit()
-        self.session.refresh(db_message)
         return MessageRead.model_validate(db_message)
 
 
-    def get_last_messages_sync(self, chat_id: int, context_length: int) -> List[MessageRead]:
-        logger.info(f"chat_id: {chat_id}, context_length: {context_length}")
-        query = self._get_messages_with_limit_query(chat_id, context_length)
-        result = self.session.execute(query)
-        logger.info(f"result: {result}")
-
-        all_messages = result.scalars().all()
-        logger.info(f"len = {len(all_messages)}")
-
-        for msg in all_messages:
-            logger.info(f"msg: {msg}")
-
-        res = [MessageRead.model_validate(msg) for msg in all_messages]
-
-        logger.info(f"res: {res}")
-        return res
-
-    def _get_messages_with_limit_query(self, chat_id: int, context_length: int):
-        # ... (ваши пункты 1 и 2 без изменений) ...
-        msg_len = func.length(func.coalesce(self._message_model.text, ""))
-        cumulative_len = func.sum(msg_len).over(
-            partition_by=self._message_model.chat_id,
-            order_by=desc(self._message_model.id)
-        ).label("running_total")
-
-        # 3. Создаем подзапрос
-        subquery = (
-            select(
-                self._message_model,  # Здесь выбираются все колонки модели
-                cumulative_len
-            )
-            .filter(self._message_model.chat_id == chat_id)
-            .subquery()
-        )
+    def add_messages_sync(self, messages: List[MessageCreate]) -> List[MessageRead]:
+        """Добавляет сообщения одной транзакцией синхронно."""
+        db_messages = [self._make_db_message(message) for message in messages]
+        self.session.add_all(db_messages)
+        self.session.commit()
+        return [MessageRead.model_validate(db_message) for db_message in db_messages]
 
-        # !!! ВАЖНО: Создаем алиас модели, который "смотрит" на подзапрос
-        msg_alias = aliased(self._message_model, subquery)
 
-        # 4. Выбираем алиас модели, а не просто subquery
-        return (
-            select(msg_alias)
-            .filter(subquery.c.running_total <= context_length)
-            .order_by(asc(subquery.c.id))
-        )
+    def get_last_messages_sync(self, chat_id: int, context_length: int) -> List[MessageRead]:
+        selected, used, before_id = [], 0, None
+        while True:
+            rows = self.session.execute(self._get_last_messages_query(chat_id, before_id)).scalars().all()
+            is_full, used = self._take_within_budget(rows, selected, context_length, used)
+            if is_full or len(rows) < self._history_page_size:
+                break
+            before_id = rows[-1].id
+        return [self._to_message_read(msg) for msg in reversed(selected)]
+
+
+    async def get_recent_messages(self, chat_id: int, limit: int) -> List[MessageRead]:
+        result = await self.session.execute(self._get_last_messages_query(chat_id, limit=limit))
+        return [self._to_message_read(msg) for msg in reversed(result.scalars().all())]
+
+
+    def get_recent_messages_sync(self, chat_id: int, limit: int) -> List[MessageRead]:
+        rows = self.session.execute(self._get_last_messages_query(chat_id, limit=limit)).scalars().all()
+        return [self._to_message_read(msg) for msg in reversed(rows)]
+
+
+    @staticmethod
+    def _get_token_count(message: Message) -> int:
+        # У сообщений, записанных до появления колонки, token_count = 0
+        return message.token_count or count_tokens(message.text or "")
+
+
+    def _to_message_read(self, message: Message) -> MessageRead:
+        return MessageRead.model_validate(message).model_copy(update={"token_count": self._get_token_count(message)})
+
+
+    def _take_within_budget(
+            self,
+            rows: List[Message],
+            selected: List[Message],
+            context_length: int,
+            used: int,
+    ) -> tuple[bool, int]:
+        """
+        Добавляет строки (от новых к старым) в selected, пока хватает бюджета в токенах.
+        Возвращает признак исчерпания бюджета и израсходованное число токенов.
+        """
+        for message in rows:
+            tokens = self._get_token_count(message)
+            # Самое новое сообщение берём всегда: это текущий вопрос, лишнее обрежет ContextAssembler
+            if used + tokens > context_length and selected:
+                return True, used
+            selected.append(message)
+            used += tokens
+        return False, used
+
+
+    def _get_last_messages_query(self, chat_id: int, before_id: int | None = None, limit: int = None):
+        # Keyset-пагинация по индексу (chat_id, id): читаем только хвост чата, без оконных функций
+        query = select(self._message_model).filter(self._message_model.chat_id == chat_id)
+        if before_id is not None:
+            query = query.filter(self._message_model.id < before_id)
+        limit = self._history_page_size if limit is None else limit
+        return query.order_by(desc(self._message_model.id)).limit(limit)
 
 
 class SqlMessageRepository(CRUDRepository[Message, MessageRead, MessageCreate, MessageUpdate], MessageRepositoryInterface):
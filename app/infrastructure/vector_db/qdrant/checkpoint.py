@@ -0,0 +1,53 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+
+class UpsertCheckpoint:
+    """
+    Номера пачек, уже записанных в Qdrant, для одной загрузки.
+
+    Хранится в JSON-файле, поэтому упавшая загрузка при повторе с тем же ключом
+    пропускает готовые пачки. Если размер пачки поменялся, номера пачек уже не совпадают
+    и чекпоинт сбрасывается.
+    """
+
+    def __init__(self, directory: str, key: str, batch_size: int):
+        self._path = Path(directory) / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.json"
+        self._batch_size = batch_size
+        self._lock = threading.Lock()
+        self.done = self._load()
+
+
+    def _load(self) -> set[int]:
+        try:
+            data = json.loads(self._path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return set()
+        if data.get("batch_size") != self._batch_size:
+            return set()
+        return set(data.get("done", []))
+
+
+    def is_done(self, batch_index: int) -> bool:
+        with self._lock:
+            return batch_index in self.done
+
+
+    def mark_done(self, batch_index: int) -> None:
+        with self._lock:
+            self.done.add(batch_index)
+            data = {"batch_size": self._batch_size, "done": sorted(self.done)}
+            # Пишем через временный файл, чтобы падение процесса не оставило битый JSON
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(data), encoding="utf-8")
+            os.replace(tmp_path, self._path)
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self.done.clear()
+            self._path.unlink(missing_ok=True)
@@ -1,13 +1,28 @@
-from typing import List, Any, Optional
+import asyncio
+import queue
+import random
+import threading
+import time
+from itertools import batched
+from typing import Callable, Iterable, List, Any, Optional
 
-from qdrant_client import QdrantClient, models
+from qdrant_client import AsyncQdrantClient, QdrantClient, models
+from loguru import logger
 from sentence_transformers import SentenceTransformer
 
+from app.core.config.utils import get_settings
+
 from app.domains.documents.schemas import ChunkBase
+from app.domains.vector_db.exceptions import CollectionSchemaMismatchException
 from app.domains.vector_db.vector_db_interface import VectorDBInterface
+from app.infrastructure.embeddings.cache import get_embedding_cache, get_query_embedding_cache
+from app.infrastructure.vector_db.qdrant.checkpoint import UpsertCheckpoint
 from app.infrastructure.vector_db.qdrant.utils import (get_qdrant_url, get_points_from_chunks,
                                                        get_chunks_from_scored_points, get_encoder,
-                                                       get_collection_name)
+                                                       get_collection_name, get_quantization_config,
+                                                       get_search_params, QuantizationMode, get_sparse_head,
+                                                       to_sparse_vector, DENSE_VECTOR_NAME, SPARSE_VECTOR_NAME)
+from app.infrastructure.embeddings.sparse import encode_hybrid
 
 
 class QdrantFilesRepository(VectorDBInterface):
@@ -18,26 +33,132 @@ class QdrantFilesRepository(VectorDBInterface):
             parallel_count: int = 4,
             max_retries: int = 3,
             encoder = None,
+            embedding_cache = None,
+            query_cache = None,
+            batch_size: int = None,
+            upload_queue_size: int = None,
+            retry_base_delay: float = None,
+            checkpoint_dir: str = None,
+            quantization: QuantizationMode = None,
+            vectors_on_disk: bool = None,
+            payload_on_disk: bool = None,
+            hybrid: bool = None,
+            sparse_head = None,
     ):
         self.collection_name = get_collection_name(collection_name)
         self.client = QdrantClient(url=get_qdrant_url(qdrant_url))
+        self.async_client = AsyncQdrantClient(url=get_qdrant_url(qdrant_url))
         self.encoder = get_encoder(encoder)
+        self.embedding_cache = get_embedding_cache(embedding_cache)
+        self.query_cache = get_query_embedding_cache(query_cache)
         self.parallel_count = parallel_count
         self.max_retries = max_retries
+        settings = get_settings()
+        self.batch_size = settings.INGESTION_BATCH_SIZE if batch_size is None else batch_size
+        self.upload_queue_size = settings.QDRANT_UPLOAD_QUEUE_SIZE if upload_queue_size is None else upload_queue_size
+        self.retry_base_delay = settings.QDRANT_RETRY_BASE_DELAY if retry_base_delay is None else retry_base_delay
+        self.checkpoint_dir = settings.QDRANT_CHECKPOINT_DIR if checkpoint_dir is None else checkpoint_dir
+        self.quantization = QuantizationMode(settings.QDRANT_QUANTIZATION if quantization is None else quantization)
+        self.vectors_on_disk = settings.QDRANT_VECTORS_ON_DISK if vectors_on_disk is None else vectors_on_disk
+        self.payload_on_disk = settings.QDRANT_PAYLOAD_ON_DISK if payload_on_disk is None else payload_on_disk
+        self.hybrid = settings.QDRANT_HYBRID if hybrid is None else hybrid
+        self.hybrid_prefetch_multiplier = settings.QDRANT_HYBRID_PREFETCH_MULTIPLIER
+        self.sparse_head = get_sparse_head(sparse_head, self.hybrid)
+        self.search_params = get_search_params(
+            self.quantization,
+            rescore=settings.QDRANT_QUANTIZATION_RESCORE,
+            oversampling=settings.QDRANT_QUANTIZATION_OVERSAMPLING,
+        )
 
 
     def init_storage(self) -> None:
-        self.client.create_collection(
-            collection_name=self.collection_name,
-            vectors_config=models.VectorParams(
+        # Идемпотентно: при старте создаём только то, чего ещё нет
+        settings = get_settings()
+        if not self.client.collection_exists(collection_name=self.collection_name):
+            dense_config = models.VectorParams(
                 size=self.encoder.get_sentence_embedding_dimension(),
                 distance=models.Distance.COSINE,
+                on_disk=self.vectors_on_disk,
+            )
+            sparse_config = None
+            if self.hybrid:
+                # В гибридном режиме у точки два именованных вектора: плотный и лексический
+                dense_config = {DENSE_VECTOR_NAME: dense_config}
+                sparse_config = {
+                    SPARSE_VECTOR_NAME: models.SparseVectorParams(
+                        index=models.SparseIndexParams(on_disk=self.vectors_on_disk),
+                    )
+                }
+            self.client.create_collection(
+                collection_name=self.collection_name,
+                vectors_config=dense_config,
+                sparse_vectors_config=sparse_config,
+                on_disk_payload=self.payload_on_disk,
+                # Сжатые векторы остаются в RAM, исходные можно держать на диске только для rescore
+                quantization_config=get_quantization_config(
+                    self.quantization,
+                    always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM,
+                ),
+                # Все поиски идут внутри одного пользователя, поэтому дополнительно строим
+                # графы по каждому user_id (payload_m). При m=0 останутся только они
+                hnsw_config=models.HnswConfigDiff(
+                    m=settings.QDRANT_HNSW_M,
+                    payload_m=settings.QDRANT_HNSW_PAYLOAD_M,
+                ),
+            )
+        else:
+            self._check_vectors_config()
+        self._create_payload_indexes()
+
+
+    def _check_vectors_config(self) -> None:
+        # Коллекцию не пересоздаём, но и молча работать с чужой схемой нельзя:
+        # все поиски упадут на using="dense" или, наоборот, без него
+        params = self.client.get_collection(collection_name=self.collection_name).config.params
+        is_named = isinstance(params.vectors, dict)
+        is_hybrid = is_named and DENSE_VECTOR_NAME in params.vectors and SPARSE_VECTOR_NAME in (params.sparse_vectors or {})
+        if self.hybrid and not is_hybrid:
+            raise CollectionSchemaMismatchException(
+                f"Collection '{self.collection_name}' has no named '{DENSE_VECTOR_NAME}'/'{SPARSE_VECTOR_NAME}' "
+                f"vectors required by QDRANT_HYBRID=true: use a new collection or reindex into one"
+            )
+        if not self.hybrid and is_named:
+            raise CollectionSchemaMismatchException(
+                f"Collection '{self.collection_name}' uses named vectors (hybrid layout), "
+                f"set QDRANT_HYBRID=true or use a collection with a single unnamed vector"
+            )
+
+
+    def _create_payload_indexes(self) -> None:
+        existing = self.client.get_collection(collection_name=self.collection_name).payload_schema or {}
+        indexes = {
+            # Только точное совпадение: фильтр по пользователю, диапазоны не нужны.
+            # is_tenant в Qdrant есть лишь у keyword/uuid индексов, для int группировку
+            # по пользователю дают графы payload_m
+            "user_id": models.IntegerIndexParams(
+                type=models.IntegerIndexType.INTEGER,
+                lookup=True,
+                range=False,
             ),
-        )
+            "file_id": models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD),
+        }
+        for field_name, field_schema in indexes.items():
+            if field_name in existing:
+                continue
+            self.client.create_payload_index(
+                collection_name=self.collection_name,
+                field_name=field_name,
+                field_schema=field_schema,
+                wait=True,
+            )
 
 
     def upload_points(self, chunks: list[ChunkBase]) -> None:
-        points = get_points_from_chunks(chunks, self.encoder)
+        points = get_points_from_chunks(chunks, self.encoder, self.embedding_cache, self.sparse_head)
+        self._upload(points)
+
+
+    def _upload(self, points: list[models.PointStruct]) -> None:
         self.client.upload_points(
             collection_name=self.collection_name,
             points=points,
@@ -46,19 +167,236 @@ class QdrantFilesRepository(VectorDBInterface):
         )
 
 
-    def upsert_batches(self, chunks: List[ChunkBase]) -> None:
-        # points = get_points_from_chunks(chunks, self.encoder)
-        # self.client.upsert(
-        #     collection_name=self.collection_name,
-        #     points=points,
-        # )
-        points = get_points_from_chunks(chunks, self.encoder)
-        self.client.upload_points(
-            collection_name=self.collection_name,
-            points=points,
-            parallel=self.parallel_count,
-            max_retries=self.max_retries,
+    def _upsert_with_retry(self, points: list[models.PointStruct]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.client.upsert(collection_name=self.collection_name, points=points, wait=True)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                # Экспоненциальная задержка с джиттером, чтобы воркеры не долбили Qdrant одновременно
+                delay = self.retry_base_delay * 2 ** attempt
+                delay += random.uniform(0, delay)
+                logger.warning(f"Upsert failed ({e}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+
+    def _upload_worker(
+            self,
+            batches: queue.Queue,
+            checkpoint: UpsertCheckpoint | None,
+            errors: list[Exception],
+    ) -> None:
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            if errors:
+                # После ошибки только вычитываем очередь, чтобы производитель не завис на put
+                continue
+            batch_index, points = item
+            try:
+                self._upsert_with_retry(points)
+                if checkpoint is not None:
+                    checkpoint.mark_done(batch_index)
+            except Exception as e:
+                errors.append(e)
+
+
+    def upsert_batches(
+            self,
+            chunks: Iterable[ChunkBase],
+            on_embedded: Optional[Callable[[], None]] = None,
+            checkpoint_key: Optional[str] = None,
+    ) -> None:
+        # Векторизация идёт в текущем потоке, запись — в отдельном: пока пачка N пишется,
+        # пачка N+1 уже кодируется. Ограниченная очередь не даёт векторизации убежать вперёд
+        checkpoint = None
+        if checkpoint_key is not None:
+            checkpoint = UpsertCheckpoint(self.checkpoint_dir, checkpoint_key, self.batch_size)
+
+        batches = queue.Queue(maxsize=self.upload_queue_size)
+        errors: list[Exception] = []
+        uploader = threading.Thread(
+            target=self._upload_worker,
+            args=(batches, checkpoint, errors),
+            name="qdrant-upsert",
+            daemon=True,
         )
+        uploader.start()
+
+        try:
+            for batch_index, batch in enumerate(batched(chunks, self.batch_size)):
+                if errors:
+                    break
+                if checkpoint is not None and checkpoint.is_done(batch_index):
+                    continue
+                points = get_points_from_chunks(list(batch), self.encoder, self.embedding_cache, self.sparse_head)
+                batches.put((batch_index, points))
+            if not errors and on_embedded is not None:
+                on_embedded()
+        finally:
+            batches.put(None)
+            uploader.join()
+
+        if errors:
+            raise errors[0]
+        if checkpoint is not None:
+            checkpoint.clear()
+
+
+    def _get_query_cache_namespace(self) -> str:
+        # В плотном режиме в кэше лежит вектор, в гибридном — пара (вектор, веса)
+        return f"{get_settings().EMBEDDING_MODEL}:{'hybrid' if self.hybrid else 'dense'}"
+
+
+    def _encode_query_text(self, query_text: str):
+        if self.hybrid:
+            dense, sparse = encode_hybrid(self.encoder, self.sparse_head, [query_text], show_progress_bar=False)
+            return dense[0].tolist(), sparse[0]
+        return self.encoder.encode(query_text).tolist()
+
+
+    def _encode_query_texts(self, query_texts: list[str]) -> list:
+        if len(query_texts) == 1:
+            return [self._encode_query_text(query_texts[0])]
+        # Все запросы уходят в модель одним вызовом
+        if self.hybrid:
+            dense, sparse = encode_hybrid(self.encoder, self.sparse_head, query_texts, show_progress_bar=False)
+            return [(vector.tolist(), weights) for vector, weights in zip(dense, sparse)]
+        return [vector.tolist() for vector in self.encoder.encode(query_texts)]
+
+
+    def _get_cached_queries(self, query_texts: list[str]) -> tuple[list, list[int]]:
+        if self.query_cache is None:
+            return [None] * len(query_texts), list(range(len(query_texts)))
+        namespace = self._get_query_cache_namespace()
+        vectors = [self.query_cache.get(text, namespace) for text in query_texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        return vectors, missing
+
+
+    def _remember_queries(self, query_texts: list[str], vectors: list, missing: list[int], encoded: list) -> list:
+        namespace = self._get_query_cache_namespace()
+        for i, vector in zip(missing, encoded):
+            vectors[i] = vector
+            if self.query_cache is not None:
+                self.query_cache.set(query_texts[i], vector, namespace)
+        return vectors
+
+
+    def _encode_queries(self, query_texts: list[str]) -> list:
+        vectors, missing = self._get_cached_queries(query_texts)
+        encoded = self._encode_query_texts([query_texts[i] for i in missing]) if missing else []
+        return self._remember_queries(query_texts, vectors, missing, encoded)
+
+
+    async def _aencode_queries(self, query_texts: list[str]) -> list:
+        vectors, missing = self._get_cached_queries(query_texts)
+        encoded = []
+        if missing:
+            # Векторизация упирается в CPU/GPU, поэтому уводим её из event loop
+            encoded = await asyncio.to_thread(self._encode_query_texts, [query_texts[i] for i in missing])
+        return self._remember_queries(query_texts, vectors, missing, encoded)
+
+
+    def _encode_query(self, query_text: str):
+        return self._encode_queries([query_text])[0]
+
+
+    async def _aencode_query(self, query_text: str):
+        return (await self._aencode_queries([query_text]))[0]
+
+
+    def _get_dense_vector(self, query_vector) -> List[float]:
+        # В гибридном режиме запрос кодируется парой (плотный вектор, лексические веса)
+        return query_vector[0] if self.hybrid else query_vector
+
+
+    def embed_query(self, query_text: str) -> List[float]:
+        return self._get_dense_vector(self._encode_query(query_text))
+
+
+    async def aembed_query(self, query_text: str) -> List[float]:
+        return self._get_dense_vector(await self._aencode_query(query_text))
+
+
+    @staticmethod
+    def _get_file_condition(file_id: str) -> models.FieldCondition:
+        return models.FieldCondition(
+            key="file_id",
+            match=models.MatchValue(value=file_id)
+        )
+
+
+    @staticmethod
+    def _get_search_filter(user_id: int, file_id: Optional[str] = None) -> models.Filter:
+        conditions = [
+            models.FieldCondition(
+                key="user_id",
+                match=models.MatchValue(value=user_id)
+            )
+        ]
+        if file_id is not None:
+            conditions.append(QdrantFilesRepository._get_file_condition(file_id))
+        return models.Filter(must=conditions)
+
+
+    def _get_query_kwargs(self, query_vector, query_filter: models.Filter, top_k: int) -> dict:
+        if not self.hybrid:
+            return dict(query=query_vector, query_filter=query_filter, search_params=self.search_params, limit=top_k)
+
+        # Гибридный поиск: кандидаты от плотного и лексического поиска сливаются на сервере через RRF
+        dense, sparse = query_vector
+        prefetch_limit = top_k * self.hybrid_prefetch_multiplier
+        return dict(
+            prefetch=[
+                models.Prefetch(
+                    query=dense,
+                    using=DENSE_VECTOR_NAME,
+                    filter=query_filter,
+                    params=self.search_params,
+                    limit=prefetch_limit,
+                ),
+                models.Prefetch(
+                    query=to_sparse_vector(sparse),
+                    using=SPARSE_VECTOR_NAME,
+                    filter=query_filter,
+                    limit=prefetch_limit,
+                ),
+            ],
+            query=models.FusionQuery(fusion=models.Fusion.RRF),
+            query_filter=query_filter,
+            limit=top_k,
+        )
+
+
+    def _get_query_request(self, query_vector, query_filter: models.Filter, top_k: int) -> models.QueryRequest:
+        kwargs = self._get_query_kwargs(query_vector, query_filter, top_k)
+        return models.QueryRequest(
+            query=kwargs["query"],
+            prefetch=kwargs.get("prefetch"),
+            filter=kwargs["query_filter"],
+            params=kwargs.get("search_params"),
+            limit=kwargs["limit"],
+            with_payload=True,
+        )
+
+
+    @staticmethod
+    def _split_batch_queries(queries: List[str]) -> list[str]:
+        # Пустые запросы в базу не отправляем, но место в ответе за ними сохраняем
+        return [query for query in queries if query and query.strip()]
+
+
+    @staticmethod
+    def _join_batch_results(queries: List[str], responses: list) -> List[List[ChunkBase]]:
+        responses = iter(responses)
+        return [
+            get_chunks_from_scored_points(next(responses).points) if query and query.strip() else []
+            for query in queries
+        ]
 
 
     def search(
@@ -70,26 +408,90 @@ class QdrantFilesRepository(VectorDBInterface):
     ) -> List[ChunkBase]:
         if not query_text or not query_text.strip():
             return []
-        query_filter = models.Filter(
-                must=[
-                    models.FieldCondition(
-                        key="user_id",
-                        match=models.MatchValue(value=user_id)
-                    )
-                ]
-            )
         found_points = self.client.query_points(
             collection_name=self.collection_name,
-            query = self.encoder.encode(query_text).tolist(),
-            query_filter=query_filter,
-            limit=top_k,
+            **self._get_query_kwargs(self._encode_query(query_text), self._get_search_filter(user_id, file_id), top_k),
         ).points
         return get_chunks_from_scored_points(found_points)
 
 
+    async def asearch(
+            self,
+            query_text: str,
+            user_id: int,
+            top_k: int = 5,
+            file_id: Optional[str] = None
+    ) -> List[ChunkBase]:
+        if not query_text or not query_text.strip():
+            return []
+        query_vector = await self._aencode_query(query_text)
+        response = await self.async_client.query_points(
+            collection_name=self.collection_name,
+            **self._get_query_kwargs(query_vector, self._get_search_filter(user_id, file_id), top_k),
+        )
+        return get_chunks_from_scored_points(response.points)
+
+
+    def search_batch(
+            self,
+            queries: List[str],
+            user_id: int,
+            top_k: int = 5,
+            file_id: Optional[str] = None
+    ) -> List[List[ChunkBase]]:
+        texts = self._split_batch_queries(queries)
+        if not texts:
+            return [[] for _ in queries]
+        query_filter = self._get_search_filter(user_id, file_id)
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[self._get_query_request(vector, query_filter, top_k) for vector in self._encode_queries(texts)],
+        )
+        return self._join_batch_results(queries, responses)
+
+
+    async def asearch_batch(
+            self,
+            queries: List[str],
+            user_id: int,
+            top_k: int = 5,
+            file_id: Optional[str] = None
+    ) -> List[List[ChunkBase]]:
+        texts = self._split_batch_queries(queries)
+        if not texts:
+            return [[] for _ in queries]
+        query_filter = self._get_search_filter(user_id, file_id)
+        vectors = await self._aencode_queries(texts)
+        responses = await self.async_client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[self._get_query_request(vector, query_filter, top_k) for vector in vectors],
+        )
+        return self._join_batch_results(queries, responses)
+
+
     def delete_by_file_id(self, file_id: str) -> None:
-        pass
+        # Одна операция на сервере: Qdrant сам находит точки по индексу file_id
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(
+                filter=models.Filter(must=[self._get_file_condition(file_id)])
+            ),
+            wait=True,
+        )
 
 
-    def get_all_files(self) -> List[str]:
-        pass
+    def get_all_files(self, user_id: Optional[int] = None, limit: int = 10000) -> List[str]:
+        # Facet считает уникальные значения по индексу file_id, не вычитывая сами точки
+        facet_filter = None
+        if user_id is not None:
+            facet_filter = models.Filter(
+                must=[models.FieldCondition(key="user_id", match=models.MatchValue(value=user_id))]
+            )
+        response = self.client.facet(
+            collection_name=self.collection_name,
+            key="file_id",
+            facet_filter=facet_filter,
+            limit=limit,
+            exact=True,
+        )
+        return [hit.value for hit in response.hits]
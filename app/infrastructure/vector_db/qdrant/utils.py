@@ -1,12 +1,22 @@
 import hashlib
 import os
 import uuid
+from enum import Enum
 
 from sentence_transformers import SentenceTransformer
+from qdrant_client import models
 from qdrant_client.models import PointStruct, ScoredPoint
 
 from app.core.config.utils import get_settings
 from app.domains.documents.schemas import ChunkBase
+from app.infrastructure.embeddings.cache import EmbeddingCache, encode_with_cache, encode_hybrid_with_cache
+from app.infrastructure.embeddings.registry import get_encoder_registry
+from app.infrastructure.embeddings.sparse import SparseHead, SparseWeights
+
+
+# Имена векторов в гибридной коллекции
+DENSE_VECTOR_NAME = "dense"
+SPARSE_VECTOR_NAME = "sparse"
 
 
 def get_qdrant_url(qdrant_url: str) -> str:
@@ -20,19 +30,42 @@ def generate_id(text: str):
     return str(uuid.uuid5(uuid.NAMESPACE_DNS, text))
 
 
-def get_points_from_chunks(chunks: list[ChunkBase], encoder: SentenceTransformer) -> list[PointStruct]:
+def get_point_id(chunk: ChunkBase) -> str:
+    # Один и тот же текст в разных файлах — разные точки, иначе удаление файла задело бы чужие чанки
+    return generate_id(f"{chunk.user_id}:{chunk.file_id}:{chunk.content}")
+
+
+def to_sparse_vector(weights: SparseWeights) -> models.SparseVector:
+    return models.SparseVector(indices=list(weights.keys()), values=list(weights.values()))
+
+
+def get_points_from_chunks(
+        chunks: list[ChunkBase],
+        encoder: SentenceTransformer,
+        cache: EmbeddingCache | None = None,
+        sparse_head: SparseHead | None = None,
+) -> list[PointStruct]:
     # 1. Собираем все тексты из чанков
     texts = [chunk.content for chunk in chunks]
 
     # 2. Векторизуем всё за один проход (SentenceTransformer сам эффективно разделит это на батчи)
-    # Параметр batch_size здесь контролирует нагрузку на GPU/CPU
-    embeddings = encoder.encode(texts, batch_size=32, show_progress_bar=True)
+    # Параметр batch_size здесь контролирует нагрузку на GPU/CPU, уже известные тексты берутся из кэша
+    if sparse_head is None:
+        embeddings = encode_with_cache(encoder, texts, cache, batch_size=32)
+        vectors = [embedding.tolist() for embedding in embeddings]
+    else:
+        # Гибридный режим: плотный вектор и лексические веса из одного прохода модели
+        embeddings, weights = encode_hybrid_with_cache(encoder, sparse_head, texts, cache, batch_size=32)
+        vectors = [
+            {DENSE_VECTOR_NAME: embedding.tolist(), SPARSE_VECTOR_NAME: to_sparse_vector(sparse)}
+            for embedding, sparse in zip(embeddings, weights)
+        ]
 
     # 3. Собираем список PointStruct, используя готовые векторы
     points = [
         PointStruct(
-            id=generate_id(chunk.content),
-            vector=embeddings[i].tolist(),
+            id=get_point_id(chunk),
+            vector=vectors[i],
             payload=chunk.model_dump(),
         )
         for i, chunk in enumerate(chunks)
@@ -48,18 +81,53 @@ def get_chunks_from_scored_points(scored_points: list[ScoredPoint]) -> list[Chun
 
 def get_encoder(encoder):
     if encoder is None:
-        # os.environ['TRANSFORMERS_OFFLINE'] = '1'
-        # os.environ['HF_HUB_OFFLINE'] = '1'
-        return SentenceTransformer(
-            "/home/daetoya/.cache/huggingface/hub/models--BAAI--bge-m3/snapshots/5617a9f61b028005a4858fdac845db406aefb181",
-            # local_files_only=True,
-            device='cuda'
-        )
+        # Модель грузится один раз на процесс и разделяется между запросами
+        return get_encoder_registry().get()
     return encoder
 
 
+def get_sparse_head(sparse_head, hybrid: bool):
+    if sparse_head is None and hybrid:
+        # Голова берётся для той же модели, что и encoder, модель повторно не грузится
+        return get_encoder_registry().get_sparse_head()
+    return sparse_head
+
+
 def get_collection_name(collection_name: str = None):
     if collection_name is None:
         settings = get_settings()
         return settings.B2_DEFAULT_COLLECTION_NAME
     return collection_name
+
+
+class QuantizationMode(str, Enum):
+    NONE = "none"
+    SCALAR = "scalar"
+    BINARY = "binary"
+
+
+def get_quantization_config(mode: QuantizationMode, always_ram: bool = True) -> models.QuantizationConfig | None:
+    # int8 сжимает векторы в 4 раза, binary — в 32 раза, но без rescore сильнее теряет в точности
+    if mode == QuantizationMode.SCALAR:
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=always_ram,
+            )
+        )
+    if mode == QuantizationMode.BINARY:
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(always_ram=always_ram)
+        )
+    return None
+
+
+def get_search_params(mode: QuantizationMode, rescore: bool = True, oversampling: float = 2.0) -> models.SearchParams | None:
+    if mode == QuantizationMode.NONE:
+        return None
+    # Кандидатов ищем по сжатым векторам с запасом, финальный порядок — по исходным
+    return models.SearchParams(
+        quantization=models.QuantizationSearchParams(rescore=rescore, oversampling=oversampling)
+    )
+
@@ -1,15 +1,22 @@
+from contextlib import asynccontextmanager
 from logging import getLogger
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from uvicorn import run
 
 from app.api.v1.documents import router as doc_router
 from app.api.v1.chat import router as chat_router
+from app.api.v1.health import router as health_router
 from app.core.config.default import DefaultSettings
 from app.core.config.utils import get_settings, get_hostname
+from app.application.services.ingestion import get_ingestion_job_manager
 
+from app.infrastructure.embeddings.registry import get_encoder_registry
+from app.infrastructure.embeddings.reranker import get_reranker
+from app.infrastructure.openai_llm.tokenizer import get_tokenizer
 from app.infrastructure.vector_db.qdrant.docs_repository import QdrantFilesRepository
-from app.infrastructure.persistence.postgres.connection.session import init_models_sync
+from app.infrastructure.persistence.postgres.connection.session import SessionManager, init_models_sync
 
 logger = getLogger(__name__)
 
@@ -20,10 +27,31 @@ def bind_routes(application: FastAPI, setting: DefaultSettings) -> None:
     """
     application.include_router(doc_router)
     application.include_router(chat_router)
+    application.include_router(health_router)
     # for route in list_of_routes:
     #     application.include_router(route, prefix=setting.PATH_PREFIX)
 
 
+@asynccontextmanager
+async def lifespan(application: FastAPI):
+    """
+    Warm up process-wide resources on startup and release them on shutdown.
+    """
+    settings = application.state.settings
+    # Таблицы и обновление схемы старых баз до первого запроса
+    await run_in_threadpool(init_models_sync)
+    # tiktoken скачивает кодировку при первом обращении: делаем это до первого запроса
+    await run_in_threadpool(get_tokenizer)
+    if settings.EMBEDDING_WARMUP:
+        await run_in_threadpool(get_encoder_registry().warm_up)
+        await run_in_threadpool(get_reranker)
+    if settings.QDRANT_INIT_ON_STARTUP:
+        await run_in_threadpool(QdrantFilesRepository().init_storage)
+    yield
+    get_ingestion_job_manager().shutdown(wait=False)
+    await SessionManager().dispose()
+
+
 def get_app() -> FastAPI:
     """
     Creates application and all dependable objects.
@@ -47,6 +75,7 @@ def get_app() -> FastAPI:
         openapi_url="/openapi",
         version="1.0.0",
         openapi_tags=tags_metadata,
+        lifespan=lifespan,
     )
 
     bind_routes(application, settings)
@@ -60,7 +89,6 @@ app = get_app()
 if __name__ == "__main__":
     # repo = QdrantFilesRepository()
     # repo.init_storage()
-    init_models_sync()
 
     settings_for_application = get_settings()
     run(
@@ -0,0 +1,79 @@
+"""
+Стоимость сборки промпта на один ход агента: до и после реестра промптов.
+
+"до" повторяет прежний путь: новый JsonOutputParser, ChatPromptTemplate.from_messages
+и get_format_instructions() на каждом ходе. "после" — шаблон и парсер из реестра,
+на ходе подставляются только история и контекст.
+
+Запуск:
+    python -m benchmarks.prompt_construction --turns 2000 --history 20
+"""
+import argparse
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+from app.infrastructure.langgraph_agent.prompt_registry import get_prompt_registry
+from app.infrastructure.langgraph_agent.prompts import MAIN_SYSTEM_PROMPT_TEXT, JSON_REMINDER_PROMPT_TEXT
+from app.infrastructure.langgraph_agent.schemas import LLMResponse
+
+
+def _build_without_registry(messages: list, extra_context: str):
+    parser = JsonOutputParser(pydantic_object=LLMResponse)
+    prompt = ChatPromptTemplate.from_messages([
+        ("system", MAIN_SYSTEM_PROMPT_TEXT),
+        MessagesPlaceholder(variable_name="chat_history"),
+        ("system", JSON_REMINDER_PROMPT_TEXT),
+    ])
+    final_prompt = prompt.partial(
+        format_instructions=parser.get_format_instructions(),
+        extra_context=extra_context,
+    )
+    return final_prompt.invoke({"chat_history": messages})
+
+
+def _build_with_registry(messages: list, extra_context: str):
+    registry = get_prompt_registry()
+    registry.get_parser(LLMResponse)
+    return registry.render(LLMResponse, messages=messages, extra_context=extra_context)
+
+
+def _measure(build, turns: int, messages: list, extra_context: str) -> float:
+    started = time.perf_counter()
+    for _ in range(turns):
+        build(messages, extra_context)
+    return (time.perf_counter() - started) / turns * 1e6
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--turns", type=int, default=2000)
+    arg_parser.add_argument("--history", type=int, default=20, help="Сообщений истории в промпте")
+    arg_parser.add_argument("--context-chars", type=int, default=6000, help="Длина найденного контекста")
+    args = arg_parser.parse_args()
+
+    messages = [
+        HumanMessage(f"Вопрос {i} про интегралы") if i % 2 == 0 else AIMessage(f"Ответ {i} про интегралы")
+        for i in range(args.history)
+    ]
+    extra_context = ("Определение интеграла. " * args.context_chars)[:args.context_chars]
+
+    # Прогрев: первая сборка в реестре строит шаблон, её в замер не включаем
+    _build_with_registry(messages, extra_context)
+    # Оба варианта должны давать один и тот же промпт
+    assert _build_without_registry(messages, extra_context) == _build_with_registry(messages, extra_context)
+
+    before = _measure(_build_without_registry, args.turns, messages, extra_context)
+    after = _measure(_build_with_registry, args.turns, messages, extra_context)
+
+    print(f"{args.turns} turns, history={args.history}, context={args.context_chars} chars")
+    print(f"{'variant':<20}{'us/turn':>12}")
+    print(f"{'without registry':<20}{before:>12.1f}")
+    print(f"{'with registry':<20}{after:>12.1f}")
+    print(f"speedup: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
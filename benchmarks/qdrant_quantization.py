@@ -0,0 +1,168 @@
+"""
+Сравнение режимов хранения коллекции документов: recall@k против памяти.
+
+Для каждого режима (без квантизации, int8, binary; опционально с векторами на диске)
+создаётся временная коллекция в локальном Qdrant теми же настройками, что и в init_storage,
+и поиск сравнивается с точным перебором в numpy.
+
+Запуск:
+    python -m benchmarks.qdrant_quantization --points 20000 --queries 200
+    python -m benchmarks.qdrant_quantization --pdf lecture1.pdf lecture2.pdf   # реальные чанки и bge-m3
+"""
+import argparse
+import io
+import time
+from pathlib import Path
+
+import numpy as np
+from qdrant_client import models
+
+from app.core.config.utils import get_settings
+from app.infrastructure.vector_db.qdrant.docs_repository import QdrantFilesRepository
+from app.infrastructure.vector_db.qdrant.utils import QuantizationMode
+
+
+class _FixedDimensionEncoder:
+    # init_storage спрашивает у модели только размерность
+    def __init__(self, dim: int):
+        self._dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dim
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _random_dataset(points: int, queries: int, dim: int, seed: int = 42) -> tuple[np.ndarray, np.ndarray]:
+    # Кластеры ближе к реальным эмбеддингам, чем равномерный шум
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, points // 200), dim))
+    labels = rng.integers(0, len(centers), size=points + queries)
+    vectors = centers[labels] + rng.normal(scale=0.6, size=(points + queries, dim))
+    vectors = _normalize(vectors.astype(np.float32))
+    return vectors[:points], vectors[points:]
+
+
+def _pdf_dataset(paths: list[str], queries: int, seed: int = 42) -> tuple[np.ndarray, np.ndarray]:
+    from app.domains.documents.service import DocumentServiceBase
+    from app.infrastructure.embeddings.registry import get_encoder_registry
+    from app.infrastructure.parsers.pdf_parser.pdf_parser import ParserPDF
+
+    parser = ParserPDF()
+    chunker = DocumentServiceBase()
+    texts = []
+    for path in paths:
+        pages = parser.iter_pages(io.BytesIO(Path(path).read_bytes()), Path(path).name)
+        texts.extend(chunk.content for chunk in chunker._iter_chunks_by_user_id(pages, user_id=0))
+
+    encoder = get_encoder_registry().get()
+    vectors = _normalize(np.asarray(encoder.encode(texts, batch_size=32, show_progress_bar=True), dtype=np.float32))
+    # Запросы — сами чанки: так у каждого запроса гарантированно есть близкие соседи
+    rng = np.random.default_rng(seed)
+    query_ids = rng.choice(len(vectors), size=min(queries, len(vectors)), replace=False)
+    return vectors, vectors[query_ids]
+
+
+def _estimate_ram_mb(points: int, dim: int, mode: QuantizationMode, vectors_on_disk: bool, m: int) -> float:
+    # Грубая оценка: исходные векторы (если не на диске) + сжатые + связи HNSW
+    original = 0 if vectors_on_disk else points * dim * 4
+    quantized = {QuantizationMode.NONE: 0, QuantizationMode.SCALAR: points * dim, QuantizationMode.BINARY: points * dim / 8}[mode]
+    graph = points * m * 2 * 4
+    return (original + quantized + graph) / 1024 / 1024
+
+
+def _wait_for_indexing(repo: QdrantFilesRepository, timeout: float = 600) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if repo.client.get_collection(repo.collection_name).status == models.CollectionStatus.GREEN:
+            return
+        time.sleep(1)
+    raise TimeoutError(f"Collection {repo.collection_name} is not indexed after {timeout}s")
+
+
+def _run_mode(
+        url: str,
+        mode: QuantizationMode,
+        vectors_on_disk: bool,
+        vectors: np.ndarray,
+        queries: np.ndarray,
+        ground_truth: np.ndarray,
+        top_k: int,
+) -> dict:
+    repo = QdrantFilesRepository(
+        collection_name=f"benchmark_{mode.value}{'_on_disk' if vectors_on_disk else ''}",
+        qdrant_url=url,
+        encoder=_FixedDimensionEncoder(vectors.shape[1]),
+        quantization=mode,
+        vectors_on_disk=vectors_on_disk,
+        hybrid=False,
+    )
+    repo.client.delete_collection(repo.collection_name)
+    repo.init_storage()
+    try:
+        repo.client.upload_collection(
+            collection_name=repo.collection_name,
+            vectors=vectors,
+            payload=({"user_id": 0} for _ in range(len(vectors))),
+            ids=range(len(vectors)),
+            parallel=repo.parallel_count,
+            wait=True,
+        )
+        _wait_for_indexing(repo)
+
+        hits = 0
+        started = time.perf_counter()
+        for query, expected in zip(queries, ground_truth):
+            found = repo.client.query_points(
+                collection_name=repo.collection_name,
+                query=query.tolist(),
+                search_params=repo.search_params,
+                limit=top_k,
+            ).points
+            hits += len({point.id for point in found} & set(expected.tolist()))
+        elapsed = time.perf_counter() - started
+    finally:
+        repo.client.delete_collection(repo.collection_name)
+
+    return {
+        "mode": mode.value + (" + on_disk" if vectors_on_disk else ""),
+        "recall": hits / (len(queries) * top_k),
+        "latency_ms": elapsed / len(queries) * 1000,
+        "ram_mb": _estimate_ram_mb(len(vectors), vectors.shape[1], mode, vectors_on_disk, get_settings().QDRANT_HNSW_M),
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--url", default=get_settings().qdrant_uri)
+    arg_parser.add_argument("--points", type=int, default=20000)
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--dim", type=int, default=1024)
+    arg_parser.add_argument("--top-k", type=int, default=10)
+    arg_parser.add_argument("--pdf", nargs="*", help="Взять чанки из PDF и векторизовать моделью из настроек")
+    arg_parser.add_argument("--on-disk", action="store_true", help="Дополнительно проверить векторы на диске")
+    args = arg_parser.parse_args()
+
+    if args.pdf:
+        vectors, queries = _pdf_dataset(args.pdf, args.queries)
+    else:
+        vectors, queries = _random_dataset(args.points, args.queries, args.dim)
+
+    # Точный top-k для косинусной близости нормированных векторов
+    ground_truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.top_k]
+
+    variants = [(mode, False) for mode in QuantizationMode]
+    if args.on_disk:
+        variants += [(mode, True) for mode in QuantizationMode if mode != QuantizationMode.NONE]
+
+    print(f"{len(vectors)} points, {len(queries)} queries, dim={vectors.shape[1]}, k={args.top_k}")
+    print(f"{'mode':<20}{'recall@k':>10}{'latency, ms':>14}{'est. RAM, MB':>15}")
+    for mode, on_disk in variants:
+        result = _run_mode(args.url, mode, on_disk, vectors, queries, ground_truth, args.top_k)
+        print(f"{result['mode']:<20}{result['recall']:>10.3f}{result['latency_ms']:>14.2f}{result['ram_mb']:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,34 @@
 import pytest
 from pathlib import Path
 import pymupdf
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 
+from app.domains.documents.schemas import ChunkBase
+from app.infrastructure.openai_llm.tokenizer import CharEstimateEncoding, count_tokens
 from app.infrastructure.vector_db.qdrant.docs_repository import QdrantFilesRepository
 
 
+@pytest.fixture(autouse=True)
+def fake_tokenizer():
+    """Кодировка tiktoken скачивается из сети, в тестах токены считаются по символам"""
+    encoding = CharEstimateEncoding()
+    count_tokens.cache_clear()
+    with patch("app.infrastructure.openai_llm.tokenizer.get_tokenizer", return_value=encoding), \
+            patch("app.infrastructure.langgraph_agent.context.get_tokenizer", return_value=encoding):
+        yield encoding
+    count_tokens.cache_clear()
+
+
+@pytest.fixture
+def make_chunk():
+    """Фабрика чанков одного файла для тестов поиска, переранжирования и сборки контекста"""
+
+    def _create(content: str, index: int = 0, page: int = 1) -> ChunkBase:
+        return ChunkBase(user_id=1, file_id="f1", source="a.pdf", page_num=page, chunk_index=index, content=content)
+
+    return _create
+
+
 @pytest.fixture
 def mock_settings():
     """Подменяет реальные настройки на тестовые значения"""
@@ -57,7 +80,10 @@ def mock_encoder():
 @pytest.fixture
 def repo(mock_encoder):
     # Патчим клиент в месте импорта в репозитории
-    with patch('app.infrastructure.vector_db.qdrant.docs_repository.QdrantClient') as mock_client_cls:
+    with patch('app.infrastructure.vector_db.qdrant.docs_repository.QdrantClient') as mock_client_cls, \
+            patch('app.infrastructure.vector_db.qdrant.docs_repository.AsyncQdrantClient'), \
+            patch('app.infrastructure.vector_db.qdrant.docs_repository.get_embedding_cache', return_value=None), \
+            patch('app.infrastructure.vector_db.qdrant.docs_repository.get_query_embedding_cache', return_value=None):
         from app.infrastructure.vector_db.qdrant.docs_repository import QdrantFilesRepository
 
         # Теперь при создании репозитория:
@@ -69,4 +95,5 @@ def repo(mock_encoder):
         )
         # Убеждаемся, что клиент внутри - это мок
         repository.client = MagicMock()
+        repository.async_client = AsyncMock()
         yield repository
\ No newline at end of file
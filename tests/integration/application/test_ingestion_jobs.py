@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from app.application.services.ingestion import IngestionJobManager
+from app.domains.documents.exceptions import IngestionQueueFullException
+from app.domains.documents.schemas import IngestionStage, IngestionStatus
+
+
+@pytest.fixture
+def manager():
+    job_manager = IngestionJobManager(max_workers=1, max_pending=2, history_size=10)
+    yield job_manager
+    job_manager.shutdown()
+
+
+def test_job_reports_stages_and_success(manager):
+    def task(on_stage):
+        on_stage(IngestionStage.PARSED)
+        on_stage(IngestionStage.INDEXED)
+        return True
+
+    job = manager.submit("lecture.pdf", task)
+    assert job.status == IngestionStatus.PENDING
+
+    manager.shutdown(wait=True)
+    result = manager.get(job.id)
+
+    assert result.status == IngestionStatus.SUCCESS
+    assert result.stage == IngestionStage.INDEXED
+    assert result.filename == "lecture.pdf"
+
+
+def test_failed_task_keeps_error(manager):
+    def task(on_stage):
+        on_stage(IngestionStage.PARSED)
+        raise RuntimeError("broken pdf")
+
+    job = manager.submit("broken.pdf", task)
+    manager.shutdown(wait=True)
+    result = manager.get(job.id)
+
+    assert result.status == IngestionStatus.FAILED
+    assert result.stage == IngestionStage.PARSED
+    assert result.error == "broken pdf"
+
+
+def test_queue_is_bounded(manager):
+    release = threading.Event()
+
+    def task(on_stage):
+        release.wait(timeout=5)
+        return True
+
+    manager.submit("a.pdf", task)
+    manager.submit("b.pdf", task)
+    with pytest.raises(IngestionQueueFullException):
+        manager.submit("c.pdf", task)
+    release.set()
+
+
+def test_unknown_job_returns_none(manager):
+    assert manager.get("missing") is None
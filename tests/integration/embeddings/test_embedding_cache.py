@@ -0,0 +1,114 @@
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+from unittest.mock import patch
+
+from app.infrastructure.embeddings.cache import (EmbeddingCache, QueryEmbeddingCache, encode_with_cache,
+                                                 encode_hybrid_with_cache)
+from app.infrastructure.embeddings.sparse import pack_sparse, unpack_sparse
+
+
+def make_encoder(dim: int = 4):
+    encoder = MagicMock()
+    encoder.encode.side_effect = lambda texts, **kwargs: np.ones((len(texts), dim), dtype=np.float32)
+    return encoder
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(path=str(tmp_path / "embeddings.sqlite3"), memory_size=2)
+
+
+def test_only_misses_are_encoded(cache):
+    encoder = make_encoder()
+
+    encode_with_cache(encoder, ["a", "b"], cache, model_name="bge-m3")
+    vectors = encode_with_cache(encoder, ["a", "b", "c"], cache, model_name="bge-m3")
+
+    assert len(vectors) == 3
+    assert encoder.encode.call_count == 2
+    assert encoder.encode.call_args[0][0] == ["c"]
+
+
+def test_duplicates_in_batch_encoded_once(cache):
+    encoder = make_encoder()
+
+    vectors = encode_with_cache(encoder, ["same", "same"], cache, model_name="bge-m3")
+
+    assert len(vectors) == 2
+    assert encoder.encode.call_args[0][0] == ["same"]
+
+
+def test_disk_tier_survives_memory_eviction(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    key = EmbeddingCache.make_key("bge-m3", "text")
+    EmbeddingCache(path=path).set_many({key: np.array([0.5, 0.25], dtype=np.float32)})
+
+    fresh_cache = EmbeddingCache(path=path)
+    found = fresh_cache.get_many([key])
+
+    np.testing.assert_allclose(found[key], [0.5, 0.25])
+
+
+def test_sparse_weights_roundtrip():
+    weights = {5: 0.25, 250001: 0.5}
+
+    assert unpack_sparse(pack_sparse(weights)) == weights
+
+
+def test_hybrid_encoding_cached_together(cache):
+    fake_encode = MagicMock(side_effect=lambda encoder, head, texts, **kwargs: (
+        [np.ones(4, dtype=np.float32) for _ in texts],
+        [{1: 0.5} for _ in texts],
+    ))
+
+    with patch("app.infrastructure.embeddings.cache.encode_hybrid", fake_encode):
+        encode_hybrid_with_cache(MagicMock(), MagicMock(), ["a"], cache, model_name="bge-m3")
+        dense, sparse = encode_hybrid_with_cache(MagicMock(), MagicMock(), ["a", "b"], cache, model_name="bge-m3")
+
+    assert fake_encode.call_count == 2
+    assert fake_encode.call_args[0][2] == ["b"]
+    assert len(dense) == 2
+    assert sparse == [{1: 0.5}, {1: 0.5}]
+
+
+def test_key_depends_on_model():
+    assert EmbeddingCache.make_key("bge-m3", "text") != EmbeddingCache.make_key("other", "text")
+
+
+def test_query_cache_normalizes_whitespace_only():
+    cache = QueryEmbeddingCache(max_size=10, ttl=60)
+    cache.set("Что такое  SVD?", [0.1, 0.2])
+
+    assert cache.get("  Что такое SVD? ") == [0.1, 0.2]
+    assert cache.get("что такое svd?") is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_query_cache_separates_namespaces():
+    cache = QueryEmbeddingCache(max_size=10, ttl=60)
+    cache.set("интеграл", [0.1], namespace="bge-m3:dense")
+
+    assert cache.get("интеграл", namespace="bge-m3:hybrid") is None
+    assert cache.get("интеграл", namespace="bge-m3:dense") == [0.1]
+
+
+def test_query_cache_expires_by_ttl():
+    cache = QueryEmbeddingCache(max_size=10, ttl=60)
+    with patch("app.infrastructure.embeddings.cache.time.monotonic", return_value=0):
+        cache.set("query", [0.1])
+    with patch("app.infrastructure.embeddings.cache.time.monotonic", return_value=61):
+        assert cache.get("query") is None
+    assert cache.misses == 1
+
+
+def test_query_cache_evicts_least_recently_used():
+    cache = QueryEmbeddingCache(max_size=2, ttl=60)
+    cache.set("a", [1.0])
+    cache.set("b", [2.0])
+    cache.get("a")
+    cache.set("c", [3.0])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
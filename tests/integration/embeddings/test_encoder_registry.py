@@ -0,0 +1,49 @@
+import pytest
+from unittest.mock import patch, MagicMock
+
+from app.infrastructure.embeddings.registry import EncoderRegistry
+
+
+@pytest.fixture
+def registry():
+    registry = EncoderRegistry()
+    registry.clear()
+    with patch("app.infrastructure.embeddings.registry.SentenceTransformer") as mock_cls:
+        mock_cls.side_effect = lambda *args, **kwargs: MagicMock()
+        yield registry, mock_cls
+    registry.clear()
+
+
+def test_registry_is_singleton():
+    assert EncoderRegistry() is EncoderRegistry()
+
+
+def test_model_loaded_once_per_process(registry):
+    """Повторные запросы не должны заново грузить модель с диска"""
+    reg, mock_cls = registry
+
+    first = reg.get("bge-m3", "cpu")
+    second = reg.get("bge-m3", "cpu")
+
+    assert first is second
+    mock_cls.assert_called_once_with("bge-m3", device="cpu")
+
+
+def test_different_devices_are_separate_entries(registry):
+    reg, mock_cls = registry
+
+    cpu_model = reg.get("bge-m3", "cpu")
+    gpu_model = reg.get("bge-m3", "cuda")
+
+    assert cpu_model is not gpu_model
+    assert mock_cls.call_count == 2
+
+
+def test_warm_up_loads_model(registry):
+    reg, mock_cls = registry
+
+    reg.warm_up(["bge-m3"], device="cpu")
+
+    assert reg.is_loaded("bge-m3", "cpu")
+    reg.get("bge-m3", "cpu")
+    mock_cls.assert_called_once()
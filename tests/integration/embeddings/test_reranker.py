@@ -0,0 +1,46 @@
+from unittest.mock import MagicMock
+
+from app.domains.vector_db.service import VectorDBService
+from app.infrastructure.embeddings.reranker import CrossEncoderReranker
+
+
+def make_model(scores: dict[str, float]):
+    model = MagicMock()
+    model.predict.side_effect = lambda pairs, **kwargs: [scores[text] for _, text in pairs]
+    return model
+
+
+def test_rerank_keeps_best_chunks(make_chunk):
+    model = make_model({"шум": 0.1, "определение интеграла": 0.9, "пример": 0.5})
+    reranker = CrossEncoderReranker(model=model, model_name="test", batch_size=8, cache_size=100)
+    chunks = [make_chunk("шум", 0), make_chunk("определение интеграла", 1), make_chunk("пример", 2)]
+
+    result = reranker.rerank("что такое интеграл", chunks, top_k=2)
+
+    assert [chunk.chunk_index for chunk in result] == [1, 2]
+    model.predict.assert_called_once()
+
+
+def test_rerank_scores_only_new_pairs(make_chunk):
+    """Уже оценённые пары берутся из кэша, в модель уходят только новые"""
+    model = make_model({"a": 0.1, "b": 0.2, "c": 0.3})
+    reranker = CrossEncoderReranker(model=model, model_name="test", batch_size=8, cache_size=100)
+
+    reranker.rerank("вопрос", [make_chunk("a", 0), make_chunk("b", 1)], top_k=2)
+    reranker.rerank("  Вопрос ", [make_chunk("a", 0), make_chunk("b", 1), make_chunk("c", 2)], top_k=2)
+
+    assert model.predict.call_count == 2
+    assert model.predict.call_args[0][0] == [("  Вопрос ", "c")]
+
+
+def test_service_over_fetches_before_rerank(make_chunk):
+    storage = MagicMock()
+    storage.search_batch.return_value = [[make_chunk(str(i), i) for i in range(20)]]
+    reranker = MagicMock()
+    reranker.rerank.side_effect = lambda query, chunks, top_k: chunks[::-1][:top_k]
+    service = VectorDBService(vector_storage=storage, reranker=reranker, rerank_candidates=20, rerank_top_k=3)
+
+    result = service.retrieve_sync(["вопрос"], user_id=1, top_k=10)
+
+    assert storage.search_batch.call_args.kwargs["top_k"] == 20
+    assert [chunk.chunk_index for chunk in result] == [19, 18, 17]
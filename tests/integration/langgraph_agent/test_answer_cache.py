@@ -0,0 +1,119 @@
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.domains.agent.models import AgentState
+from app.domains.chats.schemas import MessageRead, AuthorRole
+from app.domains.documents.schemas import ChunkBase
+from app.infrastructure.langgraph_agent.answer_cache import SemanticAnswerCache
+from app.infrastructure.langgraph_agent.nodes import check_answer_cache_node, save_answer_node, check_cached_answer
+
+
+CHUNK = ChunkBase(user_id=1, file_id="f1", source="a.pdf", page_num=1, chunk_index=0, content="Интеграл — это ...")
+
+
+@pytest.fixture
+def cache():
+    return SemanticAnswerCache(threshold=0.9, ttl=60, max_size=2)
+
+
+@pytest.fixture
+def use_cache(cache):
+    with patch("app.infrastructure.langgraph_agent.nodes.get_answer_cache", return_value=cache), \
+            patch("app.infrastructure.langgraph_agent.nodes.get_stream_writer", return_value=lambda event: None):
+        yield cache
+
+
+def make_message(chat_id: int, text: str, author: AuthorRole = AuthorRole.HUMAN) -> MessageRead:
+    now = datetime.now()
+    return MessageRead(id=1, chat_id=chat_id, text=text, author=author, created_at=now, updated_at=now)
+
+
+def make_state(question: str, chat_id: int = 1, previous: tuple[str, str] = None) -> AgentState:
+    history = []
+    if previous is not None:
+        history = [make_message(chat_id, previous[0]), make_message(chat_id, previous[1], AuthorRole.AI)]
+    return AgentState(user_id=1, history=history + [make_message(chat_id, question)])
+
+
+def make_config(vector: list[float]) -> dict:
+    vector_db_service = MagicMock()
+    vector_db_service.embed_query_sync.return_value = vector
+    return {"configurable": {"vector_db_service": vector_db_service}}
+
+
+def test_similar_question_hits_only_for_same_user(cache):
+    cache.store(1, [1.0, 0.0], "ответ", [CHUNK])
+
+    hit = cache.lookup(1, [0.99, 0.05])
+
+    assert hit.answer == "ответ"
+    assert hit.chunks == [CHUNK]
+    assert cache.lookup(1, [0.0, 1.0]) is None
+    assert cache.lookup(2, [1.0, 0.0]) is None
+
+
+def test_invalidate_and_ttl(cache):
+    cache.store(1, [1.0, 0.0], "ответ", [CHUNK])
+    cache.invalidate_user(1)
+    assert cache.lookup(1, [1.0, 0.0]) is None
+
+    cache.store(1, [1.0, 0.0], "ответ", [CHUNK])
+    with patch("app.infrastructure.langgraph_agent.answer_cache.time.monotonic", return_value=10 ** 9):
+        assert cache.lookup(1, [1.0, 0.0]) is None
+
+
+def test_cache_node_skips_llm_for_repeated_question(use_cache):
+    first = check_answer_cache_node(make_state("Что такое интеграл?"), make_config([1.0, 0.0]))
+    assert check_cached_answer(first) == "cache_miss"
+
+    first.answer = "Интеграл — это ..."
+    first.context_chunks = [CHUNK]
+    save_answer_node(first)
+
+    second = check_answer_cache_node(make_state("что такое интеграл"), make_config([0.98, 0.1]))
+    assert check_cached_answer(second) == "cache_hit"
+    assert second.answer == "Интеграл — это ..."
+    assert second.context_chunks == [CHUNK]
+
+
+def test_answers_without_sources_are_not_cached(use_cache):
+    state = check_answer_cache_node(make_state("Привет!"), make_config([1.0, 0.0]))
+    state.answer = "Здравствуйте"
+    save_answer_node(state)
+
+    assert use_cache.lookup(1, [1.0, 0.0]) is None
+
+
+def test_same_follow_up_in_other_chat_misses(use_cache):
+    first = check_answer_cache_node(
+        make_state("А подробнее?", chat_id=1, previous=("Что такое интеграл?", "Интеграл — это ...")),
+        make_config([1.0, 0.0]),
+    )
+    first.answer = "Подробно про интегралы"
+    first.context_chunks = [CHUNK]
+    save_answer_node(first)
+
+    other_chat = check_answer_cache_node(
+        make_state("А подробнее?", chat_id=2, previous=("Что такое ряд?", "Ряд — это ...")),
+        make_config([1.0, 0.0]),
+    )
+    same_chat = check_answer_cache_node(
+        make_state("А подробнее?", chat_id=1, previous=("Что такое интеграл?", "Интеграл — это ...")),
+        make_config([1.0, 0.0]),
+    )
+
+    assert check_cached_answer(other_chat) == "cache_miss"
+    assert check_cached_answer(same_chat) == "cache_hit"
+
+
+def test_deleted_file_drops_answers_built_on_it(cache):
+    other = CHUNK.model_copy(update={"file_id": "f2"})
+    cache.store(1, [1.0, 0.0], "по первому файлу", [CHUNK])
+    cache.store(1, [0.0, 1.0], "по второму файлу", [other])
+
+    cache.invalidate_file("f1")
+
+    assert cache.lookup(1, [1.0, 0.0]) is None
+    assert cache.lookup(1, [0.0, 1.0]).answer == "по второму файлу"
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from app.domains.chats.schemas import AuthorRole, MessageRead
+from app.infrastructure.langgraph_agent.context import ContextAssembler
+
+
+def make_assembler(budget: int = 200, history_share: float = 0.5) -> ContextAssembler:
+    return ContextAssembler(budget=budget, history_share=history_share, model_name="gpt-4o", chunk_overlap=20)
+
+
+def make_message(index: int, text: str) -> MessageRead:
+    now = datetime.now()
+    return MessageRead(id=index, chat_id=1, text=text, author=AuthorRole.HUMAN, created_at=now, updated_at=now)
+
+
+def test_history_keeps_newest_messages():
+    assembler = make_assembler()
+    history = [make_message(i, f"сообщение номер {i} " * 5) for i in range(20)]
+
+    fitted, used = assembler.fit_history(history, budget=60)
+
+    assert fitted[-1].id == 19
+    assert [message.id for message in fitted] == sorted(message.id for message in fitted)
+    assert used <= 60
+
+
+def test_long_question_is_truncated_not_dropped():
+    assembler = make_assembler()
+
+    fitted, used = assembler.fit_history([make_message(1, "очень длинный вопрос " * 100)], budget=20)
+
+    assert len(fitted) == 1
+    assert used <= 20
+
+
+def test_overlapping_neighbours_are_deduplicated(make_chunk):
+    assembler = make_assembler()
+    chunks = [make_chunk("начало текста общий хвост", 0), make_chunk("общий хвост и продолжение", 1)]
+
+    result = assembler.dedup_chunks(chunks)
+
+    assert result[1].content == "и продолжение"
+
+
+def test_overlap_is_stripped_from_lower_ranked_neighbour(make_chunk):
+    assembler = make_assembler()
+    chunks = [make_chunk("общий хвост и продолжение", 1), make_chunk("начало текста общий хвост", 0)]
+
+    result = assembler.dedup_chunks(chunks)
+
+    assert [chunk.content for chunk in result] == ["общий хвост и продолжение", "начало текста"]
+
+
+def test_coincidental_short_match_is_not_an_overlap(make_chunk):
+    assembler = make_assembler()
+    chunks = [make_chunk("Это первая система", 0), make_chunk("анализ данных", 1),
+              make_chunk("ends with 2", 2), make_chunk("2 is a number", 3)]
+
+    result = assembler.dedup_chunks(chunks)
+
+    assert [chunk.content for chunk in result] == [chunk.content for chunk in chunks]
+
+
+def test_chunks_fit_budget_deterministically(make_chunk):
+    assembler = make_assembler(budget=150)
+    chunks = [make_chunk(f"фрагмент {i} " * 30, i, page=i + 1) for i in range(5)]
+
+    first = assembler.assemble("system", [make_message(1, "вопрос")], chunks)
+    second = assembler.assemble("system", [make_message(1, "вопрос")], chunks)
+
+    assert first == second
+    assert 0 < len(first[1]) < len(chunks)
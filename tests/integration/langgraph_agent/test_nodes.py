@@ -0,0 +1,123 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core.metrics import get_metrics
+from app.domains.agent.models import AgentState, AgentEventType
+from app.domains.llm.exceptions import StructuredOutputException
+from app.domains.vector_db.service import VectorDBService
+from app.infrastructure.langgraph_agent.nodes import _stream_llm_answer, get_extra_context_node, ask_llm_node
+from app.infrastructure.langgraph_agent.schemas import LLMResponse
+
+
+def make_llm(tokens: list[str]):
+    llm = MagicMock()
+    llm.stream.return_value = iter(tokens)
+    return llm
+
+
+@pytest.fixture
+def events():
+    collected = []
+    with patch("app.infrastructure.langgraph_agent.nodes.get_stream_writer") as mock_writer:
+        mock_writer.return_value = collected.append
+        yield collected
+
+
+def test_stream_emits_answer_tokens(events):
+    """Наружу уходят только фрагменты поля answer, а не сырой JSON"""
+    llm = make_llm(['{"is_need_more_context": false, ', '"find_context": "", ', '"answer": "Инте', 'грал"}'])
+
+    text = _stream_llm_answer(llm, prompt=MagicMock(), state=AgentState(user_id=1))
+
+    assert text.endswith('грал"}')
+    assert all(event.type == AgentEventType.TOKEN for event in events)
+    assert "".join(event.data for event in events) == "Интеграл"
+
+
+def test_stream_suppresses_answer_when_context_needed(events):
+    """Если модель просит доп. контекст, промежуточный ответ не стримится"""
+    llm = make_llm(['{"is_need_more_context": true, "find_context": "интеграл", ', '"answer": "Сейчас поищу"}'])
+
+    _stream_llm_answer(llm, prompt=MagicMock(), state=AgentState(user_id=1))
+
+    assert events == []
+
+
+def test_stream_handles_markdown_fence(events):
+    llm = make_llm(['```json\n{"is_need_more_context": false, "answer": "Да"', '}\n```'])
+
+    _stream_llm_answer(llm, prompt=MagicMock(), state=AgentState(user_id=1))
+
+    assert "".join(event.data for event in events) == "Да"
+
+
+def test_extra_context_searches_all_queries_at_once(events, make_chunk):
+    """Все формулировки уходят одним батчем, повторы чанков между запросами схлопываются"""
+    vector_db_service = VectorDBService(vector_storage=MagicMock())
+    vector_db_service.vector_storage.search_batch.return_value = [
+        [make_chunk("chunk 0", 0), make_chunk("chunk 1", 1)],
+        [make_chunk("chunk 1", 1), make_chunk("chunk 2", 2)],
+    ]
+    state = AgentState(user_id=1, top_k=3, find_context="интеграл", find_contexts=["интеграл", " первообразная "])
+
+    result = get_extra_context_node(state, {"configurable": {"vector_db_service": vector_db_service}})
+
+    vector_db_service.vector_storage.search_batch.assert_called_once()
+    assert vector_db_service.vector_storage.search_batch.call_args.args[0] == ["интеграл", "первообразная"]
+    assert [f"chunk {i}" in result.extra_context for i in range(3)] == [True, True, True]
+    assert result.find_count == 1
+
+
+
+@pytest.fixture
+def no_stream_config():
+    llm = MagicMock()
+    return llm, {"configurable": {"llm": llm}}
+
+
+def test_structured_output_is_used_without_text_parsing(no_stream_config):
+    llm, config = no_stream_config
+    llm.invoke_structured.return_value = LLMResponse(is_need_more_context=True, find_context="интеграл")
+
+    result = ask_llm_node(AgentState(user_id=1), config)
+
+    llm.invoke.assert_not_called()
+    assert result["is_need_more_context"]
+    assert result["find_context"] == "интеграл"
+
+
+def test_invalid_structured_output_is_repaired_without_retry(no_stream_config):
+    llm, config = no_stream_config
+    llm.invoke_structured.side_effect = StructuredOutputException('{"is_need_more_context": false, "answer": "Инте')
+    get_metrics().reset()
+
+    result = ask_llm_node(AgentState(user_id=1), config)
+
+    assert llm.invoke_structured.call_count == 1
+    assert result["answer"] == "Инте"
+    assert get_metrics().get_counter("llm.structured_output.parse_failures") == 1
+    assert get_metrics().get_counter("llm.structured_output.repaired") == 1
+
+
+def test_prose_answer_falls_back_to_plain_text(no_stream_config):
+    llm, config = no_stream_config
+    llm.invoke_structured.side_effect = StructuredOutputException("Интеграл — это площадь под графиком.")
+
+    result = ask_llm_node(AgentState(user_id=1), config)
+
+    assert result["answer"] == "Интеграл — это площадь под графиком."
+    assert not result["is_need_more_context"]
+
+
+def test_json_with_invalid_fields_is_not_shown_as_answer(no_stream_config):
+    llm, config = no_stream_config
+    llm.invoke_structured.side_effect = StructuredOutputException(
+        '{"is_need_more_context": "maybe", "find_contexts": "не список", "answer": "Интеграл — это площадь."}'
+    )
+
+    result = ask_llm_node(AgentState(user_id=1), config)
+
+    assert result["answer"] == "Интеграл — это площадь."
+    assert not result["is_need_more_context"]
+    assert result["find_contexts"] == []
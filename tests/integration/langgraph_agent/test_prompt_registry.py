@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.domains.chats.schemas import MessageRead, AuthorRole
+from app.infrastructure.langgraph_agent.prompt_registry import PromptRegistry
+from app.infrastructure.langgraph_agent.schemas import LLMResponse
+from app.infrastructure.langgraph_agent.utils import convert_to_langchain_messages
+
+
+def test_template_and_parser_are_built_once():
+    registry = PromptRegistry()
+
+    assert registry.get_template(LLMResponse) is registry.get_template(LLMResponse)
+    assert registry.get_parser(LLMResponse) is registry.get_parser(LLMResponse)
+
+
+def test_render_fills_format_instructions_and_context():
+    registry = PromptRegistry()
+
+    prompt = registry.render(LLMResponse, messages=[HumanMessage("Что такое интеграл?")], extra_context="ФРАГМЕНТ 1")
+    messages = prompt.to_messages()
+
+    assert "{format_instructions}" not in messages[0].content
+    assert "is_need_more_context" in messages[0].content
+    assert "ФРАГМЕНТ 1" in messages[0].content
+    assert messages[1] == HumanMessage("Что такое интеграл?")
+
+
+def test_history_keeps_message_roles():
+    now = datetime.now()
+    history = [
+        MessageRead(id=1, chat_id=1, text="Вопрос", author=AuthorRole.HUMAN, created_at=now, updated_at=now),
+        MessageRead(id=2, chat_id=1, text="Ответ", author=AuthorRole.AI, created_at=now, updated_at=now),
+    ]
+
+    assert convert_to_langchain_messages(history) == [HumanMessage("Вопрос"), AIMessage("Ответ")]
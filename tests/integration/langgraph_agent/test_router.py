@@ -0,0 +1,130 @@
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.core.config.utils import get_settings
+from app.domains.agent.models import AgentState, QuestionRoute
+from app.domains.chats.schemas import MessageRead, AuthorRole
+from app.infrastructure.langgraph_agent.nodes import (route_question_node, check_route, speculative_search_node,
+                                                      get_extra_context_node)
+from app.infrastructure.langgraph_agent.router import QuestionRouter
+
+
+VECTORS = {
+    "Привет": [1.0, 0.0, 0.0],
+    "Спасибо": [0.0, 1.0, 0.0],
+    "привет!": [0.95, 0.1, 0.0],
+    "Сформулируй теорему Лагранжа": [0.1, 0.0, 1.0],
+    # Близость к "Привет" 0.75: между порогом и порогом минус запас
+    "Привет, а что такое ряд?": [0.75, 0.0, 0.66],
+    "что такое ряд": [0.73, 0.0, 0.68],
+    "формула Тейлора": [0.0, 0.0, 1.0],
+}
+
+
+@pytest.fixture
+def router():
+    router = QuestionRouter(threshold=0.8, unsure_margin=0.1, prototypes=("Привет", "Спасибо"))
+    with patch("app.infrastructure.langgraph_agent.nodes.get_question_router", return_value=router):
+        yield router
+
+
+def make_config() -> dict:
+    vector_db_service = MagicMock()
+    vector_db_service.embed_query_sync.side_effect = VECTORS.__getitem__
+    return {"configurable": {"vector_db_service": vector_db_service}}
+
+
+def make_state(question: str) -> AgentState:
+    now = datetime.now()
+    message = MessageRead(id=1, chat_id=1, text=question, author=AuthorRole.HUMAN, created_at=now, updated_at=now)
+    return AgentState(user_id=1, history=[message])
+
+
+def test_study_question_goes_to_search_before_llm(router):
+    state = route_question_node(make_state("Сформулируй теорему Лагранжа"), make_config())
+
+    assert check_route(state) == "search"
+    assert state.find_context == "Сформулируй теорему Лагранжа"
+
+
+def test_small_talk_goes_straight_to_llm(router):
+    config = make_config()
+    state = route_question_node(make_state("привет!"), config)
+
+    assert check_route(state) == "answer"
+    assert state.find_context == ""
+    # Эмбеддинги эталонных реплик считаются один раз
+    route_question_node(make_state("привет!"), config)
+    assert config["configurable"]["vector_db_service"].embed_query_sync.call_count == 4
+
+
+@pytest.fixture
+def speculative_search():
+    with patch.object(get_settings(), "SPECULATIVE_SEARCH_ENABLED", True), \
+            patch("app.infrastructure.langgraph_agent.nodes.get_stream_writer", return_value=lambda event: None):
+        yield
+
+
+def test_unsure_question_runs_llm_and_search_in_parallel(router, speculative_search):
+    state = route_question_node(make_state("Привет, а что такое ряд?"), make_config())
+
+    assert state.route == QuestionRoute.SPECULATE
+    assert check_route(state) == ["answer", "speculate"]
+
+
+def test_unsure_question_goes_to_llm_when_speculation_disabled(router):
+    state = route_question_node(make_state("Привет, а что такое ряд?"), make_config())
+
+    assert check_route(state) == "answer"
+
+
+def _speculated_state(config: dict, make_chunk) -> AgentState:
+    state = route_question_node(make_state("Привет, а что такое ряд?"), config)
+    config["configurable"]["vector_db_service"].retrieve_sync.return_value = [make_chunk("найдено по вопросу")]
+    update = speculative_search_node(state, config)
+    config["configurable"]["vector_db_service"].retrieve_sync.reset_mock()
+    config["configurable"]["vector_db_service"].retrieve_sync.return_value = [make_chunk("найдено по запросу llm")]
+    return state.model_copy(update=update)
+
+
+def test_close_llm_query_reuses_speculative_chunks(router, speculative_search, make_chunk):
+    config = make_config()
+    state = _speculated_state(config, make_chunk)
+    state.find_context = "что такое ряд"
+
+    state = get_extra_context_node(state, config)
+
+    assert [chunk.content for chunk in state.context_chunks] == ["найдено по вопросу"]
+    config["configurable"]["vector_db_service"].retrieve_sync.assert_not_called()
+
+
+def test_different_llm_query_discards_speculative_chunks(router, speculative_search, make_chunk):
+    config = make_config()
+    state = _speculated_state(config, make_chunk)
+    state.find_context = "формула Тейлора"
+
+    state = get_extra_context_node(state, config)
+
+    assert [chunk.content for chunk in state.context_chunks] == ["найдено по запросу llm"]
+    config["configurable"]["vector_db_service"].retrieve_sync.assert_called_once()
+
+
+def test_route_without_prototypes_raises_clear_error():
+    router = QuestionRouter(threshold=0.8, unsure_margin=0.1, prototypes=("Привет",))
+
+    with pytest.raises(RuntimeError, match="prepare"):
+        router.route([1.0, 0.0, 0.0])
+
+
+@pytest.mark.asyncio
+async def test_aprepare_embeds_prototypes_once():
+    router = QuestionRouter(threshold=0.8, unsure_margin=0.1, prototypes=("Привет", "Спасибо"))
+    embed = AsyncMock(side_effect=VECTORS.__getitem__)
+
+    await router.aprepare(embed)
+    await router.aprepare(embed)
+
+    assert embed.await_count == 2
+    assert router.route(VECTORS["привет!"]) == QuestionRoute.ANSWER
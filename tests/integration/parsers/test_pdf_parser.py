@@ -1,6 +1,8 @@
 import pytest
 import io
 import fitz  # PyMuPDF
+from unittest.mock import patch
+from app.domains.documents.exceptions import DocumentParseException
 from app.domains.documents.schemas import PDFBase
 from app.infrastructure.parsers.pdf_parser.pdf_parser import ParserPDF
 
@@ -86,4 +88,36 @@ class TestParserPDF:
 
         assert len(result.pages) == 2
         assert result.pages[0].metadata.page == 1
-        assert result.pages[1].metadata.page == 2
\ No newline at end of file
+        assert result.pages[1].metadata.page == 2
+
+    def test_parallel_parsing_keeps_page_order(self, create_pdf_bytes):
+        """Параллельный режим должен давать тот же результат, что и последовательный."""
+        content = [f"Page {i} text" for i in range(1, 8)] + ["   "]
+        sequential = ParserPDF(workers=1).get_pdf(create_pdf_bytes(content))
+        parallel = ParserPDF(workers=2, parallel_threshold=1).get_pdf(create_pdf_bytes(content))
+
+        assert parallel == sequential
+        assert [page.metadata.page for page in parallel.pages] == list(range(1, 8))
+
+    def test_iter_pages_matches_get_pdf(self, create_pdf_bytes):
+        """Потоковый разбор отдаёт те же страницы, что и get_pdf."""
+        content = ["First", "   ", "Third"]
+        parser = ParserPDF(workers=1)
+
+        pages = parser.iter_pages(create_pdf_bytes(content), "doc.pdf")
+
+        assert list(pages) == parser.get_pdf(create_pdf_bytes(content), "doc.pdf").pages
+
+    def test_iter_pages_raises_on_broken_pdf(self):
+        """Битый файл роняет загрузку, а не выглядит как пустой документ."""
+        with pytest.raises(DocumentParseException):
+            list(ParserPDF(workers=1).iter_pages(io.BytesIO(b"not a pdf content"), "doc.pdf"))
+
+    def test_small_document_stays_single_process(self, create_pdf_bytes):
+        parser = ParserPDF(workers=4, parallel_threshold=10)
+
+        with patch("app.infrastructure.parsers.pdf_parser.pdf_parser.ProcessPoolExecutor") as mock_pool:
+            result = parser.get_pdf(create_pdf_bytes(["Only page"]))
+
+        mock_pool.assert_not_called()
+        assert len(result.pages) == 1
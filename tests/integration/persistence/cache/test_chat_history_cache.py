@@ -0,0 +1,105 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.domains.chats.schemas import MessageRead, MessageInput, AuthorRole
+from app.domains.chats.service import ChatService
+from app.domains.documents.schemas import ChunkBase
+from app.infrastructure.persistence.cache.chat_history import InMemoryChatHistoryCache
+
+
+def _message(message_id: int, text: str, chat_id: int = 1) -> MessageRead:
+    return MessageRead(
+        id=message_id,
+        chat_id=chat_id,
+        text=text,
+        author=AuthorRole.HUMAN,
+        token_count=len(text.split()),
+        created_at=datetime.now(),
+        updated_at=datetime.now(),
+    )
+
+
+@pytest.fixture
+def cache():
+    return InMemoryChatHistoryCache(window_size=3, max_chats=2)
+
+
+@pytest.fixture
+def chat_repo():
+    repo = MagicMock()
+    repo.get_recent_messages_sync.return_value = [_message(1, "first question"), _message(2, "first answer")]
+    repo.add_message_sync.side_effect = lambda message: _message(3, message.text, message.chat_id)
+    return repo
+
+
+def test_ring_buffer_drops_oldest_and_loses_completeness(cache):
+    cache.set(1, [_message(1, "a"), _message(2, "b")], complete=True)
+    cache.append(1, [_message(3, "c")])
+    assert cache.get(1).complete
+
+    cache.append(1, [_message(4, "d")])
+    window = cache.get(1)
+
+    assert [message.id for message in window.messages] == [2, 3, 4]
+    assert not window.complete
+
+
+def test_append_ignores_uncached_chat_and_lru_evicts(cache):
+    cache.append(1, [_message(1, "a")])
+    assert cache.get(1) is None
+
+    cache.set(1, [], complete=True)
+    cache.set(2, [], complete=True)
+    cache.get(1)
+    cache.set(3, [], complete=True)
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+
+
+def test_service_reads_history_from_cache_after_first_turn(cache, chat_repo):
+    service = ChatService(chat_repo=chat_repo, chat_id=1, history_cache=cache)
+
+    first = service.get_last_messages_sync(context_length=100)
+    service.add_message_sync(MessageInput(text="second question", author=AuthorRole.HUMAN))
+    second = service.get_last_messages_sync(context_length=100)
+
+    assert [message.id for message in first] == [1, 2]
+    assert [message.id for message in second] == [1, 2, 3]
+    chat_repo.get_recent_messages_sync.assert_called_once_with(1, 3)
+    chat_repo.get_last_messages_sync.assert_not_called()
+
+
+def test_service_falls_back_to_repository_when_window_is_too_short(cache, chat_repo):
+    cache.set(1, [_message(5, "x"), _message(6, "y"), _message(7, "z")], complete=False)
+    service = ChatService(chat_repo=chat_repo, chat_id=1, history_cache=cache)
+    chat_repo.get_last_messages_sync.return_value = []
+
+    service.get_last_messages_sync(context_length=100)
+    chat_repo.get_last_messages_sync.assert_called_once_with(1, 100)
+
+    service.invalidate_history()
+    assert cache.get(1) is None
+
+
+def test_turn_is_visible_before_save_and_saved_in_one_call(cache, chat_repo):
+    chat_repo.add_messages_sync.side_effect = lambda messages: [
+        _message(3 + i, message.text, message.chat_id) for i, message in enumerate(messages)
+    ]
+    service = ChatService(chat_repo=chat_repo, chat_id=1, history_cache=cache)
+
+    service.start_turn(MessageInput(text="second question", author=AuthorRole.HUMAN))
+    history = service.get_last_messages_sync(context_length=100)
+    service.add_turn_sources([
+        ChunkBase(user_id=1, file_id="f1", source="lecture.pdf", page_num=1, chunk_index=0, content="text"),
+    ])
+    service.save_turn_sync("second answer")
+
+    assert history[-1].text == "second question"
+    saved_turn = chat_repo.add_messages_sync.call_args.args[0]
+    assert [message.author for message in saved_turn] == [AuthorRole.HUMAN, AuthorRole.AI]
+    assert saved_turn[1].sources[0].source == "lecture.pdf"
+    chat_repo.add_message_sync.assert_not_called()
+    assert [message.text for message in cache.get(1).messages][-2:] == ["second question", "second answer"]
@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.infrastructure.persistence.postgres import Base
+from app.infrastructure.persistence.postgres.modules.users.models import User
+from app.infrastructure.persistence.postgres.modules.documents.models import Document  # noqa: F401
+from app.infrastructure.persistence.postgres.modules.chats.models import Chat
+from app.infrastructure.persistence.postgres.modules.chats.repository import SqlChatRepository
+from app.domains.chats.schemas import MessageCreate, MessageSource, AuthorRole
+
+
+def _count_words(text: str, model_name: str = None) -> int:
+    return len(text.split())
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite:///:memory:")
+    Base.metadata.create_all(engine)
+    SessionLoom = sessionmaker(engine, expire_on_commit=False)
+    with SessionLoom() as session:
+        session.add(User(id=1, username="student"))
+        session.add(Chat(id=1, user_id=1))
+        session.add(Chat(id=2, user_id=1))
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+@pytest.fixture
+def repo(session):
+    # tiktoken заменяем подсчётом слов: тест не должен скачивать кодировку
+    with patch("app.infrastructure.persistence.postgres.modules.chats.repository.count_tokens", _count_words):
+        repository = SqlChatRepository(session)
+        repository._history_page_size = 2
+        yield repository
+
+
+def _add(repo, chat_id: int, text: str):
+    return repo.add_message_sync(MessageCreate(chat_id=chat_id, text=text, author=AuthorRole.HUMAN))
+
+
+def test_add_message_stores_length_and_tokens(repo):
+    message = _add(repo, 1, "three short words")
+
+    assert message.length == len("three short words")
+    assert message.token_count == 3
+
+
+def test_get_last_messages_reads_pages_until_budget(repo):
+    for text in ["old message one", "second", "third one", "fourth", "newest question here"]:
+        _add(repo, 1, text)
+    _add(repo, 2, "other chat")
+
+    # 3 + 1 + 2 = 6 токенов с конца, четвёртое сообщение уже не влезает
+    result = repo.get_last_messages_sync(1, context_length=6)
+
+    assert [message.text for message in result] == ["third one", "fourth", "newest question here"]
+
+
+def test_get_last_messages_keeps_newest_message_over_budget(repo):
+    _add(repo, 1, "earlier")
+    _add(repo, 1, "a very long latest question")
+
+    result = repo.get_last_messages_sync(1, context_length=2)
+
+    assert [message.text for message in result] == ["a very long latest question"]
+
+
+def test_add_messages_saves_turn_in_one_commit(repo, session):
+    sources = [MessageSource(file_id="f1", source="lecture.pdf", page_num=2, chunk_index=0)]
+    messages = [
+        MessageCreate(chat_id=1, text="what is an integral", author=AuthorRole.HUMAN),
+        MessageCreate(chat_id=1, text="an antiderivative", author=AuthorRole.AI, sources=sources),
+    ]
+
+    with patch.object(session, "commit", wraps=session.commit) as commit:
+        saved = repo.add_messages_sync(messages)
+
+    assert commit.call_count == 1
+    assert [message.author for message in saved] == [AuthorRole.HUMAN, AuthorRole.AI]
+    assert saved[0].id < saved[1].id
+    history = repo.get_last_messages_sync(1, context_length=100)
+    assert history[-1].sources == sources
@@ -0,0 +1,26 @@
+from sqlalchemy import create_engine, inspect, text
+
+from app.infrastructure.persistence.postgres.connection.upgrade import upgrade_schema
+
+
+def test_old_messages_table_gets_new_columns_and_index():
+    engine = create_engine("sqlite:///:memory:")
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE messages (id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL, text VARCHAR, author VARCHAR)"
+        ))
+        conn.execute(text("INSERT INTO messages (chat_id, text, author) VALUES (1, 'старое сообщение', 'HUMAN')"))
+
+    with engine.begin() as conn:
+        upgrade_schema(conn)
+    with engine.begin() as conn:
+        # Повторный запуск ничего не добавляет
+        second_run = upgrade_schema(conn)
+        row = conn.execute(text("SELECT length, token_count, sources FROM messages")).one()
+
+    inspector = inspect(engine)
+    assert {"length", "token_count", "sources"} <= {column["name"] for column in inspector.get_columns("messages")}
+    assert "ix__messages__chat_id_id" in {index["name"] for index in inspector.get_indexes("messages")}
+    assert not [statement for statement in second_run if statement.startswith("ALTER")]
+    assert tuple(row) == (0, 0, None)
+    engine.dispose()
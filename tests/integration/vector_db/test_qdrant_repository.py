@@ -99,6 +99,8 @@ def test_search_calls_proper_methods(mock_get_chunks, repo):
 
 def test_init_storage_creates_collection(repo):
     """Проверяем, что инициализация создает коллекцию с верными параметрами"""
+    repo.client.collection_exists.return_value = False
+    repo.client.get_collection.return_value.payload_schema = {}
     repo.init_storage()
 
     repo.client.create_collection.assert_called_once()
@@ -107,6 +109,58 @@ def test_init_storage_creates_collection(repo):
     assert kwargs['vectors_config'].size == 1024
     assert kwargs['vectors_config'].distance == models.Distance.COSINE
 
+    indexed = {call.kwargs['field_name']: call.kwargs['field_schema']
+               for call in repo.client.create_payload_index.call_args_list}
+    assert set(indexed) == {"user_id", "file_id"}
+    assert indexed["user_id"].lookup is True
+    assert indexed["user_id"].range is False
+
+
+def test_init_storage_applies_quantization(repo):
+    from app.infrastructure.vector_db.qdrant.utils import QuantizationMode, get_search_params
+
+    repo.client.collection_exists.return_value = False
+    repo.client.get_collection.return_value.payload_schema = {}
+    repo.quantization = QuantizationMode.SCALAR
+    repo.vectors_on_disk = True
+
+    repo.init_storage()
+
+    _, kwargs = repo.client.create_collection.call_args
+    assert kwargs['vectors_config'].on_disk is True
+    assert kwargs['quantization_config'].scalar.type == models.ScalarType.INT8
+    assert get_search_params(QuantizationMode.SCALAR).quantization.rescore is True
+    assert get_search_params(QuantizationMode.NONE) is None
+
+
+def test_init_storage_is_idempotent(repo):
+    """Повторная инициализация не пересоздает коллекцию и существующие индексы"""
+    repo.client.collection_exists.return_value = True
+    repo.client.get_collection.return_value.payload_schema = {"user_id": MagicMock(), "file_id": MagicMock()}
+    repo.client.get_collection.return_value.config.params.vectors = models.VectorParams(
+        size=1024, distance=models.Distance.COSINE,
+    )
+
+    repo.init_storage()
+
+    repo.client.create_collection.assert_not_called()
+    repo.client.create_payload_index.assert_not_called()
+
+
+def test_init_storage_rejects_dense_collection_in_hybrid_mode(repo):
+    """Включённый гибрид поверх коллекции с одним безымянным вектором — явная ошибка, а не падение каждого поиска"""
+    from app.domains.vector_db.exceptions import CollectionSchemaMismatchException
+
+    repo.hybrid = True
+    repo.client.collection_exists.return_value = True
+    repo.client.get_collection.return_value.config.params.vectors = models.VectorParams(
+        size=1024, distance=models.Distance.COSINE,
+    )
+    repo.client.get_collection.return_value.config.params.sparse_vectors = None
+
+    with pytest.raises(CollectionSchemaMismatchException):
+        repo.init_storage()
+
 
 def test_upload_points_uses_correct_params(repo):
     """Проверяем, что параметры параллельности и ретраев прокидываются в клиент"""
@@ -148,6 +202,76 @@ def test_search_with_file_filter(repo):
     repo.client.query_points.assert_called_once()
 
 
+def test_search_filters_by_file_id(repo):
+    repo.client.query_points.return_value.points = []
+
+    repo.search(query_text="test", user_id=1, file_id="doc_123")
+
+    conditions = repo.client.query_points.call_args.kwargs['query_filter'].must
+    assert [(c.key, c.match.value) for c in conditions] == [("user_id", 1), ("file_id", "doc_123")]
+
+
+def test_hybrid_search_fuses_dense_and_sparse(repo):
+    repo.hybrid = True
+    repo._encode_query = MagicMock(return_value=([0.1] * 1024, {7: 0.4}))
+    repo.client.query_points.return_value.points = []
+
+    repo.search(query_text="теорема 3.2", user_id=1, top_k=5)
+
+    kwargs = repo.client.query_points.call_args.kwargs
+    assert kwargs['query'].fusion == models.Fusion.RRF
+    assert [prefetch.using for prefetch in kwargs['prefetch']] == ["dense", "sparse"]
+    assert kwargs['prefetch'][1].query.indices == [7]
+    assert kwargs['limit'] == 5
+
+
+def test_search_batch_uses_single_round_trip(repo):
+    repo.encoder.encode.return_value = [MagicMock(tolist=MagicMock(return_value=[0.1] * 1024))] * 2
+    repo.client.query_batch_points.return_value = [MagicMock(points=[]), MagicMock(points=[])]
+
+    results = repo.search_batch(["интеграл", "  ", "первообразная"], user_id=1, top_k=3)
+
+    assert results == [[], [], []]
+    repo.encoder.encode.assert_called_once()
+    requests = repo.client.query_batch_points.call_args.kwargs['requests']
+    assert len(requests) == 2
+    assert requests[0].limit == 3
+    repo.client.query_points.assert_not_called()
+
+
+def test_delete_by_file_id_uses_single_filter_delete(repo):
+    repo.delete_by_file_id("/files/doc_123")
+
+    repo.client.delete.assert_called_once()
+    selector = repo.client.delete.call_args.kwargs['points_selector']
+    assert selector.filter.must[0].key == "file_id"
+    assert selector.filter.must[0].match.value == "/files/doc_123"
+
+
+def test_get_all_files_uses_facet(repo):
+    repo.client.facet.return_value.hits = [MagicMock(value="a"), MagicMock(value="b")]
+
+    assert repo.get_all_files(user_id=1) == ["a", "b"]
+    assert repo.client.facet.call_args.kwargs['key'] == "file_id"
+    repo.client.scroll.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_asearch_uses_async_client(repo):
+    """Асинхронный поиск идёт через AsyncQdrantClient и фильтрует по пользователю"""
+    mock_response = MagicMock()
+    mock_response.points = []
+    repo.async_client.query_points.return_value = mock_response
+
+    results = await repo.asearch(query_text="test", user_id=7)
+
+    assert results == []
+    repo.encoder.encode.assert_called_once_with("test")
+    repo.client.query_points.assert_not_called()
+    query_args = repo.async_client.query_points.call_args[1]
+    assert query_args['query_filter'].must[0].match.value == 7
+
+
 def test_generate_id_is_deterministic():
     """Проверяем, что один и тот же текст всегда дает одинаковый ID (дедупликация)"""
     from app.infrastructure.vector_db.qdrant.utils import generate_id
@@ -155,4 +279,59 @@ def test_generate_id_is_deterministic():
     id1 = generate_id(text)
     id2 = generate_id(text)
     assert id1 == id2
-    assert isinstance(id1, str)
\ No newline at end of file
+    assert isinstance(id1, str)
+
+def _make_chunks(count: int):
+    return (
+        ChunkBase(user_id=1, content=f"Text {i}", file_id="f1", source="a.pdf", page_num=1, chunk_index=i)
+        for i in range(count)
+    )
+
+
+@patch('app.infrastructure.vector_db.qdrant.docs_repository.get_points_from_chunks')
+def test_upsert_batches_uploads_by_batch(mock_get_points, repo):
+    """Чанки читаются из итератора пачками, каждая пачка отправляется отдельно"""
+    mock_get_points.side_effect = lambda chunks, *args: [chunk.chunk_index for chunk in chunks]
+    repo.client.upsert = MagicMock()
+    repo.batch_size = 2
+    on_embedded = MagicMock()
+
+    repo.upsert_batches(_make_chunks(5), on_embedded=on_embedded)
+
+    uploaded = [call.kwargs["points"] for call in repo.client.upsert.call_args_list]
+    assert uploaded == [[0, 1], [2, 3], [4]]
+    on_embedded.assert_called_once()
+
+
+@patch('app.infrastructure.vector_db.qdrant.docs_repository.time.sleep')
+@patch('app.infrastructure.vector_db.qdrant.docs_repository.get_points_from_chunks')
+def test_upsert_batches_retries_failed_batch(mock_get_points, mock_sleep, repo):
+    mock_get_points.side_effect = lambda chunks, *args: [chunk.chunk_index for chunk in chunks]
+    repo.client.upsert = MagicMock(side_effect=[ConnectionError("timeout"), None])
+    repo.batch_size = 10
+
+    repo.upsert_batches(_make_chunks(3))
+
+    assert repo.client.upsert.call_count == 2
+    mock_sleep.assert_called_once()
+
+
+@patch('app.infrastructure.vector_db.qdrant.docs_repository.time.sleep')
+@patch('app.infrastructure.vector_db.qdrant.docs_repository.get_points_from_chunks')
+def test_upsert_batches_resumes_from_checkpoint(mock_get_points, mock_sleep, repo, tmp_path):
+    """После сбоя повторная загрузка с тем же ключом не отправляет готовые пачки заново"""
+    mock_get_points.side_effect = lambda chunks, *args: [chunk.chunk_index for chunk in chunks]
+    repo.batch_size = 2
+    repo.max_retries = 0
+    repo.checkpoint_dir = str(tmp_path)
+
+    repo.client.upsert = MagicMock(side_effect=[None, ConnectionError("down")])
+    with pytest.raises(ConnectionError):
+        repo.upsert_batches(_make_chunks(5), checkpoint_key="doc")
+
+    repo.client.upsert = MagicMock()
+    repo.upsert_batches(_make_chunks(5), checkpoint_key="doc")
+
+    uploaded = [call.kwargs["points"] for call in repo.client.upsert.call_args_list]
+    assert uploaded == [[2, 3], [4]]
+    assert list(tmp_path.iterdir()) == []